@@ -1,174 +1,721 @@
 """
 Agent Registry - Track online agents across workspaces and teams
+
+One store shared by the MCP server and the dashboard:
+
+    <base>/<team>/agents/<agent>.json
+
+where <base> is BEADS_VILLAGE_BASE (default ~/.beads-village). The team
+index is the directory layout itself; the workspace index is built in
+memory from the cached read model.
+
+Sessions using a managed bd daemon also hold a reference to it, one file
+per session, under <base>/.daemons/<workspace>/.
 """
+import bisect
 import json
 import os
+import tempfile
+import threading
 import time
 from pathlib import Path
-from dataclasses import dataclass, asdict
-from typing import Dict, Optional, List
-from datetime import datetime
-
-
-@dataclass
-class AgentInfo:
-    """Information about a registered agent"""
-    agent_id: str
-    team: str
-    role: Optional[str]
-    workspace: str
-    is_leader: bool
-    current_task: Optional[str] = None
-    last_seen: float = 0.0
-    started_at: float = 0.0
-    
-    def to_dict(self) -> dict:
-        return asdict(self)
-    
-    @classmethod
-    def from_dict(cls, data: dict) -> 'AgentInfo':
-        return cls(**data)
-    
-    @property
-    def is_online(self) -> bool:
-        """Agent is online if seen in last 5 minutes"""
-        return time.time() - self.last_seen < 300
-    
-    @property
-    def status(self) -> str:
-        """Get agent status: online, working, offline"""
-        if not self.is_online:
-            return 'offline'
-        if self.current_task:
-            return 'working'
-        return 'online'
+from typing import Callable, Dict, Optional, List, Set, Tuple
+from urllib.parse import quote, unquote
+
+try:
+    from .records import AgentInfo, Reservation
+except ImportError:
+    from records import AgentInfo, Reservation
+
+
+def default_root() -> str:
+    """Registry root shared by every team (BEADS_VILLAGE_BASE)"""
+    return os.environ.get(
+        "BEADS_VILLAGE_BASE",
+        os.path.join(os.path.expanduser("~"), ".beads-village")
+    )
+
+
+# Directory mtimes this recent may not reflect a change yet (coarse timestamps)
+_MTIME_SLACK = 2.0
+
+# A record lock held this long belongs to a crashed writer (a write takes ms)
+_RECORD_LOCK_STALE = 5.0
+
+
+class _RecordDir:
+    """Per-agent record files of one team, with a cached read model.
+
+    Records are parsed into AgentInfo once per file change; loads hand out
+    the cached objects, which callers must treat as read-only.
+    """
+
+    def __init__(self, path: Path, team: str):
+        self.path = path
+        self.team = team
+        # agent_id -> (mtime_ns, size, record)
+        self._cache: Dict[str, Tuple[int, int, AgentInfo]] = {}
+        self._dir_mtime: Optional[int] = None
+        # Own writes/removals not yet reported by load()
+        self._dirty: Set[str] = set()
+        self._gone: Set[str] = set()
+        # Heartbeat threads write while tool calls read
+        self._lock = threading.Lock()
+
+    def parse(self, data: dict) -> AgentInfo:
+        info = AgentInfo.from_dict(data)
+        info.team = self.team
+        return info
+
+    def record_path(self, agent_id: str) -> Path:
+        return self.path / f"{quote(agent_id, safe='')}.json"
+
+    def write(self, agent_id: str, data: dict) -> None:
+        """Atomically replace one agent's record"""
+        self.path.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=str(self.path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f, separators=(',', ':'))
+            os.replace(tmp_path, self.record_path(agent_id))
+        except OSError:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+        try:
+            st = self.record_path(agent_id).stat()
+        except OSError:
+            return
+        with self._lock:
+            self._cache[agent_id] = (st.st_mtime_ns, st.st_size, self.parse(data))
+            self._dirty.add(agent_id)
+            self._gone.discard(agent_id)
+
+    def read(self, agent_id: str) -> Optional[dict]:
+        """Read a single record straight from its file"""
+        try:
+            with open(self.record_path(agent_id), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (json.JSONDecodeError, IOError):
+            return None
+
+    def remove(self, agent_id: str) -> bool:
+        with self._lock:
+            if self._cache.pop(agent_id, None) is not None:
+                self._gone.add(agent_id)
+                self._dirty.discard(agent_id)
+        try:
+            self.record_path(agent_id).unlink()
+            return True
+        except OSError:
+            return False
+
+    def load(self) -> Tuple[Dict[str, AgentInfo], Set[str], Set[str]]:
+        """Load all records.
+
+        Returns (records, ids changed since last load, ids removed since
+        last load) so indexes can be maintained incrementally.
+        """
+        with self._lock:
+            changed, removed = self._refresh()
+            changed |= self._dirty
+            removed |= self._gone
+            self._dirty, self._gone = set(), set()
+            return {k: v[2] for k, v in self._cache.items()}, changed - removed, removed
+
+    def _refresh(self) -> Tuple[Set[str], Set[str]]:
+        changed: Set[str] = set()
+        try:
+            dir_mtime = self.path.stat().st_mtime_ns
+        except OSError:
+            removed = set(self._cache)
+            self._cache.clear()
+            self._dir_mtime = None
+            return changed, removed
+
+        # Atomic replaces touch the directory, so an old, unchanged mtime
+        # means every cached record is still current
+        if dir_mtime == self._dir_mtime and time.time() - dir_mtime / 1e9 > _MTIME_SLACK:
+            return changed, set()
+
+        seen = set()
+        try:
+            entries = list(os.scandir(self.path))
+        except OSError:
+            entries = []
+        for entry in entries:
+            if not entry.name.endswith('.json'):
+                continue
+            agent_id = unquote(entry.name[:-5])
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            cached = self._cache.get(agent_id)
+            if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+                seen.add(agent_id)
+                continue
+            try:
+                with open(entry.path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except (json.JSONDecodeError, IOError):
+                continue
+            try:
+                info = self.parse(data)
+            except (AttributeError, KeyError, TypeError, ValueError):
+                continue
+            self._cache[agent_id] = (st.st_mtime_ns, st.st_size, info)
+            seen.add(agent_id)
+            changed.add(agent_id)
+
+        removed = {agent_id for agent_id in self._cache if agent_id not in seen}
+        for agent_id in removed:
+            del self._cache[agent_id]
+        self._dir_mtime = dir_mtime
+        return changed, removed
+
+
+# Lease markers (see take_prefetched) older than this are pruned
+LEASE_MARKER_TTL = 86400
+
+# The change journal is rotated once it grows past this many bytes
+JOURNAL_MAX = 256 * 1024
+_JOURNAL_HEADER = 21  # zero-padded base version + newline
+
+
+class _Journal:
+    """Append-only log of registry writes giving a monotonic version.
+
+    The first line holds the base version; each entry is "team\tagent_id\n".
+    The version is the base plus the bytes of entries, so it only grows, and
+    rotation carries the base forward into the fresh file.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+
+    def _create(self, base: int, rest: bytes = b'') -> None:
+        fd, tmp_path = tempfile.mkstemp(dir=str(self.path.parent), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(f"{base:020d}\n".encode() + rest)
+        os.replace(tmp_path, self.path)
+
+    def append(self, team: str, agent_id: str) -> None:
+        line = f"{team}\t{agent_id}\n".encode()
+        try:
+            fd = os.open(str(self.path), os.O_WRONLY | os.O_APPEND)
+        except FileNotFoundError:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            try:
+                fd = os.open(str(self.path), os.O_WRONLY | os.O_CREAT | os.O_EXCL | os.O_APPEND)
+                os.write(fd, f"{0:020d}\n".encode())
+            except FileExistsError:
+                fd = os.open(str(self.path), os.O_WRONLY | os.O_APPEND)
+        try:
+            os.write(fd, line)
+            size = os.fstat(fd).st_size
+        finally:
+            os.close(fd)
+        if size > JOURNAL_MAX:
+            self._rotate()
+
+    def _rotate(self) -> None:
+        lock = self.path.with_name(self.path.name + '.lock')
+        try:
+            os.close(os.open(str(lock), os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        except OSError:
+            return
+        try:
+            with open(self.path, 'rb') as f:
+                data = f.read()
+            base = int(data[:_JOURNAL_HEADER] or 0)
+            complete = data.rfind(b'\n', _JOURNAL_HEADER) + 1 or _JOURNAL_HEADER
+            self._create(base + complete - _JOURNAL_HEADER, data[complete:])
+        except (OSError, ValueError):
+            pass
+        finally:
+            try:
+                lock.unlink()
+            except OSError:
+                pass
+
+    def version(self) -> int:
+        try:
+            with open(self.path, 'rb') as f:
+                base = int(f.read(_JOURNAL_HEADER) or 0)
+                size = os.fstat(f.fileno()).st_size
+        except (OSError, ValueError):
+            return 0
+        return base + max(size - _JOURNAL_HEADER, 0)
+
+    def read(self, since: int) -> Optional[Tuple[int, Set[Tuple[str, str]]]]:
+        """(version, {(team, agent_id)}) written after `since`, or None if
+        `since` is no longer covered by the journal."""
+        try:
+            with open(self.path, 'rb') as f:
+                base = int(f.read(_JOURNAL_HEADER) or 0)
+                if since < base:
+                    return None
+                f.seek(_JOURNAL_HEADER + since - base)
+                data = f.read()
+                size = os.fstat(f.fileno()).st_size
+        except FileNotFoundError:
+            return (since, set()) if since == 0 else None
+        except (OSError, ValueError):
+            return None
+        if since - base > size - _JOURNAL_HEADER:
+            return None
+        # Ignore a trailing entry that is still being appended
+        data = data[:data.rfind(b'\n') + 1]
+        entries = set()
+        for line in data.decode('utf-8', 'replace').splitlines():
+            team, _, agent_id = line.partition('\t')
+            if agent_id:
+                entries.add((team, agent_id))
+        return since + len(data), entries
+
+
+class LivenessIndex:
+    """Agents of one team ordered by last_seen, plus a workspace index.
+
+    Updated per changed record, so the active set is a bisect over the
+    ordering rather than a scan of every record.
+    """
+
+    def __init__(self):
+        self._order: List[Tuple[float, str]] = []
+        # agent_id -> (last_seen, normalized workspace)
+        self._entries: Dict[str, Tuple[float, str]] = {}
+        self._by_ws: Dict[str, Set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def update(self, agent_id: str, last_seen: float, workspace: str) -> None:
+        self.remove(agent_id)
+        ws = os.path.normpath(workspace) if workspace else ''
+        self._entries[agent_id] = (last_seen, ws)
+        bisect.insort(self._order, (last_seen, agent_id))
+        self._by_ws.setdefault(ws, set()).add(agent_id)
+
+    def remove(self, agent_id: str) -> None:
+        entry = self._entries.pop(agent_id, None)
+        if entry is None:
+            return
+        last_seen, ws = entry
+        i = bisect.bisect_left(self._order, (last_seen, agent_id))
+        if i < len(self._order) and self._order[i] == (last_seen, agent_id):
+            del self._order[i]
+        members = self._by_ws.get(ws)
+        if members is not None:
+            members.discard(agent_id)
+            if not members:
+                del self._by_ws[ws]
+
+    def seen_since(self, cutoff: float) -> List[str]:
+        """Agent ids with last_seen > cutoff, most recent first"""
+        i = bisect.bisect_right(self._order, (cutoff, '\uffff'))
+        return [agent_id for _, agent_id in reversed(self._order[i:])]
+
+    def seen_before(self, cutoff: float) -> List[str]:
+        """Agent ids with last_seen <= cutoff, least recent first"""
+        i = bisect.bisect_right(self._order, (cutoff, '\uffff'))
+        return [agent_id for _, agent_id in self._order[:i]]
+
+    def last_seen(self, agent_id: str) -> float:
+        return self._entries.get(agent_id, (0.0, ''))[0]
+
+    def workspace(self, agent_id: str) -> str:
+        return self._entries.get(agent_id, (0.0, ''))[1]
+
+    def in_workspace(self, workspace: str) -> Set[str]:
+        return set(self._by_ws.get(os.path.normpath(workspace), ()))
 
 
 class AgentRegistry:
     """
     Registry for tracking active agents.
-    Stores data in .beads-village/agents.json
+
+    Each agent is one record file under <root>/<team>/agents/, replaced
+    atomically, so agents never rewrite each other's state and a heartbeat
+    is a single small write. Reads go through a cached read model that only
+    re-parses records whose files changed; team and workspace lookups are
+    served from indexes derived from it.
     """
-    
-    def __init__(self, base_path: str = None):
-        if base_path is None:
-            base_path = os.getcwd()
-        self.base_path = Path(base_path)
-        self.registry_dir = self.base_path / '.beads-village'
-        self.registry_file = self.registry_dir / 'agents.json'
-    
-    def _ensure_dir(self):
-        """Ensure registry directory exists"""
-        self.registry_dir.mkdir(parents=True, exist_ok=True)
-    
-    def _load(self) -> Dict[str, dict]:
-        """Load registry from file"""
-        if not self.registry_file.exists():
-            return {}
-        try:
-            with open(self.registry_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except (json.JSONDecodeError, IOError):
-            return {}
-    
-    def _save(self, agents: Dict[str, dict]):
-        """Save registry to file"""
-        self._ensure_dir()
-        with open(self.registry_file, 'w', encoding='utf-8') as f:
-            json.dump(agents, f, indent=2)
-    
+
+    def __init__(self, root: str = None):
+        self.root = Path(root or default_root())
+        self._dirs: Dict[str, _RecordDir] = {}
+        self._liveness: Dict[str, LivenessIndex] = {}
+        self._journal = _Journal(self.root / '.journal')
+        # Guards the indexes and every read pairing them with loaded records
+        self._lock = threading.RLock()
+
+    def _dir(self, team: str) -> _RecordDir:
+        with self._lock:
+            d = self._dirs.get(team)
+            if d is None:
+                d = self._dirs[team] = _RecordDir(self.root / team / 'agents', team)
+            return d
+
+    def _team_names(self) -> List[str]:
+        try:
+            return sorted(e.name for e in os.scandir(self.root)
+                          if e.is_dir() and os.path.isdir(os.path.join(e.path, 'agents')))
+        except OSError:
+            return []
+
+    def _load_team(self, team: str) -> Dict[str, AgentInfo]:
+        with self._lock:
+            records, changed, removed = self._dir(team).load()
+            index = self._liveness.get(team)
+            if index is None:
+                index = self._liveness[team] = LivenessIndex()
+                changed = set(records)
+            for agent_id in removed:
+                index.remove(agent_id)
+            for agent_id in changed:
+                info = records.get(agent_id)
+                if info is not None:
+                    index.update(agent_id, info.last_seen, info.workspace)
+            return records
+
+    def _load(self, team: Optional[str] = None) -> Dict[Tuple[str, str], AgentInfo]:
+        """Load records of one team, or of every team, keyed by (team, agent_id)"""
+        teams = [team] if team else self._team_names()
+        out = {}
+        for t in teams:
+            for agent_id, info in self._load_team(t).items():
+                out[(t, agent_id)] = info
+        return out
+
+    def _find_team(self, agent_id: str) -> Optional[str]:
+        for team in self._team_names():
+            if self._dir(team).record_path(agent_id).exists():
+                return team
+        return None
+
+    def _write(self, team: str, agent_id: str, data: dict) -> None:
+        self._dir(team).write(agent_id, data)
+        self._journal.append(team, agent_id)
+
+    def _remove(self, team: str, agent_id: str) -> bool:
+        if not self._dir(team).remove(agent_id):
+            return False
+        self._journal.append(team, agent_id)
+        return True
+
+    def version(self) -> int:
+        """Monotonic registry version; grows with every record write"""
+        return self._journal.version()
+
+    def changes(self, since: Optional[int] = None, team: Optional[str] = None) -> dict:
+        """Agents added, changed or removed after version `since`.
+
+        Returns {"version", "full", "agents", "removed"}. When `since` is
+        None or older than the journal, "full" is set and "agents" is a
+        complete snapshot. Pass the returned version back on the next call.
+        """
+        delta = self._journal.read(since) if since is not None else None
+        if delta is None:
+            version = self._journal.version()
+            return {"version": version, "full": True,
+                    "agents": self.get_all_agents(team), "removed": []}
+
+        version, touched = delta
+        agents, removed = [], []
+        loaded: Dict[str, Dict[str, dict]] = {}
+        for t, agent_id in sorted(touched):
+            if team and t != team:
+                continue
+            if t not in loaded:
+                loaded[t] = self._load_team(t)
+            info = loaded[t].get(agent_id)
+            if info is None:
+                removed.append({"agent_id": agent_id, "team": t})
+            else:
+                agents.append(info)
+        return {"version": version, "full": False, "agents": agents, "removed": removed}
+
+    def _record_lock(self, team: str, agent_id: str) -> '_RecordLock':
+        """Serializes writers of one record (heartbeat thread, tools, reaper)"""
+        return _RecordLock(self.root / team / '.locks' / f"{quote(agent_id, safe='')}.lock")
+
     def register(self, agent: AgentInfo) -> None:
-        """Register or update an agent"""
-        agents = self._load()
+        """Register or update an agent (moving it if it changed teams)"""
         agent.last_seen = time.time()
         if agent.started_at == 0:
             agent.started_at = time.time()
-        agents[agent.agent_id] = agent.to_dict()
-        self._save(agents)
-    
-    def heartbeat(self, agent_id: str) -> bool:
-        """Update agent's last_seen timestamp"""
-        agents = self._load()
-        if agent_id in agents:
-            agents[agent_id]['last_seen'] = time.time()
-            self._save(agents)
-            return True
-        return False
-    
-    def update_task(self, agent_id: str, task_id: Optional[str]) -> bool:
-        """Update agent's current task"""
-        agents = self._load()
-        if agent_id in agents:
-            agents[agent_id]['current_task'] = task_id
-            agents[agent_id]['last_seen'] = time.time()
-            self._save(agents)
-            return True
-        return False
-    
-    def unregister(self, agent_id: str) -> bool:
+        for team in self._team_names():
+            if team != agent.team:
+                self._remove(team, agent.agent_id)
+        with self._record_lock(agent.team, agent.agent_id):
+            self._write(agent.team, agent.agent_id, agent.to_dict())
+
+    def _update(self, agent_id: str, team: Optional[str], touch: bool = True, **changes) -> bool:
+        team = team or self._find_team(agent_id)
+        if not team:
+            return False
+        with self._record_lock(team, agent_id):
+            data = self._dir(team).read(agent_id)
+            if data is None:
+                return False
+            record = AgentInfo.from_dict(data).to_dict()
+            record.update(changes)
+            record['team'] = team
+            if touch:
+                record['last_seen'] = time.time()
+            self._write(team, agent_id, record)
+        return True
+
+    def heartbeat(self, agent_id: str, team: Optional[str] = None, **changes) -> bool:
+        """Update agent's last_seen timestamp, plus any other fields, in one write"""
+        return self._update(agent_id, team, **changes)
+
+    def update_task(self, agent_id: str, task_id: Optional[str], team: Optional[str] = None) -> bool:
+        """Update agent's current task (and when it was started)"""
+        return self._update(agent_id, team, current_task=task_id,
+                            task_started=time.time() if task_id else 0.0)
+
+    def unregister(self, agent_id: str, team: Optional[str] = None) -> bool:
         """Remove agent from registry"""
-        agents = self._load()
-        if agent_id in agents:
-            del agents[agent_id]
-            self._save(agents)
-            return True
-        return False
-    
-    def get_agent(self, agent_id: str) -> Optional[AgentInfo]:
+        team = team or self._find_team(agent_id)
+        return bool(team) and self._remove(team, agent_id)
+
+    def get_agent(self, agent_id: str, team: Optional[str] = None) -> Optional[AgentInfo]:
         """Get a specific agent"""
-        agents = self._load()
-        if agent_id in agents:
-            return AgentInfo.from_dict(agents[agent_id])
+        team = team or self._find_team(agent_id)
+        data = self._dir(team).read(agent_id) if team else None
+        if data is not None:
+            return self._dir(team).parse(data)
         return None
-    
-    def get_all_agents(self) -> List[AgentInfo]:
-        """Get all registered agents"""
-        agents = self._load()
-        return [AgentInfo.from_dict(a) for a in agents.values()]
-    
-    def get_active_agents(self, max_age: int = 300) -> List[AgentInfo]:
-        """Get agents seen within max_age seconds"""
-        now = time.time()
-        agents = self._load()
-        return [
-            AgentInfo.from_dict(a) for a in agents.values()
-            if now - a.get('last_seen', 0) < max_age
-        ]
-    
-    def get_team_agents(self, team: str, active_only: bool = True) -> List[AgentInfo]:
+
+    def reservation_expires(self, res: Reservation, workspace: str, holders: dict = None) -> float:
+        """Effective expiry of a reservation in `workspace` (epoch seconds).
+
+        A reservation listed in its holder's record is renewed by the
+        holder's heartbeat: it lasts its original TTL past the last beat.
+        `holders` memoizes record lookups across a scan.
+        """
+        if not res.created or not res.agent:
+            return res.expires
+        if holders is None:
+            holders = {}
+        if res.agent not in holders:
+            holders[res.agent] = self.get_agent(res.agent, res.team or None)
+        holder = holders[res.agent]
+        if (holder and res.path in holder.reservations
+                and os.path.normpath(holder.workspace) == os.path.abspath(workspace)):
+            return max(res.expires, holder.last_seen + res.ttl)
+        return res.expires
+
+    def get_all_agents(self, team: Optional[str] = None) -> List[AgentInfo]:
+        """Get all registered agents, optionally of one team"""
+        return list(self._load(team).values())
+
+    def get_active_agents(self, max_age: int = 300, team: Optional[str] = None) -> List[AgentInfo]:
+        """Get agents seen within max_age seconds, most recent first"""
+        cutoff = time.time() - max_age
+        agents = []
+        for t in ([team] if team else self._team_names()):
+            with self._lock:
+                records = self._load_team(t)
+                agents.extend(records[i] for i in self._liveness[t].seen_since(cutoff))
+        if not team:
+            agents.sort(key=lambda a: a.last_seen, reverse=True)
+        return agents
+
+    def get_team_agents(self, team: str, active_only: bool = True, max_age: int = 300) -> List[AgentInfo]:
         """Get agents in a specific team"""
         if active_only:
-            agents = self.get_active_agents()
-        else:
-            agents = self.get_all_agents()
-        return [a for a in agents if a.team == team]
-    
+            return self.get_active_agents(max_age, team=team)
+        return self.get_all_agents(team)
+
+    def get_workspace_agents(self, workspace: str, active_only: bool = True,
+                             max_age: int = 300) -> List[AgentInfo]:
+        """Get agents (of any team) registered in a workspace"""
+        cutoff = time.time() - max_age
+        agents = []
+        for team in self._team_names():
+            with self._lock:
+                records = self._load_team(team)
+                index = self._liveness[team]
+                for agent_id in index.in_workspace(workspace):
+                    if not active_only or index.last_seen(agent_id) > cutoff:
+                        agents.append(records[agent_id])
+        return agents
+
+    def get_workspaces(self, team: str, max_age: int = 300) -> List[dict]:
+        """Workspaces of a team with their active agents"""
+        result: Dict[str, dict] = {}
+        with self._lock:
+            self._load_team(team)
+            index = self._liveness[team]
+            for agent_id in index.seen_since(time.time() - max_age):
+                ws = index.workspace(agent_id)
+                if not ws:
+                    continue
+                entry = result.setdefault(ws, {"ws": ws, "agents": [], "count": 0, "team": team})
+                entry["agents"].append(agent_id)
+                entry["count"] += 1
+        return list(result.values())
+
+    def stale_agents(self, team: str, max_age: float, workspace: Optional[str] = None) -> List[AgentInfo]:
+        """Agents silent for max_age seconds whose work has not been reaped yet"""
+        stale = []
+        with self._lock:
+            records = self._load_team(team)
+            index = self._liveness[team]
+            members = index.in_workspace(workspace) if workspace else None
+            for agent_id in index.seen_before(time.time() - max_age):
+                if members is not None and agent_id not in members:
+                    continue
+                info = records[agent_id]
+                if info.reaped_at < info.last_seen:
+                    stale.append(info)
+        return stale
+
+    def mark_reaped(self, agent_id: str, team: str) -> bool:
+        """Drop a dead agent's task and reservations without reviving it"""
+        return self._update(agent_id, team, touch=False, current_task=None,
+                            reservations=[], prefetched=[], reaped_at=time.time())
+
+    def acquire_reaper(self, team: str, stale_after: float = 300) -> bool:
+        """Take the team's reaper lock (one reaper at a time)"""
+        lock = self.root / team / '.reaper.lock'
+        lock.parent.mkdir(parents=True, exist_ok=True)
+        for _ in range(2):
+            try:
+                fd = os.open(str(lock), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                os.write(fd, str(os.getpid()).encode())
+                os.close(fd)
+                return True
+            except FileExistsError:
+                try:
+                    if time.time() - lock.stat().st_mtime < stale_after:
+                        return False
+                    lock.unlink()  # left behind by a crashed reaper
+                except OSError:
+                    pass
+        return False
+
+    def release_reaper(self, team: str) -> None:
+        try:
+            (self.root / team / '.reaper.lock').unlink()
+        except OSError:
+            pass
+
+    def _lease_marker(self, team: str, owner: str, entry: dict) -> Path:
+        key = f"{owner}|{entry['id']}|{entry.get('exp', 0)}"
+        return self.root / team / 'leases' / quote(key, safe='')
+
+    def take_prefetched(self, team: str, owner: str, entry: dict, taker: str) -> bool:
+        """Start one of `owner`'s prefetched tasks.
+
+        The owner working through its batch, a thief and a reaper all go
+        through here; exactly one of them wins each lease.
+        """
+        marker = self._lease_marker(team, owner, entry)
+        marker.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            fd = os.open(str(marker), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        os.write(fd, taker.encode())
+        os.close(fd)
+        return True
+
+    def prefetch_taken(self, team: str, owner: str, entry: dict) -> bool:
+        """Whether a prefetched task was already started, stolen or reclaimed"""
+        return self._lease_marker(team, owner, entry).exists()
+
+    def daemon_dir(self, workspace: str) -> Path:
+        """Shared state of a workspace's managed bd daemon"""
+        return self.root / '.daemons' / quote(os.path.abspath(workspace), safe='')
+
+    def add_daemon_ref(self, workspace: str, agent_id: str, pid: Optional[int] = None) -> int:
+        """Record that a local session uses the workspace daemon; returns live references"""
+        d = self.daemon_dir(workspace)
+        d.mkdir(parents=True, exist_ok=True)
+        (d / quote(agent_id, safe='')).write_text(str(pid or os.getpid()))
+        return len(self.daemon_refs(workspace))
+
+    def drop_daemon_ref(self, workspace: str, agent_id: str) -> int:
+        """Release a session's reference; returns the live references left"""
+        try:
+            (self.daemon_dir(workspace) / quote(agent_id, safe='')).unlink()
+        except OSError:
+            pass
+        return len(self.daemon_refs(workspace))
+
+    def daemon_refs(self, workspace: str) -> List[str]:
+        """Sessions referencing the workspace daemon; refs of exited processes are pruned"""
+        refs = []
+        try:
+            entries = list(os.scandir(self.daemon_dir(workspace)))
+        except OSError:
+            return refs
+        for entry in entries:
+            if entry.name.startswith('.'):
+                continue
+            try:
+                with open(entry.path, encoding='utf-8') as f:
+                    pid = int(f.read().strip() or 0)
+            except (OSError, ValueError):
+                continue
+            if _pid_alive(pid):
+                refs.append(unquote(entry.name))
+            else:
+                try:
+                    os.unlink(entry.path)
+                except OSError:
+                    pass
+        return sorted(refs)
+
     def get_teams(self) -> List[str]:
         """Get list of all teams with active agents"""
         agents = self.get_active_agents()
         return list(set(a.team for a in agents))
-    
-    def cleanup_stale(self, max_age: int = 3600) -> int:
-        """Remove agents not seen for max_age seconds (default 1 hour)"""
+
+    def cleanup_stale(self, max_age: int = 3600, team: Optional[str] = None) -> int:
+        """Remove agents not seen for max_age seconds (default 1 hour).
+
+        Records still holding a task or reservations are kept until a
+        reaper has reclaimed that work.
+        """
         now = time.time()
-        agents = self._load()
-        stale = [
-            agent_id for agent_id, data in agents.items()
-            if now - data.get('last_seen', 0) > max_age
-        ]
-        for agent_id in stale:
-            del agents[agent_id]
-        if stale:
-            self._save(agents)
-        return len(stale)
-    
+        removed = 0
+        for (t, agent_id), info in self._load(team).items():
+            if now - info.last_seen <= max_age:
+                continue
+            if (info.current_task or info.reservations or info.prefetched) and info.reaped_at < info.last_seen:
+                continue
+            if self._remove(t, agent_id):
+                removed += 1
+
+        # Lease markers only matter while the lease is listed by its owner
+        for t in ([team] if team else self._team_names()):
+            try:
+                markers = list(os.scandir(self.root / t / 'leases'))
+            except OSError:
+                continue
+            for entry in markers:
+                try:
+                    if now - entry.stat().st_mtime > LEASE_MARKER_TTL:
+                        os.unlink(entry.path)
+                except OSError:
+                    pass
+        return removed
+
     def get_stats(self) -> dict:
         """Get registry statistics"""
         all_agents = self.get_all_agents()
         active = [a for a in all_agents if a.is_online]
         working = [a for a in active if a.current_task]
         teams = set(a.team for a in active)
-        
+
         return {
             'total_registered': len(all_agents),
             'active': len(active),
@@ -180,12 +727,100 @@ class AgentRegistry:
         }
 
 
+class _RecordLock:
+    """O_EXCL lock file around a read-modify-write of one record"""
+
+    def __init__(self, path: Path):
+        self.path = path
+
+    def __enter__(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        delay = 0.001
+        while True:
+            try:
+                os.close(os.open(str(self.path), os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                return self
+            except FileExistsError:
+                try:
+                    if time.time() - self.path.stat().st_mtime > _RECORD_LOCK_STALE:
+                        self.path.unlink()  # left behind by a crashed writer
+                        continue
+                except OSError:
+                    continue
+            time.sleep(delay)
+            delay = min(delay * 2, 0.02)
+
+    def __exit__(self, *exc):
+        try:
+            self.path.unlink()
+        except OSError:
+            pass
+        return False
+
+
+def _pid_alive(pid: int) -> bool:
+    """Whether a local process exists (assumed so where it cannot be checked)"""
+    if pid <= 0:
+        return False
+    if os.name == 'nt':
+        return True  # os.kill would terminate it
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass  # exists, owned by someone else
+    return True
+
+
+class Heartbeat:
+    """Background thread calling `beat` every `interval` seconds.
+
+    Keeps an agent's registry record fresh while it is busy with work that
+    makes no tool calls. Errors from `beat` are swallowed; the next tick
+    simply tries again.
+    """
+
+    def __init__(self, beat: Callable[[], None], interval: float = 60.0):
+        self.beat = beat
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> bool:
+        """Start ticking; returns False if disabled or already running"""
+        if self.interval <= 0 or self.running:
+            return False
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="beads-heartbeat", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self, timeout: float = 1.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.beat()
+            except Exception:
+                pass
+
+
 # Singleton instance
 _registry: Optional[AgentRegistry] = None
 
-def get_registry(base_path: str = None) -> AgentRegistry:
+def get_registry(root: str = None) -> AgentRegistry:
     """Get or create the agent registry singleton"""
     global _registry
-    if _registry is None or (base_path and str(_registry.base_path) != base_path):
-        _registry = AgentRegistry(base_path)
+    root = root or default_root()
+    if _registry is None or str(_registry.root) != str(Path(root)):
+        _registry = AgentRegistry(root)
     return _registry
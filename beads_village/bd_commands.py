@@ -0,0 +1,264 @@
+"""
+bd Commands - Typed requests for the bd CLI and daemon
+
+Tools build a command object once. `bd()` in the server then either
+dispatches it to the daemon (`rpc`) or renders it to CLI arguments
+(`argv`), so nothing is re-parsed on the way. Each command knows whether
+its CLI form takes `--json`.
+"""
+from typing import Any, List, Optional
+
+try:
+    from .bd_daemon_client import BdDaemonClient, DaemonNotRunningError
+except ImportError:
+    from bd_daemon_client import BdDaemonClient, DaemonNotRunningError
+
+
+def _as_list(result: Any) -> list:
+    return result if isinstance(result, list) else [result] if result else []
+
+
+class BdCommand:
+    """A bd invocation as data"""
+    __slots__ = ()
+
+    name = ""  # CLI subcommand
+    json = False  # CLI form accepts --json
+
+    def args(self) -> List[str]:
+        """CLI arguments after the subcommand"""
+        return []
+
+    def argv(self) -> List[str]:
+        """Full CLI arguments (without the `bd` executable)"""
+        argv = [self.name, *self.args()]
+        if self.json:
+            argv.append("--json")
+        return argv
+
+    async def rpc(self, daemon: BdDaemonClient) -> Any:
+        """Run via the daemon; commands without an RPC form use the CLI"""
+        raise DaemonNotRunningError(f"Command '{self.name}' not supported by daemon")
+
+    def __repr__(self) -> str:
+        return f"<bd {' '.join(self.argv())}>"
+
+
+class Init(BdCommand):
+    """Initialize the workspace database (CLI only)"""
+    __slots__ = ()
+    name = "init"
+
+
+class Doctor(BdCommand):
+    """Check database health, optionally repairing it (CLI only)"""
+    __slots__ = ('fix',)
+    name = "doctor"
+    json = True
+
+    def __init__(self, fix: bool = True):
+        self.fix = fix
+
+    def args(self) -> List[str]:
+        return ["--fix"] if self.fix else []
+
+
+class Sync(BdCommand):
+    """Sync the database with git"""
+    __slots__ = ()
+    name = "sync"
+
+    async def rpc(self, daemon: BdDaemonClient) -> Any:
+        return await daemon.sync()
+
+
+class Stats(BdCommand):
+    __slots__ = ()
+    name = "stats"
+    json = True
+
+    async def rpc(self, daemon: BdDaemonClient) -> Any:
+        return await daemon.stats()
+
+
+class Ready(BdCommand):
+    """Open issues with no blockers"""
+    __slots__ = ('limit',)
+    name = "ready"
+    json = True
+
+    def __init__(self, limit: Optional[int] = None):
+        self.limit = limit
+
+    def args(self) -> List[str]:
+        return ["--limit", str(self.limit)] if self.limit else []
+
+    async def rpc(self, daemon: BdDaemonClient) -> Any:
+        return _as_list(await daemon.ready(limit=self.limit or 5))
+
+
+class ListIssues(BdCommand):
+    __slots__ = ('status', 'limit')
+    name = "list"
+    json = True
+
+    def __init__(self, status: Optional[str] = None, limit: Optional[int] = None):
+        self.status = status
+        self.limit = limit
+
+    def args(self) -> List[str]:
+        args = []
+        if self.status:
+            args += ["--status", self.status]
+        if self.limit:
+            args += ["--limit", str(self.limit)]
+        return args
+
+    async def rpc(self, daemon: BdDaemonClient) -> Any:
+        return _as_list(await daemon.list_issues(status=self.status, limit=self.limit or 10))
+
+
+class Show(BdCommand):
+    __slots__ = ('issue_id',)
+    name = "show"
+    json = True
+
+    def __init__(self, issue_id: str):
+        self.issue_id = issue_id
+
+    def args(self) -> List[str]:
+        return [self.issue_id]
+
+    async def rpc(self, daemon: BdDaemonClient) -> Any:
+        return await daemon.show(self.issue_id)
+
+
+class Create(BdCommand):
+    __slots__ = ('title', 'issue_type', 'priority', 'description', 'deps', 'labels')
+    name = "create"
+    json = True
+
+    def __init__(self, title: str, issue_type: str = "task", priority: int = 2,
+                 description: str = "", deps: List[str] = None, labels: List[str] = None):
+        self.title = title
+        self.issue_type = issue_type
+        self.priority = priority
+        self.description = description
+        self.deps = deps or []
+        self.labels = labels or []
+
+    def args(self) -> List[str]:
+        args = [self.title, "-t", self.issue_type, "-p", str(self.priority)]
+        if self.description:
+            args += ["--description", self.description]
+        if self.labels:
+            # bd CLI uses --labels/-l (comma-separated), not --tag
+            args += ["--labels", ",".join(self.labels)]
+        for dep in self.deps:
+            args += ["--deps", dep]
+        return args
+
+    async def rpc(self, daemon: BdDaemonClient) -> Any:
+        return await daemon.create(
+            title=self.title,
+            issue_type=self.issue_type,
+            priority=self.priority,
+            description=self.description,
+            deps=self.deps or None,
+            labels=self.labels or None,
+        )
+
+
+class Update(BdCommand):
+    """Update one or more issues.
+
+    `assignee=""` clears the assignee; None leaves it alone. `set_labels`
+    replaces all labels.
+    """
+    __slots__ = ('issue_ids', 'status', 'priority', 'assignee',
+                 'add_labels', 'remove_labels', 'set_labels')
+    name = "update"
+
+    def __init__(self, *issue_ids: str, status: Optional[str] = None, priority: Optional[int] = None,
+                 assignee: Optional[str] = None, add_labels: List[str] = None,
+                 remove_labels: List[str] = None, set_labels: Optional[List[str]] = None):
+        self.issue_ids = list(issue_ids)
+        self.status = status
+        self.priority = priority
+        self.assignee = assignee
+        self.add_labels = add_labels or []
+        self.remove_labels = remove_labels or []
+        self.set_labels = set_labels
+
+    def args(self) -> List[str]:
+        args = list(self.issue_ids)
+        if self.status:
+            args += ["--status", self.status]
+        if self.priority is not None:
+            args += ["-p", str(self.priority)]
+        if self.assignee is not None:
+            args += ["--assignee", self.assignee]
+        for label in self.add_labels:
+            args += ["--add-label", label]
+        for label in self.remove_labels:
+            args += ["--remove-label", label]
+        if self.set_labels is not None:
+            args += ["--set-labels", ",".join(self.set_labels)]
+        return args
+
+    async def rpc(self, daemon: BdDaemonClient) -> Any:
+        results = []
+        for issue_id in self.issue_ids:
+            results.append(await daemon.update(
+                issue_id, status=self.status, priority=self.priority, assignee=self.assignee,
+                add_labels=self.add_labels, remove_labels=self.remove_labels, set_labels=self.set_labels,
+            ))
+        return results[0] if len(results) == 1 else results
+
+
+class Close(BdCommand):
+    __slots__ = ('issue_id', 'reason')
+    name = "close"
+
+    def __init__(self, issue_id: str, reason: str = "Completed"):
+        self.issue_id = issue_id
+        self.reason = reason
+
+    def args(self) -> List[str]:
+        return [self.issue_id, "--reason", self.reason]
+
+    async def rpc(self, daemon: BdDaemonClient) -> Any:
+        return await daemon.close(self.issue_id, reason=self.reason)
+
+
+class DepAdd(BdCommand):
+    __slots__ = ('from_id', 'to_id', 'dep_type')
+    name = "dep"
+
+    def __init__(self, from_id: str, to_id: str, dep_type: str = "blocks"):
+        self.from_id = from_id
+        self.to_id = to_id
+        self.dep_type = dep_type
+
+    def args(self) -> List[str]:
+        return ["add", self.from_id, self.to_id, "--type", self.dep_type]
+
+    async def rpc(self, daemon: BdDaemonClient) -> Any:
+        await daemon.add_dependency(self.from_id, self.to_id, self.dep_type)
+        return {"ok": 1}
+
+
+class Cleanup(BdCommand):
+    """Delete issues closed more than `days` days ago"""
+    __slots__ = ('days',)
+    name = "cleanup"
+    json = True
+
+    def __init__(self, days: float = 2):
+        self.days = days
+
+    def args(self) -> List[str]:
+        return ["--days", str(self.days)]
+
+    async def rpc(self, daemon: BdDaemonClient) -> Any:
+        return await daemon.cleanup_closed(self.days)
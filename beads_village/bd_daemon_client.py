@@ -15,8 +15,10 @@ import asyncio
 import json
 import os
 import sys
+import time
+from contextvars import ContextVar
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 # Check if we're on Windows
 IS_WINDOWS = sys.platform == "win32"
@@ -37,6 +39,32 @@ class DaemonConnectionError(DaemonError):
     pass
 
 
+class DaemonTimeoutError(DaemonError):
+    """Raised when the daemon accepted a request but did not answer in time."""
+    pass
+
+
+class DaemonCircuitOpenError(DaemonNotRunningError):
+    """Raised without contacting the daemon while its circuit breaker is open."""
+    pass
+
+
+# Circuit breaker states
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+# Socket resolutions are reused for this many seconds
+SOCKET_CACHE_TTL = 5.0
+
+# working_dir -> (socket path or None, resolved at)
+_socket_cache: Dict[str, Tuple[Optional[str], float]] = {}
+
+# Actor of the request being handled; overrides the client's own so that
+# one client can serve several agents (see shared_server.py)
+request_actor: ContextVar[Optional[str]] = ContextVar("bd_request_actor", default=None)
+
+
 class BdDaemonClient:
     """Client for calling bd daemon via RPC over Unix socket (or Windows named pipe).
     
@@ -55,6 +83,8 @@ class BdDaemonClient:
         working_dir: Optional[str] = None,
         actor: Optional[str] = None,
         timeout: float = 30.0,
+        cooldown: float = 30.0,
+        probe_timeout: float = 1.0,
     ):
         """Initialize daemon client.
         
@@ -63,11 +93,19 @@ class BdDaemonClient:
             working_dir: Working directory for database discovery
             actor: Actor name for audit trail
             timeout: Socket timeout in seconds
+            cooldown: Seconds the circuit stays open after the daemon fails
+            probe_timeout: Timeout of the ping that tests a daemon after a cooldown
         """
         self.socket_path = socket_path
         self.working_dir = working_dir or os.getcwd()
         self.actor = actor
         self.timeout = timeout
+        self.cooldown = cooldown
+        self.probe_timeout = probe_timeout
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.failures = 0
+        self.last_error: Optional[str] = None
     
     async def _find_socket_path(self) -> str:
         """Find daemon socket path by searching for .beads directory.
@@ -81,33 +119,51 @@ class BdDaemonClient:
         if self.socket_path:
             return self.socket_path
         
-        # Walk up from working_dir to find .beads/bd.sock (or bd.pipe on Windows)
-        socket_name = "bd.pipe" if IS_WINDOWS else "bd.sock"
-        current = Path(self.working_dir).resolve()
-        
-        while True:
-            beads_dir = current / ".beads"
-            if beads_dir.is_dir():
-                sock_path = beads_dir / socket_name
-                if sock_path.exists():
-                    return str(sock_path)
-                break
-            
-            parent = current.parent
-            if parent == current:
-                break
-            current = parent
-        
-        # Check global daemon socket
-        home = Path.home()
-        global_sock_path = home / ".beads" / socket_name
-        if global_sock_path.exists():
-            return str(global_sock_path)
+        sock_path = find_socket_path(self.working_dir)
+        if sock_path:
+            return sock_path
         
+        socket_name = "bd.pipe" if IS_WINDOWS else "bd.sock"
         raise DaemonNotRunningError(
             f"Daemon socket not found ({socket_name}). Is the daemon running? Try: bd daemon --start"
         )
     
+    # ------------------------------------------------------------------
+    # Circuit breaker
+    #
+    # closed:    requests go to the daemon; a failure opens the circuit.
+    # open:      requests fail at once (callers fall back to the CLI) until
+    #            `cooldown` has passed.
+    # half-open: the next request first pings with `probe_timeout`; success
+    #            closes the circuit, failure opens it for another cooldown.
+    # Errors the daemon itself returns do not count: it answered.
+    # ------------------------------------------------------------------
+    
+    def available(self) -> bool:
+        """Whether a request may be sent now (socket present, circuit not open)"""
+        if self.state == OPEN and time.time() - self.opened_at < self.cooldown:
+            return False
+        return bool(self.socket_path) or find_socket_path(self.working_dir) is not None
+    
+    def reset(self) -> None:
+        """Close the circuit (e.g. after the daemon was restarted)"""
+        self.state = CLOSED
+        self.opened_at = 0.0
+    
+    def _trip(self, error: Exception) -> None:
+        self.state = OPEN
+        self.opened_at = time.time()
+        self.failures += 1
+        self.last_error = str(error)[:200]
+    
+    def breaker_stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "opened_at": self.opened_at,
+            "last_error": self.last_error,
+        }
+    
     async def _send_request(self, operation: str, args: Dict[str, Any]) -> Any:
         """Send RPC request to daemon and get response.
         
@@ -119,18 +175,41 @@ class BdDaemonClient:
             Parsed response data
             
         Raises:
+            DaemonCircuitOpenError: If the daemon failed recently
             DaemonNotRunningError: If daemon is not running
             DaemonConnectionError: If connection fails
             DaemonError: If request fails
         """
+        if self.state != CLOSED:
+            if self.state == OPEN and time.time() - self.opened_at < self.cooldown:
+                raise DaemonCircuitOpenError(f"Daemon unavailable: {self.last_error}")
+            # Cooldown over: one quick probe decides whether to trust the daemon again
+            self.state = HALF_OPEN
+            try:
+                await self._transport("ping", {}, self.probe_timeout)
+            except (DaemonNotRunningError, DaemonConnectionError, DaemonTimeoutError) as e:
+                self._trip(e)
+                raise
+            except DaemonError:
+                pass
+            self.state = CLOSED
+        try:
+            return await self._transport(operation, args, self.timeout)
+        except (DaemonNotRunningError, DaemonConnectionError, DaemonTimeoutError) as e:
+            self._trip(e)
+            raise
+    
+    async def _transport(self, operation: str, args: Dict[str, Any], timeout: float) -> Any:
         if IS_WINDOWS:
             # Windows named pipes require different handling
             return await self._send_request_windows(operation, args)
         else:
-            return await self._send_request_unix(operation, args)
+            return await self._send_request_unix(operation, args, timeout)
     
-    async def _send_request_unix(self, operation: str, args: Dict[str, Any]) -> Any:
+    async def _send_request_unix(self, operation: str, args: Dict[str, Any],
+                                 timeout: Optional[float] = None) -> Any:
         """Send request via Unix socket."""
+        timeout = self.timeout if timeout is None else timeout
         sock_path = await self._find_socket_path()
         
         request = {
@@ -138,15 +217,17 @@ class BdDaemonClient:
             "args": args,
             "cwd": self.working_dir,
         }
-        if self.actor:
-            request["actor"] = self.actor
+        actor = request_actor.get() or self.actor
+        if actor:
+            request["actor"] = actor
         
         try:
             reader, writer = await asyncio.wait_for(
                 asyncio.open_unix_connection(sock_path),
-                timeout=self.timeout,
+                timeout=timeout,
             )
-        except FileNotFoundError:
+        except (FileNotFoundError, ConnectionRefusedError):
+            forget_socket_path(self.working_dir)
             raise DaemonNotRunningError(
                 f"Daemon socket not found: {sock_path}. Is the daemon running?"
             )
@@ -167,10 +248,10 @@ class BdDaemonClient:
             try:
                 response_line = await asyncio.wait_for(
                     reader.readline(),
-                    timeout=self.timeout,
+                    timeout=timeout,
                 )
             except asyncio.TimeoutError:
-                raise DaemonError(
+                raise DaemonTimeoutError(
                     f"Timeout waiting for response (operation: {operation})"
                 )
             
@@ -202,8 +283,9 @@ class BdDaemonClient:
             "args": args,
             "cwd": self.working_dir,
         }
-        if self.actor:
-            request["actor"] = self.actor
+        actor = request_actor.get() or self.actor
+        if actor:
+            request["actor"] = actor
         
         try:
             # Windows named pipes can be opened as files
@@ -284,6 +366,7 @@ class BdDaemonClient:
         priority: int = 2,
         description: str = "",
         deps: Optional[List[str]] = None,
+        labels: Optional[List[str]] = None,
     ) -> Dict[str, Any]:
         """Create a new issue via daemon.
         
@@ -293,6 +376,7 @@ class BdDaemonClient:
             priority: Priority 0-4
             description: Issue description
             deps: Dependencies
+            labels: Labels (role tags) to attach
             
         Returns:
             Created issue data
@@ -306,6 +390,8 @@ class BdDaemonClient:
             args["description"] = description
         if deps:
             args["dependencies"] = deps
+        if labels:
+            args["labels"] = labels
         
         data = await self._send_request("create", args)
         return json.loads(data) if isinstance(data, str) else data
@@ -344,15 +430,59 @@ class BdDaemonClient:
         issue_id: str,
         status: Optional[str] = None,
         priority: Optional[int] = None,
+        assignee: Optional[str] = None,
+        add_labels: Optional[List[str]] = None,
+        remove_labels: Optional[List[str]] = None,
+        set_labels: Optional[List[str]] = None,
     ) -> Dict[str, Any]:
-        """Update issue via daemon."""
+        """Update issue via daemon.
+        
+        Label changes go through the daemon's label operations; set_labels
+        replaces the issue's labels with exactly the given ones.
+        """
         args: Dict[str, Any] = {"id": issue_id}
         if status:
             args["status"] = status
         if priority is not None:
             args["priority"] = priority
+        if assignee is not None:
+            args["assignee"] = assignee
+        
+        result: Dict[str, Any] = {"id": issue_id}
+        if len(args) > 1:
+            data = await self._send_request("update", args)
+            result = json.loads(data) if isinstance(data, str) else data
+        
+        add = list(add_labels or [])
+        remove = list(remove_labels or [])
+        if set_labels is not None:
+            current = await self.show(issue_id)
+            if isinstance(current, list):
+                current = current[0] if current else {}
+            have = set((current or {}).get("labels") or [])
+            add += [label for label in set_labels if label not in have]
+            remove += [label for label in have if label not in set_labels]
+        for label in add:
+            await self.add_label(issue_id, label)
+        for label in remove:
+            await self.remove_label(issue_id, label)
+        return result
+    
+    async def add_label(self, issue_id: str, label: str) -> None:
+        """Attach a label to an issue via daemon."""
+        await self._send_request("label_add", {"id": issue_id, "label": label})
+    
+    async def remove_label(self, issue_id: str, label: str) -> None:
+        """Detach a label from an issue via daemon."""
+        await self._send_request("label_remove", {"id": issue_id, "label": label})
+    
+    async def cleanup_closed(self, older_than_days: float) -> Dict[str, Any]:
+        """Delete issues closed more than `older_than_days` days ago via daemon (bd cleanup).
         
-        data = await self._send_request("update", args)
+        A daemon without the operation answers with an error; bd() then
+        runs the CLI.
+        """
+        data = await self._send_request("cleanup", {"older_than_days": older_than_days})
         return json.loads(data) if isinstance(data, str) else data
     
     async def close(self, issue_id: str, reason: str = "Completed") -> Dict[str, Any]:
@@ -394,26 +524,17 @@ class BdDaemonClient:
         pass
 
 
-def is_daemon_available(working_dir: Optional[str] = None) -> bool:
-    """Check if daemon socket exists (quick check without connecting).
-    
-    Args:
-        working_dir: Working directory to search from
-        
-    Returns:
-        True if daemon socket file exists
-    """
+def _resolve_socket_path(working_dir: str) -> Optional[str]:
     socket_name = "bd.pipe" if IS_WINDOWS else "bd.sock"
-    search_dir = Path(working_dir) if working_dir else Path.cwd()
     
     # Walk up to find .beads
-    current = search_dir.resolve()
+    current = Path(working_dir).resolve()
     while True:
         beads_dir = current / ".beads"
         if beads_dir.is_dir():
             sock_path = beads_dir / socket_name
             if sock_path.exists():
-                return True
+                return str(sock_path)
             break
         
         parent = current.parent
@@ -423,4 +544,42 @@ def is_daemon_available(working_dir: Optional[str] = None) -> bool:
     
     # Check global
     global_sock_path = Path.home() / ".beads" / socket_name
-    return global_sock_path.exists()
+    return str(global_sock_path) if global_sock_path.exists() else None
+
+
+def find_socket_path(working_dir: Optional[str] = None) -> Optional[str]:
+    """Daemon socket serving `working_dir`, or None.
+    
+    The directory walk is cached for SOCKET_CACHE_TTL seconds; a cached
+    socket is re-checked with a single stat so a stopped daemon is noticed
+    at once.
+    """
+    key = working_dir or os.getcwd()
+    cached = _socket_cache.get(key)
+    now = time.time()
+    if cached is not None and now - cached[1] < SOCKET_CACHE_TTL:
+        if cached[0] is None or os.path.exists(cached[0]):
+            return cached[0]
+    path = _resolve_socket_path(key)
+    _socket_cache[key] = (path, now)
+    return path
+
+
+def forget_socket_path(working_dir: Optional[str] = None) -> None:
+    """Drop a cached socket resolution (e.g. after the daemon was started)"""
+    if working_dir is None:
+        _socket_cache.clear()
+    else:
+        _socket_cache.pop(working_dir, None)
+
+
+def is_daemon_available(working_dir: Optional[str] = None) -> bool:
+    """Check if daemon socket exists (quick check without connecting).
+    
+    Args:
+        working_dir: Working directory to search from
+        
+    Returns:
+        True if daemon socket file exists
+    """
+    return find_socket_path(working_dir) is not None
@@ -12,6 +12,11 @@ import urllib.request
 import zipfile
 import tempfile
 
+try:
+    from . import request_scope
+except ImportError:
+    import request_scope
+
 # GitHub releases URL
 BV_REPO = "Dicklesworthstone/beads_viewer"
 BV_RELEASES_URL = f"https://api.github.com/repos/{BV_REPO}/releases/latest"
@@ -205,13 +210,8 @@ class BvManager:
         
         try:
             cmd = [bv] + args
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                timeout=timeout,
-                cwd=str(self.workspace)
-            )
+            # Killed with the tool call, within its deadline
+            result = request_scope.run(cmd, timeout=timeout, cwd=str(self.workspace), text=True)
             
             if result.returncode != 0:
                 return {
@@ -230,6 +230,8 @@ class BvManager:
                 
         except subprocess.TimeoutExpired:
             return {'error': f'bv timed out after {timeout}s'}
+        except request_scope.DeadlineExceeded:
+            raise
         except Exception as e:
             return {'error': str(e)}
     
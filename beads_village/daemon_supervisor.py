@@ -0,0 +1,237 @@
+"""
+Daemon Supervisor - Keeps a workspace's bd daemon running while sessions use it
+
+Without a daemon every bd call spawns the CLI. On `init` the server starts
+`bd daemon --start` for its workspace if none answers, then a background
+thread pings it and restarts it with exponential backoff when it dies.
+
+Every local session of the workspace holds a reference in the registry
+(`AgentRegistry.add_daemon_ref`). The session releasing the last reference
+stops the daemon, but only one a supervisor started or restarted: a
+`.managed` marker next to the references records that. A daemon that was
+already running is used and left running. Starts and stops are serialized
+across sessions by a lock file in the same directory.
+"""
+import json
+import os
+import socket
+import subprocess
+import threading
+import time
+from typing import Callable, Optional, Set
+
+try:
+    from . import request_scope
+    from .bd_daemon_client import find_socket_path, forget_socket_path
+except ImportError:
+    import request_scope
+    from bd_daemon_client import find_socket_path, forget_socket_path
+
+# A supervisor lock older than this was left by a crashed session
+LOCK_STALE = 60.0
+
+
+def _bd_daemon(ws: str, flag: str, timeout: float = 30.0) -> bool:
+    """Run `bd daemon <flag>`; killed with the request that started it, if any"""
+    try:
+        result = request_scope.run(["bd", "daemon", flag], timeout=timeout, cwd=ws)
+        return result.returncode == 0
+    except (OSError, subprocess.TimeoutExpired):
+        return False
+
+
+def _ping(ws: str, timeout: float = 2.0) -> bool:
+    """Blocking RPC ping, usable from any thread"""
+    forget_socket_path(ws)
+    path = find_socket_path(ws)
+    if path is None:
+        return False
+    if not hasattr(socket, "AF_UNIX"):
+        return True  # named pipe: the pipe file existing is all we check
+    request = json.dumps({"operation": "ping", "args": {}, "cwd": ws}) + "\n"
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(path)
+            sock.sendall(request.encode())
+            with sock.makefile("rb") as f:
+                response = json.loads(f.readline() or b"{}")
+    except (OSError, ValueError):
+        return False
+    return bool(response.get("success"))
+
+
+class DaemonSupervisor:
+    """Starts, watches and, with the last reference, stops one workspace's daemon.
+
+    `start_daemon`, `stop_daemon` and `alive` default to `bd daemon --start`,
+    `bd daemon --stop` and an RPC ping.
+    """
+
+    def __init__(self, ws: str, registry, agent_id: str, interval: float = 10.0,
+                 max_backoff: float = 300.0,
+                 start_daemon: Optional[Callable[[], bool]] = None,
+                 stop_daemon: Optional[Callable[[], bool]] = None,
+                 alive: Optional[Callable[[], bool]] = None):
+        self.ws = os.path.abspath(ws)
+        self.registry = registry
+        self.agent_id = agent_id
+        self.interval = interval
+        self.max_backoff = max_backoff
+        self.start_daemon = start_daemon or (lambda: _bd_daemon(self.ws, "--start"))
+        self.stop_daemon = stop_daemon or (lambda: _bd_daemon(self.ws, "--stop"))
+        self.alive = alive or (lambda: _ping(self.ws))
+        self.restarts = 0
+        self.failures = 0  # consecutive failed starts
+        self.next_attempt = 0.0
+        self.last_error: Optional[str] = None
+        self.holders: Set[str] = set()  # sessions whose reference this supervisor took
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def _marker(self) -> str:
+        return os.path.join(self.registry.daemon_dir(self.ws), ".managed")
+
+    @property
+    def managed(self) -> bool:
+        return os.path.exists(self._marker)
+
+    def start(self, agent_id: Optional[str] = None) -> bool:
+        """Take a reference for a session (by default `agent_id` of the supervisor),
+        make sure the daemon runs and start watching it.
+
+        Returns whether the daemon answers. Idempotent.
+        """
+        agent_id = agent_id or self.agent_id
+        with self._locked():
+            self.registry.add_daemon_ref(self.ws, agent_id)
+            self.holders.add(agent_id)
+            ok = self._ensure()
+        if self.interval > 0 and not self.running:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="beads-daemon", daemon=True)
+            self._thread.start()
+        return ok
+
+    def stop(self, timeout: float = 1.0, agent_id: Optional[str] = None) -> bool:
+        """Drop a session's reference, or by default every one this supervisor took.
+
+        Watching stops with the last of them. Returns True if the daemon was stopped.
+        """
+        agents = {agent_id} if agent_id else (set(self.holders) or {self.agent_id})
+        self.holders -= agents
+        if not self.holders:
+            self._stop.set()
+            if self._thread is not None:
+                self._thread.join(timeout)
+                self._thread = None
+        with self._locked():
+            left = 0
+            for agent in agents:
+                left = self.registry.drop_daemon_ref(self.ws, agent)
+            if left or not self.managed:
+                return False
+            self.stop_daemon()
+            try:
+                os.remove(self._marker)
+            except OSError:
+                pass
+            return True
+
+    def check(self) -> bool:
+        """One monitoring pass: restart the daemon if it stopped answering"""
+        if self.alive():
+            self.failures = 0
+            return True
+        if time.time() < self.next_attempt:
+            return False
+        with self._locked():
+            return self._ensure(restart=True)
+
+    def stats(self) -> dict:
+        return {
+            "managed": self.managed,
+            "restarts": self.restarts,
+            "failures": self.failures,
+            "refs": len(self.registry.daemon_refs(self.ws)),
+            "last_error": self.last_error,
+        }
+
+    def _ensure(self, restart: bool = False) -> bool:
+        # Another session may have started it while we waited for the lock
+        if self.alive():
+            self.failures = 0
+            return True
+        if self.start_daemon() and self._wait_alive():
+            open(self._marker, 'w').close()
+            forget_socket_path(self.ws)
+            self.failures = 0
+            self.restarts += restart
+            self.last_error = None
+            return True
+        self.failures += 1
+        backoff = min(self.interval * 2 ** (self.failures - 1), self.max_backoff) if self.interval > 0 else 0
+        self.next_attempt = time.time() + backoff
+        self.last_error = f"bd daemon did not start (attempt {self.failures})"
+        return False
+
+    def _wait_alive(self, timeout: float = 5.0) -> bool:
+        deadline = time.time() + timeout
+        while True:
+            if self.alive():
+                return True
+            if time.time() >= deadline:
+                return False
+            time.sleep(0.1)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                self.last_error = str(e)[:200]
+
+    def _locked(self):
+        return _DirLock(os.path.join(self.registry.daemon_dir(self.ws), ".lock"))
+
+
+class _DirLock:
+    """O_EXCL lock file; a stale one (crashed holder) is broken"""
+
+    def __init__(self, path: str, timeout: float = 30.0):
+        self.path = path
+        self.timeout = timeout
+
+    def __enter__(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        deadline = time.time() + self.timeout
+        delay = 0.002
+        while True:
+            try:
+                fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                os.write(fd, str(os.getpid()).encode())
+                os.close(fd)
+                return self
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(self.path) > LOCK_STALE:
+                        os.remove(self.path)
+                        continue
+                except OSError:
+                    continue
+            if time.time() >= deadline:
+                raise TimeoutError(f"daemon supervisor lock busy: {self.path}")
+            time.sleep(delay)
+            delay = min(delay * 2, 0.05)
+
+    def __exit__(self, *exc):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+        return False
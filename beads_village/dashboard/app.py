@@ -17,6 +17,9 @@ from pathlib import Path
 import os
 
 from .watcher import DashboardWatcher
+from ..agent_registry import get_registry
+from ..mail_store import Mailbox
+from ..records import Message as MailMessage, Reservation, iso
 
 
 # ============================================================================
@@ -192,9 +195,8 @@ class TaskDetailWidget(Vertical):
             if not assignee and self.activity:
                 # Find who completed THIS specific task from done messages
                 for act in self.activity:
-                    subj = act.get('s', act.get('subject', ''))
-                    if subj == f'done:{self.task_id}':
-                        assignee = act.get('f', act.get('from', None))
+                    if act.subject == f'done:{self.task_id}':
+                        assignee = act.sender or None
                         break
             assignee_display = assignee if assignee else '[dim]Unassigned[/]'
             # Use appropriate label based on status
@@ -219,9 +221,9 @@ class TaskDetailWidget(Vertical):
             
             if self.activity:
                 for act in self.activity[:10]:
-                    agent = act.get('f', 'unknown')
-                    body = act.get('b', act.get('body', 'No message'))
-                    ts = act.get('ts', '')[:19] if act.get('ts') else ''
+                    agent = act.sender or 'unknown'
+                    body = act.body or 'No message'
+                    ts = iso(act.ts)[:19]
                     yield Static(
                         f"[dim]{ts}[/]\n[b]{agent}:[/b] {body}",
                         classes="activity-item"
@@ -611,6 +613,11 @@ class BeadsVillageDashboard(App):
         self.selected_agent = None
         self.all_teams = {}  # team_name -> {active, total, agents: []}
         self.all_agents = []  # list of agent objects
+        # Registry state kept in sync via delta queries
+        self._registry_version = None
+        self._registry_agents = {}  # (team, agent_id) -> AgentInfo
+        self._mail_agents_key = None
+        self._mail_agents = {}
     
     def compose(self) -> ComposeResult:
         yield Header()
@@ -669,31 +676,36 @@ class BeadsVillageDashboard(App):
         await self.load_recipes("default")
     
     def _load_all_messages(self) -> list:
-        """Load all .mail messages once (for caching)"""
-        messages = []
+        """Load the newest .mail message headers once (for caching), newest first"""
         mail_dir = Path(self.workspace) / '.mail'
         if not mail_dir.exists():
-            return messages
+            return []
         
-        for msg_file in sorted(mail_dir.glob('*.json'), reverse=True)[:200]:
-            try:
-                with open(msg_file, 'r') as f:
-                    msg = json.load(f)
-                    messages.append(msg)
-            except Exception:
-                pass
-        return messages
+        recent = Mailbox(str(mail_dir)).recent(200)
+        return [MailMessage.from_dict(header, msg_id) for msg_id, header in reversed(recent)]
     
     async def load_teams(self) -> None:
         """Load teams from agent registry AND .mail messages (stateless)"""
         try:
             teams = {}
             
-            # Method 1: Try agent registry first
+            # Method 1: Try agent registry first, applying only what changed
             try:
                 from beads_village.agent_registry import get_registry
-                registry = get_registry(self.workspace)
-                all_agents = registry.get_all_agents()
+                delta = get_registry().changes(self._registry_version)
+                if delta['full']:
+                    self._registry_agents = {}
+                for gone in delta['removed']:
+                    self._registry_agents.pop((gone['team'], gone['agent_id']), None)
+                ws = os.path.normpath(self.workspace)
+                for agent in delta['agents']:
+                    key = (agent.team, agent.agent_id)
+                    if agent.workspace and os.path.normpath(agent.workspace) == ws:
+                        self._registry_agents[key] = agent
+                    else:
+                        self._registry_agents.pop(key, None)
+                self._registry_version = delta['version']
+                all_agents = list(self._registry_agents.values())
                 self.all_agents = all_agents
                 
                 for agent in all_agents:
@@ -709,14 +721,21 @@ class BeadsVillageDashboard(App):
             
             # Method 2: Also scan cached .mail for join messages (stateless fallback)
             import re
-            agents_from_mail = {}  # agent_id -> {team, role, is_leader, last_seen}
+            messages = getattr(self, '_cached_messages', [])
+            mail_key = (len(messages), messages[0].id if messages else None)
+            if mail_key == self._mail_agents_key:
+                messages = []  # unchanged since last refresh: reuse parsed agents
+                agents_from_mail = self._mail_agents
+            else:
+                agents_from_mail = {}  # agent_id -> {team, role, is_leader, last_seen}
+                self._mail_agents_key = mail_key
+                self._mail_agents = agents_from_mail
             
-            for msg in getattr(self, '_cached_messages', []):
-                subj = msg.get('s', msg.get('subject', ''))
-                if subj == 'join':
-                    body = msg.get('b', msg.get('body', ''))
-                    sender = msg.get('f', msg.get('from', ''))
-                    ts = msg.get('ts', '')
+            for msg in messages:
+                if msg.subject == 'join':
+                    body = msg.body
+                    sender = msg.sender
+                    ts = msg.ts
                     
                     # Parse: "Agent xxx (role=be) [LEADER] joined workspace yyy"
                     if sender and sender not in agents_from_mail:
@@ -730,7 +749,7 @@ class BeadsVillageDashboard(App):
                             role = role_match.group(1)
                         
                         # Extract team from thread
-                        thread = msg.get('thread', '')
+                        thread = msg.thread
                         if thread:
                             team = thread.split('-')[0] if '-' in thread else thread
                         
@@ -740,7 +759,7 @@ class BeadsVillageDashboard(App):
                             'role': role,
                             'is_leader': is_leader,
                             'last_seen': ts,
-                            'current_task': msg.get('issue', None),
+                            'current_task': msg.issue,
                             'status': 'offline'
                         }
                 
@@ -851,7 +870,7 @@ class BeadsVillageDashboard(App):
             activity = self.get_agent_activity(self.selected_agent)
             
             for msg in activity:
-                subj = msg.get('s', msg.get('subject', ''))
+                subj = msg.subject
                 if subj.startswith('done:'):
                     task_id = subj.replace('done:', '').strip()
                     task_ids.add(task_id)
@@ -868,9 +887,8 @@ class BeadsVillageDashboard(App):
                 # Try to get workspace from done message for this task
                 task_workspace = None
                 for msg in activity:
-                    subj = msg.get('s', msg.get('subject', ''))
-                    if subj == f'done:{task_id}':
-                        task_workspace = msg.get('ws', None)
+                    if msg.subject == f'done:{task_id}':
+                        task_workspace = msg.ws or None
                         break
                 
                 task_data = self.get_task_by_id(task_id, workspace=task_workspace)
@@ -893,7 +911,7 @@ class BeadsVillageDashboard(App):
         task_ids = set()
         
         for msg in getattr(self, '_cached_messages', []):
-            subj = msg.get('s', msg.get('subject', ''))
+            subj = msg.subject
             if subj.startswith('done:'):
                 task_id = subj.replace('done:', '').strip()
                 task_ids.add(task_id)
@@ -905,8 +923,7 @@ class BeadsVillageDashboard(App):
         activity = []
         
         for msg in getattr(self, '_cached_messages', []):
-            sender = msg.get('f', msg.get('from', ''))
-            if agent_id in sender:
+            if agent_id in msg.sender:
                 activity.append(msg)
         
         return activity[:50]  # Return last 50 activities
@@ -1008,18 +1025,11 @@ class BeadsVillageDashboard(App):
             pass
     
     def get_task_activity(self, task_id: str) -> list:
-        """Get activity/done messages related to a task (uses cached messages)"""
-        activity = []
-        
-        for msg in getattr(self, '_cached_messages', []):
-            subject = msg.get('s', msg.get('subject', ''))
-            body = msg.get('b', msg.get('body', ''))
-            
-            # Match "done:task-id" pattern or task_id in body
-            if f'done:{task_id}' in subject or task_id in body or task_id in subject:
-                activity.append(msg)
-        
-        return activity[:20]  # Return last 20 activities
+        """Get activity messages of a task via the mail thread index"""
+        mailbox = Mailbox(str(Path(self.workspace) / '.mail'))
+        thread = mailbox.thread(task_id, limit=20)
+        # Newest first, like the cached message list; full bodies for the detail view
+        return [MailMessage.from_dict(mailbox.read(msg_id) or msg, msg_id) for msg_id, msg in reversed(thread)]
     
     def on_task_card_selected(self, event: TaskCard.Selected) -> None:
         """Handle task card selection - show detail in center panel"""
@@ -1050,17 +1060,19 @@ class BeadsVillageDashboard(App):
             
             content = []
             now = datetime.now().timestamp()
+            registry = get_registry()
+            holders = {}  # registry lookups shared across the scan
             
             for lock_file in locks_dir.glob('*.json'):
                 try:
                     with open(lock_file, 'r') as f:
-                        lock = json.load(f)
+                        lock = Reservation.from_dict(json.load(f))
                     
-                    path = lock.get('path', lock_file.stem)
-                    agent = lock.get('agent', 'unknown')
-                    expires = lock.get('expires', 0)
+                    path = lock.path or lock_file.stem
+                    agent = lock.agent or 'unknown'
                     
-                    ttl = int(expires - now)
+                    # Heartbeats renew reservations past their file expiry
+                    ttl = int(registry.reservation_expires(lock, str(self.workspace), holders) - now)
                     if ttl < 0:
                         continue  # Expired
                     
@@ -1086,11 +1098,9 @@ class BeadsVillageDashboard(App):
             # Update messages list (now a Static inside MessagesWidget)
             content_lines = []
             for msg in messages:
-                importance = msg.get('importance', msg.get('imp', 'normal'))
-                importance_class = f"message-{importance}"
-                # Handle both old format (subject) and new format (s)
-                subj = msg.get('subject', msg.get('s', 'No subject'))[:40]
-                sender = msg.get('from', msg.get('f', 'unknown'))
+                importance_class = f"message-{msg.importance}"
+                subj = (msg.subject or 'No subject')[:40]
+                sender = msg.sender or 'unknown'
                 content_lines.append(f"[{importance_class}][b]{subj}[/b][/]\nFrom: {sender}\n")
             
             if not content_lines:
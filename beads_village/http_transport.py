@@ -0,0 +1,404 @@
+"""
+HTTP Transport - MCP over streamable HTTP, for one server per host
+
+A long-running alternative to one stdio process per IDE window. Clients
+POST JSON-RPC messages (one or a batch) to /mcp and get the responses back
+as JSON or, if they only accept `text/event-stream`, as an SSE stream.
+The server sends nothing unprompted, so there is no GET stream: a GET on
+/mcp is answered 405, as the spec allows. Connections are HTTP/1.1
+keep-alive.
+
+`initialize` opens a session and returns its id in the `Mcp-Session-Id`
+header; later requests must send it back. Each session has its own
+server.State (agent, workspace and team from the `agent`, `ws` and `team`
+query parameters of the endpoint URL), so one server hosts many agents
+while sharing warm workspace contexts. Requests run on worker threads,
+because tools block on bd; those of one session run one at a time, as on
+stdio. DELETE ends a session, as does BEADS_HTTP_SESSION_TTL seconds
+without requests.
+
+Those query parameters are not authenticated: whoever reaches the port can
+act as any agent in any workspace. The server is meant for 127.0.0.1 and
+refuses to bind anything but a loopback address unless BEADS_HTTP_TOKEN is
+set, in which case every request must carry `Authorization: Bearer <token>`.
+
+    python -m beads_village.http_transport   # BEADS_HTTP_HOST:BEADS_HTTP_PORT
+"""
+import asyncio
+import contextvars
+import hmac
+import ipaddress
+import json
+import os
+import signal
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Set
+from urllib.parse import parse_qs, urlsplit
+
+try:
+    from . import server
+except ImportError:
+    import server
+
+HOST = os.environ.get("BEADS_HTTP_HOST", "127.0.0.1")
+PORT = int(os.environ.get("BEADS_HTTP_PORT", "8765"))
+
+# Shared secret clients send as a bearer token; required off loopback
+TOKEN = os.environ.get("BEADS_HTTP_TOKEN", "")
+
+# Sessions without a request for this many seconds are ended
+SESSION_TTL = float(os.environ.get("BEADS_HTTP_SESSION_TTL", "3600"))
+
+# Requests of different sessions running at once
+WORKERS = int(os.environ.get("BEADS_HTTP_WORKERS", "16"))
+
+ENDPOINT = "/mcp"
+SESSION_HEADER = "mcp-session-id"
+KEEPALIVE_TIMEOUT = 75.0  # idle keep-alive connections are closed after this
+MAX_BODY = 4 * 1024 * 1024
+
+REASONS = {200: "OK", 202: "Accepted", 400: "Bad Request", 401: "Unauthorized", 403: "Forbidden",
+           404: "Not Found", 405: "Method Not Allowed", 406: "Not Acceptable",
+           411: "Length Required", 413: "Payload Too Large", 415: "Unsupported Media Type"}
+
+class HttpSession:
+    """One MCP session: its State and request lock"""
+
+    def __init__(self, session_id: str, state: server.State):
+        self.id = session_id
+        self.state = state
+        self.lock = asyncio.Lock()
+        self.last_used = time.time()
+
+
+class _Request:
+    __slots__ = ('method', 'path', 'query', 'version', 'headers', 'body')
+
+    def __init__(self, method, target, version, headers, body):
+        parts = urlsplit(target)
+        self.method = method
+        self.path = parts.path
+        self.query = {k: v[-1] for k, v in parse_qs(parts.query).items()}
+        self.version = version
+        self.headers = headers
+        self.body = body
+
+    @property
+    def keep_alive(self) -> bool:
+        conn = self.headers.get("connection", "").lower()
+        if self.version == "HTTP/1.0":
+            return conn == "keep-alive"
+        return conn != "close"
+
+    def accepts(self, media_type: str) -> bool:
+        accept = self.headers.get("accept", "*/*")
+        return media_type in accept or "*/*" in accept
+
+
+class HttpTransport:
+    """Streamable HTTP MCP server; `start` it on a running loop"""
+
+    def __init__(self, host: str = HOST, port: int = PORT, session_ttl: float = SESSION_TTL,
+                 workers: int = WORKERS, token: str = TOKEN):
+        if not token and not _is_loopback(host):
+            raise ValueError(f"refusing to serve on {host} without BEADS_HTTP_TOKEN: "
+                             "sessions are not authenticated")
+        self.host = host
+        self.port = port
+        self.token = token
+        self.session_ttl = session_ttl
+        self.sessions: Dict[str, HttpSession] = {}
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="beads-http")
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._reaper: Optional[asyncio.Task] = None
+        self._connections: Set[asyncio.Task] = set()
+        self._local = threading.local()  # event loop of each worker thread
+        self._loops = []
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._serve_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]  # port 0 picks a free one
+        self._reaper = asyncio.ensure_future(self._reap_sessions())
+
+    async def stop(self) -> None:
+        """Stop listening and end every session"""
+        if self._reaper is not None:
+            self._reaper.cancel()
+        if self._server is not None:
+            self._server.close()
+            # Idle keep-alive connections
+            for task in list(self._connections):
+                task.cancel()
+            await asyncio.gather(*self._connections, return_exceptions=True)
+            await self._server.wait_closed()
+        for session in list(self.sessions.values()):
+            await self._end_session(session)
+        self.executor.shutdown(wait=True)
+        for loop in self._loops:
+            loop.close()
+
+    def _in_session(self, state: server.State, req: Optional[dict]) -> Optional[dict]:
+        """On a worker thread: handle `req` as `state`'s session, or end it (None)"""
+        loop = getattr(self._local, "loop", None)
+        if loop is None:
+            loop = self._local.loop = asyncio.new_event_loop()
+            self._loops.append(loop)
+        server.bind_session(state)
+        if req is None:
+            server.end_session()
+            return None
+        try:
+            return loop.run_until_complete(server.handle_request(req))
+        except asyncio.CancelledError:
+            return None  # cancelled requests get no response
+
+    async def _run(self, session: HttpSession, req: Optional[dict]) -> Optional[dict]:
+        loop = asyncio.get_event_loop()
+        # A fresh context per call: the worker thread's binding does not leak
+        call = contextvars.Context().run
+        async with session.lock:
+            session.last_used = time.time()
+            return await loop.run_in_executor(self.executor, call, self._in_session, session.state, req)
+
+    async def _end_session(self, session: HttpSession) -> None:
+        self.sessions.pop(session.id, None)
+        await self._run(session, None)
+
+    async def _reap_sessions(self) -> None:
+        while True:
+            await asyncio.sleep(min(60.0, max(self.session_ttl / 4, 0.05)))
+            cutoff = time.time() - self.session_ttl
+            for session in [s for s in self.sessions.values() if s.last_used < cutoff]:
+                await self._end_session(session)
+
+    # ------------------------------------------------------------------
+    # HTTP/1.1
+    # ------------------------------------------------------------------
+
+    async def _serve_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        task = asyncio.current_task()
+        self._connections.add(task)
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(_read_request(reader), KEEPALIVE_TIMEOUT)
+                except _HttpError as e:
+                    await _respond(writer, e.status, {"error": e.message}, keep_alive=False)
+                    break
+                if request is None or not await self._dispatch(request, writer):
+                    break
+        except (asyncio.TimeoutError, ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._connections.discard(task)
+            writer.close()
+
+    async def _dispatch(self, request: _Request, writer: asyncio.StreamWriter) -> bool:
+        """Answer one request; returns whether the connection stays open"""
+        keep = request.keep_alive
+        if request.path != ENDPOINT:
+            return await _respond(writer, 404, {"error": f"not found: {request.path}"}, keep_alive=keep)
+        if not _origin_allowed(request.headers.get("origin")):
+            return await _respond(writer, 403, {"error": "origin not allowed"}, keep_alive=keep)
+        if self.token and not _token_matches(request.headers.get("authorization", ""), self.token):
+            return await _respond(writer, 401, {"error": "missing or wrong bearer token"},
+                                  keep_alive=keep, headers={"WWW-Authenticate": "Bearer"})
+        if request.method == "POST":
+            return await self._post(request, writer)
+        if request.method == "DELETE":
+            session = self.sessions.get(request.headers.get(SESSION_HEADER, ""))
+            if session is None:
+                return await _respond(writer, 404, {"error": "unknown session"}, keep_alive=keep)
+            await self._end_session(session)
+            return await _respond(writer, 200, None, keep_alive=keep)
+        return await _respond(writer, 405, {"error": f"method not allowed: {request.method}"},
+                              keep_alive=keep, headers={"Allow": "POST, DELETE"})
+
+    async def _post(self, request: _Request, writer: asyncio.StreamWriter) -> bool:
+        keep = request.keep_alive
+        try:
+            payload = json.loads(request.body.decode())
+        except (UnicodeDecodeError, json.JSONDecodeError):
+            return await _respond(writer, 400, _rpc_error(None, -32700, "Parse error"), keep_alive=keep)
+        messages = payload if isinstance(payload, list) else [payload]
+        if not messages or not all(isinstance(m, dict) for m in messages):
+            return await _respond(writer, 400, _rpc_error(None, -32600, "Invalid Request"), keep_alive=keep)
+
+        headers = {}
+        if any(m.get("method") == "initialize" for m in messages):
+            session = self._open_session(request.query)
+            headers["Mcp-Session-Id"] = session.id
+        else:
+            session_id = request.headers.get(SESSION_HEADER)
+            if not session_id:
+                return await _respond(writer, 400, {"error": "missing Mcp-Session-Id header",
+                                                    "hint": "Send initialize first"}, keep_alive=keep)
+            session = self.sessions.get(session_id)
+            if session is None:
+                return await _respond(writer, 404, {"error": "unknown session",
+                                                    "hint": "Session ended; initialize again"}, keep_alive=keep)
+
+        # Responses from the client and notifications get no answer
+        replies = []
+        for message in messages:
+            if "method" not in message:
+                continue
+            if message["method"] == "notifications/cancelled":
+                # Not behind the session lock: the request it names holds it
+                server.cancel_request(session.state, (message.get("params") or {}).get("requestId"))
+                continue
+            response = await self._run(session, message)
+            if response is not None and "id" in message:
+                replies.append(response)
+        if not replies:
+            return await _respond(writer, 202, None, keep_alive=keep, headers=headers)
+
+        body = replies if isinstance(payload, list) else replies[0]
+        if request.accepts("application/json"):
+            return await _respond(writer, 200, body, keep_alive=keep, headers=headers)
+        if request.accepts("text/event-stream"):
+            await _start_sse(writer, headers)
+            for reply in replies:
+                await _write_chunk(writer, _sse_event(reply))
+            await _write_chunk(writer, b"")
+            return keep
+        return await _respond(writer, 406, {"error": "accept application/json or text/event-stream"},
+                              keep_alive=keep)
+
+    def _open_session(self, query: Dict[str, str]) -> HttpSession:
+        session_id = uuid.uuid4().hex
+        state = server.State(
+            agent=query.get("agent") or f"agent-{session_id[:8]}",
+            ws=os.path.abspath(query.get("ws") or server.WS),
+            team=query.get("team") or server.TEAM,
+        )
+        session = self.sessions[session_id] = HttpSession(session_id, state)
+        return session
+
+
+class _HttpError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+async def _read_request(reader: asyncio.StreamReader) -> Optional[_Request]:
+    """Next request on a keep-alive connection, None once the client closed it"""
+    line = await reader.readline()
+    if not line.strip():
+        return None
+    try:
+        method, target, version = line.decode("latin-1").split()
+    except ValueError:
+        raise _HttpError(400, "malformed request line")
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    body = b""
+    if method == "POST":
+        if "chunked" in headers.get("transfer-encoding", ""):
+            raise _HttpError(411, "chunked request bodies are not supported")
+        try:
+            length = int(headers.get("content-length", ""))
+        except ValueError:
+            raise _HttpError(411, "Content-Length required")
+        if length > MAX_BODY:
+            raise _HttpError(413, f"body over {MAX_BODY} bytes")
+        body = await reader.readexactly(length)
+    return _Request(method, target, version, headers, body)
+
+
+def _origin_allowed(origin: Optional[str]) -> bool:
+    """Browsers send Origin; only local pages may call (DNS rebinding guard)"""
+    if not origin:
+        return True
+    host = urlsplit(origin).hostname or ""
+    return host in ("localhost", "127.0.0.1", "::1")
+
+
+def _is_loopback(host: str) -> bool:
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def _token_matches(authorization: str, token: str) -> bool:
+    scheme, _, value = authorization.partition(" ")
+    return scheme.lower() == "bearer" and hmac.compare_digest(value.strip().encode(), token.encode())
+
+
+def _rpc_error(req_id, code: int, message: str) -> dict:
+    return {"jsonrpc": "2.0", "id": req_id, "error": {"code": code, "message": message}}
+
+
+def _sse_event(message: dict) -> bytes:
+    return f"event: message\ndata: {json.dumps(message)}\n\n".encode()
+
+
+async def _respond(writer: asyncio.StreamWriter, status: int, body, keep_alive: bool = True,
+                   headers: Dict[str, str] = None) -> bool:
+    data = b"" if body is None else json.dumps(body).encode()
+    lines = [f"HTTP/1.1 {status} {REASONS.get(status, '')}",
+             f"Content-Length: {len(data)}",
+             f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+    if body is not None:
+        lines.append("Content-Type: application/json")
+    lines += [f"{k}: {v}" for k, v in (headers or {}).items()]
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode() + data)
+    await writer.drain()
+    return keep_alive
+
+
+async def _start_sse(writer: asyncio.StreamWriter, headers: Dict[str, str]) -> None:
+    lines = ["HTTP/1.1 200 OK", "Content-Type: text/event-stream", "Cache-Control: no-cache",
+             "Transfer-Encoding: chunked"]
+    lines += [f"{k}: {v}" for k, v in headers.items()]
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode())
+    await writer.drain()
+
+
+async def _write_chunk(writer: asyncio.StreamWriter, data: bytes) -> None:
+    """One chunk of a chunked body; empty data ends the body"""
+    writer.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+    await writer.drain()
+
+
+async def serve(host: str = HOST, port: int = PORT) -> None:
+    transport = HttpTransport(host, port)
+    await transport.start()
+    stopped = asyncio.Event()
+    try:
+        asyncio.get_event_loop().add_signal_handler(signal.SIGTERM, stopped.set)
+    except NotImplementedError:
+        pass  # Windows: Ctrl+C only
+    try:
+        await stopped.wait()
+    finally:
+        await transport.stop()
+        # Flushes pending syncs and releases managed daemons
+        server._workspaces.close_all()
+
+
+def main():
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+    except ValueError as e:
+        sys.exit(f"beads-village: {e}")
+
+
+if __name__ == "__main__":
+    main()
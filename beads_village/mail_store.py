@@ -0,0 +1,825 @@
+"""
+Mail Store - File-backed message store with retention and archival
+
+Live messages are one JSON file per message, named ``<ts>_<rand>.json`` so that
+lexical order is time order. Old messages are folded into gzip-compressed JSONL
+archive segments under ``archive/`` which stay queryable. Message files
+compaction cannot parse are moved to ``.quarantine/`` rather than deleted.
+
+A sharded mailbox (the team hub) keeps live messages in per-day buckets
+(``<YYYYMMDD>/``, UTC) listed in ``manifest.json``; readers with a cursor only
+touch buckets that can hold newer messages. An unsharded mailbox (workspace
+``.mail/``) is a single bucket rooted at the mailbox directory.
+
+Message files hold only the header: sender, recipients, subject, a short body
+preview (``b``) and the full body length (``bl``). Longer bodies go to a
+zlib-compressed blob store (``.blobs/<id>.z`` per bucket) and are fetched on
+demand with ``read()``.
+
+Secondary indexes live under ``.index/`` and carry the headers themselves, so
+inbox and thread queries never open message files: ``threads/<key>.idx``
+(mailbox root) lists a thread in send order, ``to/<key>.idx`` (per bucket)
+the messages addressed to a recipient (``all`` for broadcasts). A message
+addressed to several agents is stored once and fanned out only through the
+recipient index. Bare-ID lines written by older versions resolve to the live
+file or, once compacted, to the archive segment whose ID range contains them.
+"""
+import bisect
+import calendar
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+import uuid
+import zlib
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+ARCHIVE_DIR = 'archive'
+INDEX_DIR = '.index'
+MANIFEST_FILE = 'manifest.json'
+BLOB_DIR = '.blobs'
+QUARANTINE_DIR = '.quarantine'  # unreadable message files set aside by compaction
+SEGMENT_SUFFIX = '.jsonl.gz'
+SEGMENT_SEP = '--'
+
+# Default retention policy (overridable per call)
+DEFAULT_MAX_AGE = 7 * 24 * 3600  # seconds
+DEFAULT_KEEP = 500  # newest messages always kept live
+DEFAULT_COMPACT_INTERVAL = 3600  # seconds between automatic compactions
+
+# Bodies up to this many characters are stored inline in the header
+BODY_PREVIEW = 100
+
+# Recipient indexes are trimmed on compaction once they exceed this size
+INDEX_TRIM_SIZE = 64 * 1024
+
+# A compaction lock older than this is considered abandoned
+LOCK_STALE_AFTER = 300
+
+# An index lock is held for one append or rewrite; older ones were abandoned
+FILE_LOCK_STALE_AFTER = 10
+
+
+def message_ts(msg_id: str) -> float:
+    """Get the send timestamp encoded in a message ID (0.0 if malformed)"""
+    try:
+        return float(msg_id.split('_', 1)[0])
+    except ValueError:
+        return 0.0
+
+
+def new_message_id(ts: Optional[float] = None) -> str:
+    """Create a time-ordered message ID"""
+    if ts is None:
+        ts = time.time()
+    return f"{ts:.6f}_{uuid.uuid4().hex[:6]}"
+
+
+def bucket_name(ts: float) -> str:
+    """Day bucket (UTC) holding a timestamp"""
+    return time.strftime('%Y%m%d', time.gmtime(ts))
+
+
+def bucket_range(name: str) -> Tuple[float, float]:
+    """[start, end) timestamps covered by a day bucket"""
+    start = calendar.timegm(time.strptime(name, '%Y%m%d'))
+    return float(start), float(start + 86400)
+
+
+def recipients(msg: dict) -> List[str]:
+    """Recipient list of a message (``t`` is a single ID or a list)"""
+    to = msg.get('t', 'all')
+    if isinstance(to, list):
+        return [str(r) for r in to]
+    return [str(to)] if to else ['all']
+
+
+def header_of(msg: dict) -> dict:
+    """Header view of a message: body cut to a preview, full length in ``bl``"""
+    if 'bl' in msg:
+        return msg
+    header = dict(msg)
+    body = header.get('b', '') or ''
+    header['b'] = body[:BODY_PREVIEW]
+    header['bl'] = len(body)
+    return header
+
+
+def _entry(line: str) -> Tuple[str, Optional[dict]]:
+    """Parse an index line into (id, header); header is None for bare-ID lines"""
+    if line.startswith('{'):
+        try:
+            header = json.loads(line)
+            return header.get('id', ''), header
+        except json.JSONDecodeError:
+            return '', None
+    return line, None
+
+
+def _is_bucket(name: str) -> bool:
+    return len(name) == 8 and name.isdigit()
+
+
+def _index_key(value: str) -> str:
+    """Filesystem-safe key for an index file"""
+    return hashlib.sha1(value.encode('utf-8')).hexdigest()[:16]
+
+
+class _FileLock:
+    """O_EXCL lock file next to ``path``: appends and rewrites of it take turns"""
+
+    def __init__(self, path: str):
+        self.lock = path + '.lock'
+
+    def __enter__(self):
+        delay = 0.001
+        while True:
+            try:
+                os.close(os.open(self.lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                return self
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(self.lock) > FILE_LOCK_STALE_AFTER:
+                        os.remove(self.lock)  # left behind by a crashed writer
+                        continue
+                except OSError:
+                    continue
+            time.sleep(delay)
+            delay = min(delay * 2, 0.02)
+
+    def __exit__(self, *exc):
+        try:
+            os.remove(self.lock)
+        except OSError:
+            pass
+        return False
+
+
+def _atomic_write(path: str, data: bytes) -> None:
+    """Write bytes to path via temp file + rename"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except OSError:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def _list_ids(directory: str) -> List[str]:
+    """Sorted message IDs stored directly in a directory"""
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return []
+    return sorted(
+        n[:-5] for n in names
+        if n.endswith('.json') and not n.startswith('.') and n != MANIFEST_FILE
+    )
+
+
+class Mailbox:
+    """
+    A single mail directory (workspace ``.mail/`` or a team hub).
+    """
+
+    def __init__(self, path: str, sharded: bool = False):
+        self.path = path
+        self.sharded = sharded
+        self.archive_dir = os.path.join(path, ARCHIVE_DIR)
+        self.index_dir = os.path.join(path, INDEX_DIR)
+        self.manifest_path = os.path.join(path, MANIFEST_FILE)
+        self._segment_cache: Dict[str, Dict[str, dict]] = {}
+
+    # ------------------------------------------------------------------
+    # Buckets
+    # ------------------------------------------------------------------
+
+    def _bucket_of(self, msg_id: str) -> str:
+        return bucket_name(message_ts(msg_id)) if self.sharded else ''
+
+    def _bucket_dir(self, bucket: str) -> str:
+        return os.path.join(self.path, bucket) if bucket else self.path
+
+    def _read_manifest(self) -> Optional[List[str]]:
+        try:
+            with open(self.manifest_path, encoding='utf-8') as f:
+                data = json.load(f)
+            return sorted(b for b in data.get('buckets', []) if _is_bucket(b))
+        except (json.JSONDecodeError, OSError, AttributeError):
+            return None
+
+    def _write_manifest(self, buckets: List[str]) -> None:
+        data = json.dumps({'buckets': sorted(set(buckets)), 'updated': time.time()})
+        _atomic_write(self.manifest_path, data.encode('utf-8'))
+
+    def _bucket_dirs(self) -> List[str]:
+        try:
+            return [n for n in os.listdir(self.path)
+                    if _is_bucket(n) and os.path.isdir(os.path.join(self.path, n))]
+        except OSError:
+            return []
+
+    def _update_manifest(self, add=(), drop=()) -> None:
+        """Add and drop buckets, merging with whatever the manifest holds now
+
+        Writers register buckets while compaction drops them; the manifest
+        lock and the re-read keep either from undoing the other.
+        """
+        with _FileLock(self.manifest_path):
+            known = self._read_manifest()
+            if known is None:
+                known = self._bucket_dirs()
+            self._write_manifest((set(known) | set(add)) - set(drop))
+
+    def rebuild_manifest(self) -> List[str]:
+        """Recreate the manifest from the bucket directories on disk.
+
+        Also moves flat messages left by an unsharded hub into their buckets.
+        """
+        os.makedirs(self.path, exist_ok=True)
+        moved = 0
+        for msg_id in _list_ids(self.path):
+            bucket = self._bucket_of(msg_id)
+            os.makedirs(self._bucket_dir(bucket), exist_ok=True)
+            try:
+                os.replace(os.path.join(self.path, f"{msg_id}.json"),
+                           os.path.join(self._bucket_dir(bucket), f"{msg_id}.json"))
+                moved += 1
+            except OSError:
+                pass
+        with _FileLock(self.manifest_path):
+            buckets = self._bucket_dirs()
+            self._write_manifest(buckets)
+        if moved:
+            # Recipient indexes of the flat layout point at the old locations
+            shutil.rmtree(os.path.join(self.index_dir, 'to'), ignore_errors=True)
+            self.rebuild_indexes()
+        return sorted(buckets)
+
+    def buckets(self) -> List[str]:
+        """Bucket names, oldest first (``['']`` when unsharded)"""
+        if not self.sharded:
+            return ['']
+        buckets = self._read_manifest()
+        if buckets is None:
+            if not os.path.isdir(self.path):
+                return []
+            buckets = self.rebuild_manifest()
+        return buckets
+
+    def _ensure_bucket(self, bucket: str) -> None:
+        """Create a bucket directory and register it in the manifest
+
+        Membership is checked in the manifest, not on disk: a directory can
+        outlive its manifest entry if compaction dropped it meanwhile.
+        """
+        os.makedirs(self._bucket_dir(bucket), exist_ok=True)
+        if not bucket or bucket in (self._read_manifest() or []):
+            return
+        self._update_manifest(add=[bucket])
+
+    # ------------------------------------------------------------------
+    # Live messages
+    # ------------------------------------------------------------------
+
+    def _message_ids(self) -> List[str]:
+        """Sorted IDs of live messages"""
+        ids: List[str] = []
+        for bucket in self.buckets():
+            ids.extend(_list_ids(self._bucket_dir(bucket)))
+        return ids
+
+    def _message_path(self, msg_id: str) -> str:
+        return os.path.join(self._bucket_dir(self._bucket_of(msg_id)), f"{msg_id}.json")
+
+    def _blob_path(self, msg_id: str) -> str:
+        return os.path.join(self._bucket_dir(self._bucket_of(msg_id)), BLOB_DIR, f"{msg_id}.z")
+
+    def write(self, msg: dict, ts: Optional[float] = None) -> str:
+        """Store a message and return its ID"""
+        msg_id = new_message_id(ts)
+        bucket = self._bucket_of(msg_id)
+        if self.sharded and not os.path.exists(self.manifest_path):
+            self.rebuild_manifest()
+        self._ensure_bucket(bucket)
+
+        header = header_of(msg)
+        body = msg.get('b', '') or ''
+        if len(body) > BODY_PREVIEW:
+            blob = self._blob_path(msg_id)
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            with open(blob, 'wb') as f:
+                f.write(zlib.compress(body.encode('utf-8')))
+        with open(self._message_path(msg_id), 'w', encoding='utf-8') as f:
+            json.dump(header, f)
+
+        if not os.path.isdir(self.index_dir):
+            # First indexed write to a legacy mailbox: backfill (includes this message)
+            self.rebuild_indexes()
+        else:
+            line = json.dumps(dict(header, id=msg_id), separators=(',', ':'), ensure_ascii=False)
+            if header.get('thread'):
+                self._append_index('threads', header['thread'], line)
+            for recipient in recipients(header):
+                self._append_index('to', recipient, line, bucket)
+        return msg_id
+
+    def load(self, msg_id: str) -> Optional[dict]:
+        """Load the header of a live message by ID"""
+        try:
+            with open(self._message_path(msg_id), encoding='utf-8') as f:
+                return header_of(json.load(f))
+        except (json.JSONDecodeError, OSError):
+            return None
+
+    def _load_raw(self, msg_id: str) -> Optional[dict]:
+        try:
+            with open(self._message_path(msg_id), encoding='utf-8') as f:
+                return json.load(f)
+        except (json.JSONDecodeError, OSError):
+            return None
+
+    def body(self, msg_id: str, header: Optional[dict] = None) -> Optional[str]:
+        """Full body of a live message (decompressed from the blob store)"""
+        raw = header if header is not None else self._load_raw(msg_id)
+        if raw is None:
+            return None
+        if 'bl' not in raw or raw['bl'] <= len(raw.get('b', '')):
+            return raw.get('b', '')
+        try:
+            with open(self._blob_path(msg_id), 'rb') as f:
+                return zlib.decompress(f.read()).decode('utf-8')
+        except (OSError, zlib.error):
+            return None
+
+    def read(self, msg_id: str) -> Optional[dict]:
+        """Full message (header plus complete body) from live storage or the archive"""
+        raw = self._load_raw(msg_id)
+        if raw is None:
+            return self._archived(msg_id)
+        msg = dict(raw)
+        body = self.body(msg_id, raw)
+        if body is not None:
+            msg['b'] = body
+        msg.pop('bl', None)
+        return msg
+
+    def recent(self, limit: int = 50) -> List[Tuple[str, dict]]:
+        """Get the newest live messages as (id, message), oldest first"""
+        ids: List[str] = []
+        for bucket in reversed(self.buckets()):
+            ids = _list_ids(self._bucket_dir(bucket)) + ids
+            if len(ids) >= limit:
+                break
+        result = []
+        for msg_id in ids[-limit:]:
+            msg = self.load(msg_id)
+            if msg is not None:
+                result.append((msg_id, msg))
+        return result
+
+    def count(self) -> int:
+        """Number of live messages"""
+        return len(self._message_ids())
+
+    def get(self, msg_id: str) -> Optional[dict]:
+        """Load a message header by ID from live storage or the archive"""
+        msg = self.load(msg_id)
+        if msg is not None:
+            return msg
+        archived = self._archived(msg_id)
+        return header_of(archived) if archived is not None else None
+
+    # ------------------------------------------------------------------
+    # Indexes
+    # ------------------------------------------------------------------
+
+    def _index_path(self, kind: str, value: str, bucket: str = '') -> str:
+        base = os.path.join(self._bucket_dir(bucket), INDEX_DIR)
+        return os.path.join(base, kind, f"{_index_key(value)}.idx")
+
+    def _append_index(self, kind: str, value: str, line: str, bucket: str = '') -> None:
+        """Append a header line to an index (single O_APPEND write)
+
+        Under the index lock, so a concurrent trim cannot drop the line.
+        """
+        path = self._index_path(kind, value, bucket)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with _FileLock(path), open(path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+        except OSError:
+            pass
+
+    def _resolve(self, lines: List[str]) -> Dict[str, dict]:
+        """Map index lines to {id: header}, loading only legacy bare-ID lines"""
+        result: Dict[str, dict] = {}
+        for line in lines:
+            msg_id, header = _entry(line)
+            if not msg_id:
+                continue
+            if header is None:
+                header = self.get(msg_id)
+                if header is None:
+                    continue
+            else:
+                header.pop('id', None)
+            result[msg_id] = header
+        return result
+
+    def _read_index(self, kind: str, value: str, bucket: str = '') -> List[str]:
+        try:
+            with open(self._index_path(kind, value, bucket), encoding='utf-8') as f:
+                return [line.strip() for line in f if line.strip()]
+        except OSError:
+            return []
+
+    def _tail_index(self, kind: str, value: str, limit: int, bucket: str = '') -> List[str]:
+        """Read the last ``limit`` lines of an index without reading all of it"""
+        try:
+            with open(self._index_path(kind, value, bucket), 'rb') as f:
+                f.seek(0, os.SEEK_END)
+                end = f.tell()
+                block = 4096
+                data = b''
+                pos = end
+                while pos > 0 and data.count(b'\n') <= limit:
+                    pos = max(0, pos - block)
+                    f.seek(pos)
+                    data = f.read(end - pos)
+                    block *= 2
+        except OSError:
+            return []
+        lines = [l.strip() for l in data.decode('utf-8', 'replace').splitlines()]
+        if pos > 0:
+            lines = lines[1:]  # first line may be partial
+        return [l for l in lines if l][-limit:]
+
+    def rebuild_indexes(self) -> int:
+        """Rebuild secondary indexes from live and archived messages.
+
+        Used to migrate mailboxes written before indexes existed.
+        """
+        def line(msg_id: str, msg: dict) -> str:
+            header = dict(header_of(msg), id=msg_id)
+            return json.dumps(header, separators=(',', ':'), ensure_ascii=False)
+
+        threads: Dict[str, Dict[str, str]] = {}
+        for name, _, _ in self.segments():
+            for msg in self.read_segment(name):
+                if msg.get('thread') and msg.get('id'):
+                    threads.setdefault(msg['thread'], {})[msg['id']] = line(msg['id'], msg)
+        # Recipient indexes only cover live messages (inbox never reads the archive)
+        to: Dict[Tuple[str, str], Dict[str, str]] = {}
+        for msg_id in self._message_ids():
+            msg = self.load(msg_id)
+            if not msg:
+                continue
+            entry = line(msg_id, msg)
+            if msg.get('thread'):
+                threads.setdefault(msg['thread'], {})[msg_id] = entry
+            for recipient in recipients(msg):
+                to.setdefault((self._bucket_of(msg_id), recipient), {})[msg_id] = entry
+
+        os.makedirs(os.path.join(self.index_dir, 'threads'), exist_ok=True)
+        indexes = [(self._index_path('threads', t), e) for t, e in threads.items()]
+        indexes += [(self._index_path('to', r, b), e) for (b, r), e in to.items()]
+        for path, entries in indexes:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            data = ''.join(entries[i] + '\n' for i in sorted(entries)).encode('utf-8')
+            with _FileLock(path):
+                _atomic_write(path, data)
+        return len(indexes)
+
+    def inbox(self, agent_id: str, limit: int = 50,
+              since: Optional[float] = None) -> List[Tuple[str, dict]]:
+        """Newest live message headers addressed to ``agent_id`` or ``all``, oldest first.
+
+        Reads the tails of two recipient indexes per bucket instead of listing
+        the mail directory, newest bucket first, and never opens buckets that
+        end before ``since``. Message files and bodies are not read.
+        """
+        if not os.path.isdir(self.index_dir):
+            if not os.path.isdir(self.path):
+                return []
+            self.rebuild_indexes()
+
+        lines: List[str] = []
+        for bucket in reversed(self.buckets()):
+            if since is not None and bucket and bucket_range(bucket)[1] <= since:
+                break
+            lines.extend(self._tail_index('to', 'all', limit, bucket))
+            if agent_id != 'all':
+                lines.extend(self._tail_index('to', agent_id, limit, bucket))
+            if len(lines) >= limit:
+                break
+
+        ids = sorted(i for i in (_entry(l)[0] for l in lines) if i)
+        ids = ids[-limit:]
+        if since is not None:
+            ids = [i for i in ids if message_ts(i) > since]
+        wanted = set(ids)
+        headers = self._resolve([l for l in lines if _entry(l)[0] in wanted])
+        return [(i, headers[i]) for i in sorted(headers)]
+
+    def thread(self, thread_id: str, limit: Optional[int] = None) -> List[Tuple[str, dict]]:
+        """Get the messages of a thread as (id, message), oldest first.
+
+        Cost is proportional to the thread size, not to the mailbox size.
+        """
+        if not thread_id:
+            return []
+        if not os.path.isdir(self.index_dir) and os.path.isdir(self.path):
+            self.rebuild_indexes()
+
+        lines = self._read_index('threads', thread_id)
+        if limit is not None:
+            lines = lines[-limit:]
+        headers = self._resolve(lines)
+        # Guard against index key collisions
+        return [(i, h) for i, h in sorted(headers.items()) if h.get('thread') == thread_id]
+
+    # ------------------------------------------------------------------
+    # Archive
+    # ------------------------------------------------------------------
+
+    def segments(self) -> List[Tuple[str, str, str]]:
+        """Archive segments as (name, first_id, last_id), oldest first"""
+        try:
+            names = os.listdir(self.archive_dir)
+        except OSError:
+            return []
+        result = []
+        for name in sorted(names):
+            if not name.endswith(SEGMENT_SUFFIX):
+                continue
+            first, _, last = name[:-len(SEGMENT_SUFFIX)].partition(SEGMENT_SEP)
+            if first and last:
+                result.append((name, first, last))
+        return result
+
+    def _archived(self, msg_id: str) -> Optional[dict]:
+        """Find a compacted message via the segment whose ID range holds it"""
+        segments = self.segments()
+        firsts = [first for _, first, _ in segments]
+        i = bisect.bisect_right(firsts, msg_id) - 1
+        if i < 0 or segments[i][2] < msg_id:
+            return None
+        name = segments[i][0]
+        by_id = self._segment_cache.get(name)
+        if by_id is None:
+            by_id = {m['id']: m for m in self.read_segment(name) if 'id' in m}
+            # Keep only a couple of decompressed segments around
+            if len(self._segment_cache) >= 4:
+                self._segment_cache.pop(next(iter(self._segment_cache)))
+            self._segment_cache[name] = by_id
+        msg = by_id.get(msg_id)
+        return dict(msg) if msg is not None else None
+
+    def read_segment(self, name: str) -> List[dict]:
+        """Read all messages of an archive segment (each carries its ``id``)"""
+        messages = []
+        try:
+            with gzip.open(os.path.join(self.archive_dir, name), 'rt', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        messages.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        pass
+        except (OSError, EOFError):
+            pass
+        return messages
+
+    def query_archive(
+        self,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        match: Optional[Callable[[dict], bool]] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[dict]:
+        """Yield archived messages newest first.
+
+        Segments whose ID range falls outside [since, until] are skipped by
+        name alone, without decompressing them.
+        """
+        found = 0
+        for name, first, last in reversed(self.segments()):
+            if since is not None and message_ts(last) < since:
+                break
+            if until is not None and message_ts(first) > until:
+                continue
+            for msg in reversed(self.read_segment(name)):
+                ts = message_ts(msg.get('id', ''))
+                if since is not None and ts < since:
+                    continue
+                if until is not None and ts > until:
+                    continue
+                if match is not None and not match(msg):
+                    continue
+                yield msg
+                found += 1
+                if limit is not None and found >= limit:
+                    return
+
+    # ------------------------------------------------------------------
+    # Compaction
+    # ------------------------------------------------------------------
+
+    def _lock_path(self) -> str:
+        return os.path.join(self.path, '.compact.lock')
+
+    def _acquire_lock(self) -> bool:
+        """Take the compaction lock (O_EXCL), breaking it if abandoned"""
+        lock = self._lock_path()
+        for _ in range(2):
+            try:
+                fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                os.write(fd, str(os.getpid()).encode())
+                os.close(fd)
+                return True
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(lock) < LOCK_STALE_AFTER:
+                        return False
+                    os.remove(lock)
+                except OSError:
+                    return False
+            except OSError:
+                return False
+        return False
+
+    def _release_lock(self) -> None:
+        try:
+            os.remove(self._lock_path())
+        except OSError:
+            pass
+
+    def compact(
+        self,
+        max_age: float = DEFAULT_MAX_AGE,
+        keep: int = DEFAULT_KEEP,
+        now: Optional[float] = None,
+    ) -> Dict[str, object]:
+        """Fold old live messages into a new archive segment.
+
+        A message is archived if it is older than ``max_age`` seconds or is
+        not among the newest ``keep`` messages. Buckets left empty are removed.
+        """
+        if now is None:
+            now = time.time()
+        if not os.path.isdir(self.path):
+            return {'archived': 0, 'remaining': 0}
+        if not self._acquire_lock():
+            return {'archived': 0, 'busy': True}
+
+        try:
+            ids = self._message_ids()
+            excess = max(0, len(ids) - max(keep, 0))
+            cutoff = now - max_age
+
+            # IDs are time-ordered, so the victims are always a prefix
+            victims = []
+            for i, msg_id in enumerate(ids):
+                if i < excess or message_ts(msg_id) < cutoff:
+                    victims.append(msg_id)
+                else:
+                    break
+
+            if not victims:
+                return {'archived': 0, 'remaining': len(ids)}
+
+            lines, unreadable = [], []
+            for msg_id in victims:
+                msg = self.read(msg_id)
+                if msg is None:
+                    unreadable.append(msg_id)
+                    continue
+                msg['id'] = msg_id
+                lines.append(json.dumps(msg, separators=(',', ':'), ensure_ascii=False))
+
+            segment = None
+            if lines:
+                os.makedirs(self.archive_dir, exist_ok=True)
+                segment = f"{victims[0]}{SEGMENT_SEP}{victims[-1]}{SEGMENT_SUFFIX}"
+                payload = gzip.compress(('\n'.join(lines) + '\n').encode('utf-8'))
+                _atomic_write(os.path.join(self.archive_dir, segment), payload)
+
+            for msg_id in unreadable:
+                self._quarantine(msg_id)
+            for msg_id in victims:
+                for path in (self._message_path(msg_id), self._blob_path(msg_id)):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+            self._drop_empty_buckets()
+            self._trim_recipient_indexes(victims[-1])
+
+            return {
+                'archived': len(lines),
+                'quarantined': len(unreadable),
+                'segment': segment,
+                'remaining': len(ids) - len(victims),
+            }
+        finally:
+            self._release_lock()
+
+    def _quarantine(self, msg_id: str) -> None:
+        """Move an unreadable message file (and its body blob) out of live storage"""
+        target = os.path.join(self.path, QUARANTINE_DIR)
+        os.makedirs(target, exist_ok=True)
+        for path, name in ((self._message_path(msg_id), f"{msg_id}.json"),
+                           (self._blob_path(msg_id), f"{msg_id}.z")):
+            try:
+                os.replace(path, os.path.join(target, name))
+            except OSError:
+                pass
+
+    def _drop_empty_buckets(self) -> None:
+        """Remove day buckets whose messages were all archived"""
+        if not self.sharded:
+            return
+        today = bucket_name(time.time())
+        dropped = [b for b in self.buckets()
+                   if b < today and not _list_ids(self._bucket_dir(b))]
+        if not dropped:
+            return
+        self._update_manifest(drop=dropped)
+        refilled = []
+        for bucket in dropped:
+            # A writer may have filled it since; keep it listed then
+            if _list_ids(self._bucket_dir(bucket)):
+                refilled.append(bucket)
+            else:
+                shutil.rmtree(self._bucket_dir(bucket), ignore_errors=True)
+        if refilled:
+            self._update_manifest(add=refilled)
+
+    def _trim_recipient_indexes(self, last_archived: str) -> None:
+        """Drop archived IDs from large recipient indexes.
+
+        Inbox reads only index tails, so small indexes are left alone. Each
+        rewrite holds the index lock that appends take too.
+        """
+        for bucket in self.buckets():
+            to_dir = os.path.join(self._bucket_dir(bucket), INDEX_DIR, 'to')
+            try:
+                names = os.listdir(to_dir)
+            except OSError:
+                continue
+            for name in names:
+                if not name.endswith('.idx'):
+                    continue
+                path = os.path.join(to_dir, name)
+                try:
+                    if os.path.getsize(path) < INDEX_TRIM_SIZE:
+                        continue
+                    with _FileLock(path):
+                        with open(path, encoding='utf-8') as f:
+                            entries = [l.strip() for l in f if l.strip()]
+                        live = [l for l in entries if _entry(l)[0] > last_archived]
+                        if len(live) != len(entries):
+                            _atomic_write(path, ''.join(l + '\n' for l in live).encode('utf-8'))
+                except OSError:
+                    pass
+
+    def _stamp_path(self) -> str:
+        return os.path.join(self.path, '.compacted')
+
+    def compaction_due(self, interval: float = DEFAULT_COMPACT_INTERVAL,
+                       now: Optional[float] = None) -> bool:
+        """True if the last compaction is older than ``interval`` seconds"""
+        if now is None:
+            now = time.time()
+        try:
+            return now - os.path.getmtime(self._stamp_path()) >= interval
+        except OSError:
+            return True
+
+    def maybe_compact(
+        self,
+        interval: float = DEFAULT_COMPACT_INTERVAL,
+        max_age: float = DEFAULT_MAX_AGE,
+        keep: int = DEFAULT_KEEP,
+    ) -> Optional[Dict[str, object]]:
+        """Run compaction if it is due (automatic retention policy)"""
+        if not self.compaction_due(interval):
+            return None
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            with open(self._stamp_path(), 'w', encoding='utf-8') as f:
+                f.write(str(time.time()))
+        except OSError:
+            return None
+        return self.compact(max_age=max_age, keep=keep)
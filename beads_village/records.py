@@ -0,0 +1,238 @@
+"""
+Record types shared by the server, the agent registry and the dashboard.
+
+Plain slotted classes rather than dataclasses: they are built on every
+registry, reservation and mail read, so construction and serialization
+are kept to straight attribute assignments. Timestamps are epoch floats;
+ISO strings written by older versions are accepted on load, and
+`iso()` renders a timestamp for tool output.
+"""
+import time
+from datetime import datetime
+from typing import Any, List, Optional, Union
+
+
+def to_epoch(value: Any) -> float:
+    """Epoch seconds from a float, or from an ISO string written by older versions"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    if not value:
+        return 0.0
+    try:
+        return datetime.fromisoformat(str(value)).timestamp()
+    except ValueError:
+        return 0.0
+
+
+def iso(ts: float) -> str:
+    """Render an epoch timestamp for clients (local time, ISO 8601)"""
+    return datetime.fromtimestamp(ts).isoformat() if ts else ""
+
+
+class AgentInfo:
+    """Information about a registered agent"""
+    __slots__ = ('agent_id', 'team', 'role', 'workspace', 'is_leader', 'current_task',
+                 'last_seen', 'started_at', 'capabilities', 'reservations', 'reaped_at',
+                 'task_started', 'throughput', 'prefetched', 'heartbeat_interval')
+
+    def __init__(self, agent_id: str, team: str, role: Optional[str], workspace: str,
+                 is_leader: bool, current_task: Optional[str] = None,
+                 last_seen: float = 0.0, started_at: float = 0.0,
+                 capabilities: List[str] = None, reservations: List[str] = None,
+                 reaped_at: float = 0.0, task_started: float = 0.0,
+                 throughput: dict = None, prefetched: List[dict] = None,
+                 heartbeat_interval: Optional[float] = None):
+        self.agent_id = agent_id
+        self.team = team
+        self.role = role
+        self.workspace = workspace
+        self.is_leader = is_leader
+        self.current_task = current_task
+        self.last_seen = last_seen
+        self.started_at = started_at
+        self.capabilities = capabilities if capabilities is not None else []
+        self.reservations = reservations if reservations is not None else []  # paths held in workspace
+        self.reaped_at = reaped_at  # when a reaper reclaimed this agent's work
+        self.task_started = task_started  # when current_task was claimed
+        self.throughput = throughput if throughput is not None else {}  # kind -> [count, mean secs]
+        self.prefetched = prefetched if prefetched is not None else []  # leased, unstarted tasks
+        self.heartbeat_interval = heartbeat_interval  # secs between beats; 0 = none, None = unknown
+
+    def to_dict(self) -> dict:
+        return {
+            'agent_id': self.agent_id,
+            'team': self.team,
+            'role': self.role,
+            'workspace': self.workspace,
+            'is_leader': self.is_leader,
+            'current_task': self.current_task,
+            'last_seen': self.last_seen,
+            'started_at': self.started_at,
+            'capabilities': list(self.capabilities),
+            'reservations': list(self.reservations),
+            'reaped_at': self.reaped_at,
+            'task_started': self.task_started,
+            'throughput': {k: list(v) for k, v in self.throughput.items()},
+            'prefetched': [dict(e) for e in self.prefetched],
+            'heartbeat_interval': self.heartbeat_interval,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'AgentInfo':
+        get = data.get
+        if 'agent_id' not in data and 'agent' in data:
+            # Legacy team-registry records: {agent, ws, registered, last_seen(ISO)}
+            caps = get('capabilities') or []
+            return cls(
+                agent_id=data['agent'],
+                team=get('team', 'default'),
+                role=get('role', next((c for c in caps if c not in ('general', 'leader')), None)),
+                workspace=get('ws', ''),
+                is_leader=get('is_leader', 'leader' in caps),
+                current_task=get('current_task'),
+                last_seen=to_epoch(get('last_seen')),
+                started_at=to_epoch(get('registered')),
+                capabilities=list(caps),
+            )
+        return cls(
+            agent_id=data['agent_id'],
+            team=get('team', 'default'),
+            role=get('role'),
+            workspace=get('workspace', ''),
+            is_leader=get('is_leader', False),
+            current_task=get('current_task'),
+            last_seen=to_epoch(get('last_seen')),
+            started_at=to_epoch(get('started_at')),
+            capabilities=list(get('capabilities') or []),
+            reservations=list(get('reservations') or []),
+            reaped_at=get('reaped_at', 0.0),
+            task_started=get('task_started', 0.0),
+            throughput=dict(get('throughput') or {}),
+            prefetched=list(get('prefetched') or []),
+            heartbeat_interval=get('heartbeat_interval'),
+        )
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, AgentInfo) and self.to_dict() == other.to_dict()
+
+    def __repr__(self) -> str:
+        return f"AgentInfo({self.agent_id!r}, team={self.team!r}, status={self.status!r})"
+
+    @property
+    def is_online(self) -> bool:
+        """Agent is online if seen in last 5 minutes"""
+        return time.time() - self.last_seen < 300
+
+    @property
+    def status(self) -> str:
+        """Get agent status: online, working, offline"""
+        if not self.is_online:
+            return 'offline'
+        if self.current_task:
+            return 'working'
+        return 'online'
+
+
+class Reservation:
+    """A file reservation held by an agent in one workspace"""
+    __slots__ = ('path', 'agent', 'team', 'reason', 'created', 'expires')
+
+    def __init__(self, path: str, agent: str, team: str = '', reason: str = '',
+                 created: float = 0.0, expires: float = 0.0):
+        self.path = path
+        self.agent = agent
+        self.team = team
+        self.reason = reason
+        self.created = created
+        self.expires = expires
+
+    @property
+    def ttl(self) -> float:
+        """Original lease length in seconds"""
+        return self.expires - self.created if self.created else 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            'path': self.path,
+            'agent': self.agent,
+            'team': self.team,
+            'reason': self.reason,
+            'created': self.created,
+            'expires': self.expires,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'Reservation':
+        get = data.get
+        return cls(
+            path=get('path', ''),
+            agent=get('agent', ''),
+            team=get('team', ''),
+            reason=get('reason', ''),
+            created=to_epoch(get('created')),
+            expires=to_epoch(data['expires']),
+        )
+
+
+class Message:
+    """A mail message or header (body may be a preview; see body_len)"""
+    __slots__ = ('id', 'sender', 'to', 'subject', 'body', 'ts', 'thread',
+                 'importance', 'issue', 'ws', 'body_len')
+
+    def __init__(self, sender: str, to: Union[str, List[str]] = 'all', subject: str = '',
+                 body: str = '', ts: float = 0.0, thread: str = '', importance: str = 'normal',
+                 issue: Optional[str] = None, ws: str = '', body_len: int = 0, id: str = ''):
+        self.id = id
+        self.sender = sender
+        self.to = to
+        self.subject = subject
+        self.body = body
+        self.ts = ts
+        self.thread = thread
+        self.importance = importance
+        self.issue = issue
+        self.ws = ws
+        self.body_len = body_len
+
+    @property
+    def recipients(self) -> List[str]:
+        return self.to if isinstance(self.to, list) else [self.to or 'all']
+
+    @property
+    def truncated(self) -> bool:
+        """True when `body` is only a preview of a longer stored body"""
+        return self.body_len > len(self.body)
+
+    def to_dict(self) -> dict:
+        """Compact stored form (the mail store's short keys)"""
+        d = {
+            'f': self.sender,
+            't': self.to,
+            's': self.subject,
+            'b': self.body,
+            'ts': self.ts,
+            'thread': self.thread,
+            'imp': self.importance,
+            'issue': self.issue,
+            'ws': self.ws,
+        }
+        if self.body_len:
+            d['bl'] = self.body_len
+        return d
+
+    @classmethod
+    def from_dict(cls, data: dict, msg_id: str = '') -> 'Message':
+        get = data.get
+        return cls(
+            id=msg_id or get('id', ''),
+            sender=get('f', get('from', '')),
+            to=get('t', get('to', 'all')),
+            subject=get('s', get('subject', '')),
+            body=get('b', get('body', '')),
+            ts=to_epoch(get('ts')),
+            thread=get('thread', ''),
+            importance=get('imp', get('importance', 'normal')),
+            issue=get('issue'),
+            ws=get('ws', ''),
+            body_len=get('bl', 0),
+        )
@@ -0,0 +1,141 @@
+"""
+Request Scope - Deadlines and cancellation of one in-flight tool call
+
+Every tools/call runs inside a RequestScope bound to `current_scope`. The
+scope carries the call's deadline, which downstream calls shrink their own
+timeouts to (`remaining`), and the child processes it started through
+`run`. `cancel` (on notifications/cancelled, from any thread) kills those
+processes, whole process groups so nothing bd or git spawned survives, and
+cancels the call's asyncio task; a blocked `run` then raises
+asyncio.CancelledError so the tool unwinds and releases its locks.
+
+Outside a scope (background threads, tests) `run` is plain
+subprocess.run(capture_output=True).
+"""
+import asyncio
+import os
+import signal
+import subprocess
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, List, Optional
+
+IS_WINDOWS = os.name == 'nt'
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a tool call used up its deadline budget."""
+    pass
+
+
+class RequestScope:
+    """Deadline, child processes and task of one request"""
+
+    __slots__ = ('request_id', 'budget', 'deadline', 'cancelled', 'task', 'loop', '_procs', '_lock')
+
+    def __init__(self, request_id: Any = None, budget: Optional[float] = None):
+        self.request_id = request_id
+        self.budget = budget
+        self.deadline = None if not budget else time.time() + budget
+        self.cancelled = False
+        self.task: Optional[asyncio.Task] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._procs: List[subprocess.Popen] = []
+        self._lock = threading.Lock()
+
+    def attach(self) -> None:
+        """Remember the running task so `cancel` can reach it"""
+        self.loop = asyncio.get_event_loop()
+        self.task = asyncio.current_task()
+
+    @property
+    def expired(self) -> bool:
+        return self.deadline is not None and time.time() >= self.deadline
+
+    def remaining(self, timeout: Optional[float] = None) -> Optional[float]:
+        """`timeout` shrunk to what is left of the deadline"""
+        if self.deadline is None:
+            return timeout
+        left = max(self.deadline - time.time(), 0.0)
+        return left if timeout is None else min(timeout, left)
+
+    def check(self) -> None:
+        """Raise if the request was cancelled or is out of time"""
+        if self.cancelled:
+            raise asyncio.CancelledError()
+        if self.expired:
+            raise self.exceeded()
+
+    def exceeded(self) -> DeadlineExceeded:
+        return DeadlineExceeded(f"deadline of {self.budget:g}s exceeded")
+
+    def track(self, proc: subprocess.Popen) -> None:
+        with self._lock:
+            self._procs.append(proc)
+            cancelled = self.cancelled
+        if cancelled:
+            _kill(proc)
+
+    def untrack(self, proc: subprocess.Popen) -> None:
+        with self._lock:
+            if proc in self._procs:
+                self._procs.remove(proc)
+
+    def cancel(self) -> None:
+        """Kill the request's processes and cancel its task (thread-safe)"""
+        with self._lock:
+            self.cancelled = True
+            procs = list(self._procs)
+        for proc in procs:
+            _kill(proc)
+        if self.task is not None and self.loop is not None and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.task.cancel)
+
+
+current_scope: ContextVar[Optional[RequestScope]] = ContextVar("beads_request_scope", default=None)
+
+
+def remaining(timeout: Optional[float] = None) -> Optional[float]:
+    """`timeout` bounded by the current request's deadline, if any"""
+    scope = current_scope.get()
+    return timeout if scope is None else scope.remaining(timeout)
+
+
+def _kill(proc: subprocess.Popen) -> None:
+    try:
+        if IS_WINDOWS:
+            proc.kill()
+        else:
+            os.killpg(proc.pid, signal.SIGKILL)  # started as its own group leader
+    except OSError:
+        pass
+
+
+def run(cmd: List[str], timeout: Optional[float] = None, cwd: Optional[str] = None,
+        text: bool = False) -> subprocess.CompletedProcess:
+    """subprocess.run(capture_output=True), killed with the current request.
+
+    Raises subprocess.TimeoutExpired when `timeout` runs out, DeadlineExceeded
+    when the request's deadline does and asyncio.CancelledError when the
+    request is cancelled.
+    """
+    scope = current_scope.get()
+    if scope is None:
+        return subprocess.run(cmd, capture_output=True, timeout=timeout, cwd=cwd, text=text)
+    scope.check()
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, cwd=cwd,
+                            text=text, start_new_session=not IS_WINDOWS)
+    scope.track(proc)
+    try:
+        out, err = proc.communicate(timeout=scope.remaining(timeout))
+    except subprocess.TimeoutExpired:
+        _kill(proc)
+        proc.communicate()
+        scope.check()
+        raise
+    finally:
+        scope.untrack(proc)
+    if scope.cancelled:
+        raise asyncio.CancelledError()
+    return subprocess.CompletedProcess(cmd, proc.returncode, out, err)
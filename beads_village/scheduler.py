@@ -0,0 +1,183 @@
+"""
+Scheduler - Load-aware claim routing
+
+Each agent's registry record carries ``throughput``: per task kind, the number
+of completed tasks and an exponentially weighted mean completion time. The
+``fastest`` claim strategy uses it to plan the ready queue as a list schedule:
+issues are taken in priority order and each goes to whichever workspace agent
+is expected to *finish* it first, counting the remaining time of agents that
+are busy. An agent claims the first issue the plan gives it, or defers when
+faster agents would get through the queue sooner than it would.
+
+``first`` (the default) keeps the original behavior: the first ready issue goes
+to whoever asks. ``simulate()`` runs both strategies over a synthetic backlog.
+"""
+import heapq
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+try:
+    from .records import AgentInfo
+except ImportError:
+    from records import AgentInfo
+
+STRATEGIES = ("first", "fastest")
+
+# Weight of the newest sample in the mean completion time
+EWMA_ALPHA = 0.3
+
+# Kind that aggregates every completion of an agent
+ALL = "*"
+
+
+def task_kind(issue: dict) -> str:
+    """Kind of work an issue represents: its first tag, else its issue type"""
+    tags = issue.get("tags") or issue.get("labels") or []
+    if tags:
+        return str(tags[0]).lower()
+    return issue.get("issue_type") or issue.get("type") or "task"
+
+
+def _eligible(agent: AgentInfo, issue: dict) -> bool:
+    """Role filter used by claim: untagged issues, or tagged with the agent's role"""
+    tags = issue.get("tags") or []
+    return not tags or not agent.role or agent.role in [t.lower() for t in tags]
+
+
+def updated_throughput(throughput: dict, kind: str, seconds: float) -> dict:
+    """Throughput stats with one completion of `kind` folded in"""
+    stats = {k: list(v) for k, v in throughput.items()}
+    for key in {kind, ALL}:
+        count, mean = stats.get(key, (0, 0.0))
+        mean = seconds if not count else mean + EWMA_ALPHA * (seconds - mean)
+        stats[key] = [count + 1, round(mean, 3)]
+    return stats
+
+
+def record_completion(registry, agent_id: str, team: str, kind: str, seconds: float) -> bool:
+    """Record a finished task and clear the agent's current task in one write"""
+    agent = registry.get_agent(agent_id, team)
+    if agent is None:
+        return False
+    return registry.heartbeat(agent_id, team, current_task=None, task_started=0.0,
+                              throughput=updated_throughput(agent.throughput, kind, max(seconds, 0.0)))
+
+
+def expected_duration(agent: AgentInfo, kind: str, default: float) -> float:
+    """Mean completion time of `kind` for an agent, falling back to its overall mean"""
+    stats = agent.throughput.get(kind) or agent.throughput.get(ALL)
+    return stats[1] if stats else default
+
+
+def _default_duration(agents: Sequence[AgentInfo]) -> float:
+    """Median overall mean of agents with history, so newcomers rank as average"""
+    means = sorted(a.throughput[ALL][1] for a in agents if a.throughput.get(ALL))
+    return means[len(means) // 2] if means else 1.0
+
+
+def plan(issues: List[dict], agents: Sequence[AgentInfo], now: Optional[float] = None,
+         kind_of: Callable[[dict], str] = task_kind) -> List[Tuple[dict, str]]:
+    """Assign ready issues, in priority order, to the agent expected to finish each first.
+
+    Busy agents become available when their current task is expected to end.
+    Ties go to the agent listed first.
+    """
+    now = time.time() if now is None else now
+    default = _default_duration(agents)
+    free_at = {}
+    for agent in agents:
+        if agent.current_task:
+            started = agent.task_started or now
+            remaining = started + expected_duration(agent, ALL, default) - now
+            free_at[agent.agent_id] = now + max(remaining, 0.0)
+        else:
+            free_at[agent.agent_id] = now
+
+    assignments = []
+    ordered = sorted(issues, key=lambda i: i.get("priority", 2))
+    for issue in ordered:
+        kind = kind_of(issue)
+        best, best_finish = None, None
+        for agent in agents:
+            if not _eligible(agent, issue):
+                continue
+            finish = free_at[agent.agent_id] + expected_duration(agent, kind, default)
+            if best_finish is None or finish < best_finish:
+                best, best_finish = agent, finish
+        if best is not None:
+            free_at[best.agent_id] = best_finish
+            assignments.append((issue, best.agent_id))
+    return assignments
+
+
+def pick(issues: List[dict], me: AgentInfo, peers: Sequence[AgentInfo],
+         now: Optional[float] = None) -> Optional[dict]:
+    """Issue `me` should claim under the fastest strategy, or None to defer.
+
+    `me` is treated as idle and listed first, so it wins ties with its peers.
+    """
+    me = AgentInfo.from_dict(dict(me.to_dict(), current_task=None))
+    agents = [me] + [p for p in peers if p.agent_id != me.agent_id]
+    for issue, agent_id in plan(issues, agents, now):
+        if agent_id == me.agent_id:
+            return issue
+    return None
+
+
+def choose(strategy: str, issues: List[dict], me: AgentInfo,
+           peers: Sequence[AgentInfo], now: Optional[float] = None) -> Optional[dict]:
+    """Apply a claim strategy to role-filtered ready issues"""
+    if strategy == "fastest":
+        return pick(issues, me, peers, now)
+    return issues[0] if issues else None
+
+
+def simulate(speeds: Dict[str, Union[float, Dict[str, float]]], tasks: List[tuple],
+             strategy: str = "first") -> dict:
+    """Drain a backlog with agents that pull work whenever they are idle.
+
+    `speeds` maps agent id to a duration multiplier, or to multipliers per
+    task kind; `tasks` are (priority, base duration[, kind]). Agents start
+    without history and learn their throughput as they complete tasks.
+    Returns the drain time (last completion) and the priority-weighted mean
+    completion time.
+    """
+    issues = [{"id": f"t-{n}", "priority": t[0], "base": t[1], "issue_type": t[2] if len(t) > 2 else "task"}
+              for n, t in enumerate(tasks)]
+
+    def duration(agent_id, issue):
+        speed = speeds[agent_id]
+        if isinstance(speed, dict):
+            speed = speed.get(task_kind(issue), 1.0)
+        return issue["base"] * speed
+
+    issues.sort(key=lambda i: i["priority"])
+    agents = {a: AgentInfo(a, "sim", None, "/sim", False) for a in speeds}
+    events = []  # (finish time, agent id, issue id, issue)
+    waiting = list(speeds)
+    now, done = 0.0, []
+
+    while issues or events:
+        for agent_id in list(waiting):
+            if not issues:
+                break
+            issue = choose(strategy, issues, agents[agent_id], list(agents.values()), now)
+            if issue is None:
+                continue
+            issues.remove(issue)
+            waiting.remove(agent_id)
+            agents[agent_id].current_task = issue["id"]
+            agents[agent_id].task_started = now
+            heapq.heappush(events, (now + duration(agent_id, issue), agent_id, issue["id"], issue))
+        if not events:
+            break
+        now, agent_id, _, issue = heapq.heappop(events)
+        agent = agents[agent_id]
+        agent.throughput = updated_throughput(agent.throughput, task_kind(issue), now - agent.task_started)
+        agent.current_task, agent.task_started = None, 0.0
+        waiting.append(agent_id)
+        done.append((issue["priority"], now))
+
+    weights = [1.0 / (1 + p) for p, _ in done]
+    weighted = sum(w * t for w, (_, t) in zip(weights, done)) / sum(weights) if done else 0.0
+    return {"strategy": strategy, "drain": round(now, 3), "weighted": round(weighted, 3), "done": len(done)}
@@ -11,29 +11,54 @@ import asyncio
 import hashlib
 import json
 import os
+import queue
 import subprocess
 import sys
 import tempfile
-import uuid
+import threading
+import time
+from contextvars import ContextVar, Token, copy_context
 from dataclasses import dataclass, field
-from datetime import datetime, timedelta
-from typing import Optional, Set, List, Any
+from datetime import datetime
+from typing import Optional, Set, List, Any, Dict, Callable, Iterable
 
 # Daemon client for faster operations (optional)
 try:
-    from .bd_daemon_client import BdDaemonClient, is_daemon_available, DaemonError, DaemonNotRunningError
-    from .agent_registry import get_registry, AgentInfo
+    from .bd_daemon_client import BdDaemonClient, DaemonError, DaemonNotRunningError, request_actor
+    from .agent_registry import get_registry, AgentInfo, Heartbeat
+    from .mail_store import Mailbox, header_of, message_ts, recipients
+    from .records import Message, Reservation, iso
+    from . import scheduler
+    from .sync_scheduler import SyncScheduler, sync_token
+    from . import bd_commands as cmds
+    from .bd_commands import BdCommand
+    from .daemon_supervisor import DaemonSupervisor
+    from .workspace import WorkspaceContext, WorkspacePool
+    from . import request_scope
+    from .request_scope import DeadlineExceeded, RequestScope, current_scope
 except ImportError:
     # Running as standalone script (not as package)
     import sys
     sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
-    from bd_daemon_client import BdDaemonClient, is_daemon_available, DaemonError, DaemonNotRunningError
-    from agent_registry import get_registry, AgentInfo
+    from bd_daemon_client import BdDaemonClient, DaemonError, DaemonNotRunningError, request_actor
+    from agent_registry import get_registry, AgentInfo, Heartbeat
+    from mail_store import Mailbox, header_of, message_ts, recipients
+    from records import Message, Reservation, iso
+    import scheduler
+    from sync_scheduler import SyncScheduler, sync_token
+    import bd_commands as cmds
+    from bd_commands import BdCommand
+    from daemon_supervisor import DaemonSupervisor
+    from workspace import WorkspaceContext, WorkspacePool
+    import request_scope
+    from request_scope import DeadlineExceeded, RequestScope, current_scope
 
 # ============================================================================
 # CONFIG
 # ============================================================================
 
+# Identity of the stdio session (a shared server takes each session's own
+# from its shim, see shared_server.py); tools read them from S
 AGENT = os.environ.get("BEADS_AGENT", f"agent-{os.getpid()}")
 
 # Current workspace - can be changed via init(ws=...)
@@ -57,30 +82,89 @@ BEADS_VILLAGE_BASE = os.environ.get(
 # Default: ~/.beads-village/{team}/mail
 def _get_team_mail_dir(team: str = None):
     """Get mail directory for a team."""
-    t = team or TEAM
+    t = team or S.team
     return os.path.join(BEADS_VILLAGE_BASE, t, "mail")
 
-# Agent registry - tracks active agents IN THE SAME TEAM
-def _get_team_registry_dir(team: str = None):
-    """Get agent registry directory for a team."""
-    t = team or TEAM
-    return os.path.join(BEADS_VILLAGE_BASE, t, "agents")
-
 def get_available_teams() -> List[str]:
     """List all available teams (directories in ~/.beads-village/)."""
     teams = []
     if os.path.isdir(BEADS_VILLAGE_BASE):
         for name in os.listdir(BEADS_VILLAGE_BASE):
             team_dir = os.path.join(BEADS_VILLAGE_BASE, name)
-            if os.path.isdir(team_dir):
+            if os.path.isdir(team_dir) and not name.startswith('.'):  # .daemons is not a team
                 teams.append(name)
     return sorted(teams)
 
 # Prefer daemon over CLI for faster operations (set BEADS_USE_DAEMON=0 to disable)
 USE_DAEMON = os.environ.get("BEADS_USE_DAEMON", "1") == "1"
 
-# Daemon client instance (lazy initialized)
-_daemon_client: Optional[BdDaemonClient] = None
+# After the daemon fails (unreachable or no answer within the timeout), bd()
+# goes straight to the CLI for this many seconds; then one ping with the probe
+# timeout decides whether to use the daemon again
+DAEMON_COOLDOWN = float(os.environ.get("BEADS_DAEMON_COOLDOWN", "30"))
+DAEMON_PROBE_TIMEOUT = float(os.environ.get("BEADS_DAEMON_PROBE_TIMEOUT", "1"))
+
+# init starts `bd daemon` for the workspace when none is running, restarts it
+# if it dies (checked every DAEMON_CHECK_INTERVAL seconds) and the last local
+# session to exit stops it (set BEADS_MANAGE_DAEMON=0 to disable)
+MANAGE_DAEMON = os.environ.get("BEADS_MANAGE_DAEMON", "1") == "1"
+DAEMON_CHECK_INTERVAL = float(os.environ.get("BEADS_DAEMON_CHECK_INTERVAL", "10"))
+
+# Workspaces whose warm state (daemon client, sync scheduler, mailbox, managed
+# daemon) is kept while switching between them; least recently used go first
+WORKSPACE_CACHE = int(os.environ.get("BEADS_WORKSPACE_CACHE", "8"))
+
+# Each tool call gets this many seconds (0 = unlimited); every bd/bv/git call
+# and wait inside it is cut to what is left. Per-tool budgets override it,
+# also from BEADS_TOOL_DEADLINES, e.g. "sync=300,claim=90"
+TOOL_DEADLINE = float(os.environ.get("BEADS_TOOL_DEADLINE", "60"))
+TOOL_DEADLINES: Dict[str, float] = {"sync": 180.0, "doctor": 120.0, "claim": 120.0, "done": 120.0}
+for _item in filter(None, os.environ.get("BEADS_TOOL_DEADLINES", "").split(",")):
+    _tool, _, _budget = _item.partition("=")
+    try:
+        TOOL_DEADLINES[_tool.strip()] = float(_budget)
+    except ValueError:
+        print(f"beads-village: ignoring BEADS_TOOL_DEADLINES entry {_item!r}", file=sys.stderr)
+
+# Mail retention policy - applied automatically on send, or on demand via mail_compact
+MAIL_MAX_AGE_DAYS = float(os.environ.get("BEADS_MAIL_MAX_AGE_DAYS", "7"))
+MAIL_KEEP = int(os.environ.get("BEADS_MAIL_KEEP", "500"))
+MAIL_COMPACT_INTERVAL = float(os.environ.get("BEADS_MAIL_COMPACT_INTERVAL", "3600"))
+
+# Background heartbeat period in seconds (0 disables). Each tick writes the
+# agent's registry record once: last_seen, current task and held reservations.
+HEARTBEAT_INTERVAL = float(os.environ.get("BEADS_HEARTBEAT_INTERVAL", "60"))
+
+# Reclaim tasks and reservations of agents silent for this many seconds
+# (0 disables), at least three of the agent's own heartbeat periods (recorded
+# in its registry record). Checked on every heartbeat tick; an agent without
+# heartbeats (interval 0) is never taken for dead.
+REAP_AFTER = float(os.environ.get("BEADS_REAP_AFTER", "900"))
+
+# How claim picks among ready tasks: "first" (highest priority to whoever asks)
+# or "fastest" (route by the agents' recorded throughput, see scheduler.py)
+CLAIM_STRATEGY = os.environ.get("BEADS_CLAIM_STRATEGY", "first")
+
+# Tools request `bd sync` instead of running it: requests within this many
+# seconds share one background sync (0 runs every sync inline)
+SYNC_DEBOUNCE = float(os.environ.get("BEADS_SYNC_DEBOUNCE", "2"))
+SYNC_TIMEOUT = 120.0
+
+# claim syncs first only when the last successful sync is older than this, or
+# when the upstream head or the committed issues.jsonl moved since
+SYNC_STALE_AFTER = float(os.environ.get("BEADS_SYNC_STALE_AFTER", "30"))
+
+# Claims re-check each candidate under a workspace lock before taking it
+CLAIM_LOCK_TIMEOUT = float(os.environ.get("BEADS_CLAIM_LOCK_TIMEOUT", "10"))
+CLAIM_LOCK_STALE = 30.0
+
+# claim(n=k) prefetches up to k-1 extra tasks, leased for this many seconds;
+# unstarted ones can be stolen by idle agents, and by anyone once expired
+MAX_CLAIM_BATCH = 10
+PREFETCH_LEASE = float(os.environ.get("BEADS_PREFETCH_LEASE", "1800"))
+
+# Largest accepted message body (characters); bodies are fetched lazily via read_msg
+MAIL_MAX_BODY = int(os.environ.get("BEADS_MAIL_MAX_BODY", "65536"))
 
 # ============================================================================
 # STATE
@@ -88,41 +172,72 @@ _daemon_client: Optional[BdDaemonClient] = None
 
 @dataclass
 class State:
-    """Agent session state."""
+    """Agent session state (one per connected agent)."""
+    agent: str = AGENT
+    ws: str = WS  # Current workspace, switched by init(ws=...)
     issue: Optional[str] = None
     start: datetime = field(default_factory=datetime.now)
     done: int = 0
     reserved_files: Set[str] = field(default_factory=set)
     role: Optional[str] = None  # Agent role: fe, be, mobile, devops, qa, etc.
     is_leader: bool = False  # Leader can assign tasks to other agents
-    team: str = "default"  # Current team name
+    team: str = TEAM  # Current team name
     current_task: Optional[str] = None  # Current task ID for registry
+    task_kind: Optional[str] = None  # Kind of the claimed task, for throughput stats
+    claimed_at: float = 0.0  # When the current task was claimed
+    prefetched: List[dict] = field(default_factory=list)  # Leased, unstarted tasks (see claim n=)
+    prefetch_lock: threading.Lock = field(default_factory=threading.Lock, repr=False)  # Shared with the heartbeat thread
+    heartbeat: Optional[Heartbeat] = None
+    joined: Optional[WorkspaceContext] = None  # Workspace held since init (see join_workspace)
+    supervised: List[WorkspaceContext] = field(default_factory=list)  # Workspaces whose daemon we hold a reference to
+    requests: Dict[Any, RequestScope] = field(default_factory=dict)  # In-flight tool calls by id
+
+
+# The stdio server has one session; a shared server binds one per connection
+_default_session = State()
+_session: ContextVar[Optional[State]] = ContextVar("beads_session", default=None)
+
+
+def current_session() -> State:
+    return _session.get() or _default_session
+
+
+def bind_session(state: State) -> Token:
+    """Make `state` the session of the current task/thread (see S)."""
+    return _session.set(state)
+
+
+class _SessionProxy:
+    """`S`: the State of the session the running request belongs to.
+    
+    A shared server handles each connection in its own thread, which binds
+    that session's State first; elsewhere it is the stdio session's.
+    """
+    __slots__ = ()
+    
+    def __getattr__(self, name: str) -> Any:
+        return getattr(current_session(), name)
+    
+    def __setattr__(self, name: str, value: Any) -> None:
+        setattr(current_session(), name, value)
+
 
-S = State()
+S = _SessionProxy()
 
 # ============================================================================
 # HELPERS
 # ============================================================================
 
-def bd_sync(*args, timeout: float = 30.0) -> dict:
-    """Run bd CLI command synchronously.
+def bd_sync(command: BdCommand, timeout: float = 30.0, cwd: str = None) -> dict:
+    """Run a bd command through the CLI synchronously.
     
-    Runs in current WS directory - each workspace has its own beads database.
+    Runs in the session's workspace (or `cwd`) - each workspace has its own beads database.
     """
     try:
-        cmd = ["bd", *args]
-        # Add --json if command supports it and not already present
-        json_cmds = {"list", "ready", "show", "stats", "doctor", "cleanup", "create"}
-        if args and args[0] in json_cmds and "--json" not in args:
-            cmd.append("--json")
+        cmd = ["bd", *command.argv()]
         
-        # Run bd in current workspace
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            timeout=timeout,
-            cwd=WS,
-        )
+        # Run bd in current workspace, within the request's deadline
+        result = request_scope.run(cmd, timeout=timeout, cwd=cwd or S.ws)
         if result.returncode != 0:
             stderr = result.stderr.decode()[:200] if result.stderr else ""
             return {"error": stderr or "command failed"}
@@ -139,195 +254,168 @@ def bd_sync(*args, timeout: float = 30.0) -> dict:
         return {"error": "timeout"}
     except FileNotFoundError:
         return {"error": "bd CLI not found - install beads first"}
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         return {"error": str(e)[:100]}
 
 
-def _get_daemon_client() -> Optional[BdDaemonClient]:
-    """Get or create daemon client for current workspace.
+def _open_workspace(ws: str) -> WorkspaceContext:
+    """Fresh context for a workspace (see WorkspacePool)."""
+    sync = SyncScheduler(lambda: bd_sync(cmds.Sync(), timeout=SYNC_TIMEOUT, cwd=ws),
+                         debounce=SYNC_DEBOUNCE, snapshot=lambda: sync_token(ws))
+    return WorkspaceContext(ws, sync=sync)
+
+
+_workspaces = WorkspacePool(_open_workspace, WORKSPACE_CACHE)
+
+
+def workspace(ws: str = None) -> WorkspaceContext:
+    """Context of `ws`, by default the session's current workspace (S.ws)."""
+    return _workspaces.get(ws or S.ws)
+
+
+def request_sync(ctx: WorkspaceContext) -> None:
+    """Schedule a `bd sync`, coalesced with other requests (see SyncScheduler)."""
+    ctx.sync.request()
+
+
+async def acquire_claim_lock(ctx: WorkspaceContext, timeout: float = None) -> bool:
+    """Take the workspace claim lock (O_EXCL), waiting up to `timeout` seconds.
+    
+    Claimers on this machine serialize their check-then-update of issue
+    status through it; a lock older than CLAIM_LOCK_STALE is broken. The
+    wait yields to the event loop, so other sessions run and a cancelled
+    call stops waiting.
+    """
+    lock = ctx.claim_lock_path
+    os.makedirs(os.path.dirname(lock), exist_ok=True)
+    deadline = time.time() + request_scope.remaining(CLAIM_LOCK_TIMEOUT if timeout is None else timeout)
+    delay = 0.002
+    while True:
+        try:
+            fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            os.write(fd, str(os.getpid()).encode())
+            os.close(fd)
+            return True
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(lock) > CLAIM_LOCK_STALE:
+                    os.remove(lock)  # left behind by a crashed claimer
+                    continue
+            except OSError:
+                continue
+        if time.time() >= deadline:
+            return False
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 0.05)
+
+
+def release_claim_lock(ctx: WorkspaceContext) -> None:
+    try:
+        os.remove(ctx.claim_lock_path)
+    except OSError:
+        pass
+
+
+def _get_daemon_client(ctx: WorkspaceContext) -> Optional[BdDaemonClient]:
+    """Get or create the daemon client of a workspace.
     
     Returns:
         BdDaemonClient if daemon is available and enabled, None otherwise
     """
-    global _daemon_client
-    
     if not USE_DAEMON:
         return None
     
-    if not is_daemon_available(WS):
-        return None
+    if ctx.daemon is None:
+        ctx.daemon = BdDaemonClient(working_dir=ctx.ws, actor=S.agent, cooldown=DAEMON_COOLDOWN,
+                                    probe_timeout=DAEMON_PROBE_TIMEOUT)
+    
+    # Cached socket lookup; False while the circuit breaker is open
+    return ctx.daemon if ctx.daemon.available() else None
+
+
+def join_workspace(ctx: WorkspaceContext) -> None:
+    """Hold `ctx` for this session, leaving the workspace it joined before."""
+    if S.joined is ctx:
+        return
+    leave_workspace()
+    _workspaces.hold(ctx, S.agent)
+    S.joined = ctx
+
+
+def leave_workspace() -> None:
+    """Release the joined workspace's pool hold.
     
-    if _daemon_client is None or _daemon_client.working_dir != WS:
-        _daemon_client = BdDaemonClient(working_dir=WS, actor=AGENT)
+    Its daemon reference stays: switching back should find the daemon
+    running. References go with the session (release_daemons) or with
+    the context when the pool evicts it.
+    """
+    ctx, S.joined = S.joined, None
+    if ctx is not None:
+        _workspaces.release(ctx, S.agent)
+
+
+def release_daemons() -> None:
+    """Drop this session's daemon reference in every workspace it started."""
+    supervised, S.supervised = S.supervised, []
+    for ctx in supervised:
+        if ctx.supervisor is None:
+            continue  # evicted: close() already released every reference
+        try:
+            ctx.supervisor.stop(agent_id=S.agent)
+        except (OSError, TimeoutError):
+            pass
+
+
+def start_daemon_supervisor(ctx: WorkspaceContext) -> Optional[bool]:
+    """Make sure the workspace daemon runs and keep it running.
     
-    return _daemon_client
+    Returns whether it answers, or None when daemon management is off.
+    The supervisor lives on the workspace context and holds one daemon
+    reference per session, released by release_daemons. Blocks on bd and
+    the supervisor lock; tools call it off the event loop.
+    """
+    if not (USE_DAEMON and MANAGE_DAEMON):
+        return None
+    if ctx.supervisor is None:
+        ctx.supervisor = DaemonSupervisor(ctx.ws, registry(), S.agent, interval=DAEMON_CHECK_INTERVAL)
+    if ctx not in S.supervised:
+        S.supervised.append(ctx)
+    try:
+        ok = ctx.supervisor.start(S.agent)
+    except (OSError, TimeoutError):
+        return False
+    if ok and ctx.daemon is not None:
+        ctx.daemon.reset()
+    return ok
 
 
-async def bd(*args, timeout: float = 30.0) -> dict:
-    """Run bd command - uses daemon if available, falls back to CLI.
+async def bd(ctx: WorkspaceContext, command: BdCommand, timeout: float = 30.0) -> dict:
+    """Run bd command in a workspace - uses daemon if available, falls back to CLI.
     
     The daemon is ~10x faster than CLI for repeated operations.
     """
     # Try daemon first if enabled
-    daemon = _get_daemon_client()
+    daemon = _get_daemon_client(ctx)
     if daemon:
+        # The client is shared by every session of the workspace
+        token = request_actor.set(S.agent)
         try:
-            return await _bd_via_daemon(daemon, args)
+            left = request_scope.remaining()
+            if left is None:
+                return await command.rpc(daemon)
+            return await asyncio.wait_for(command.rpc(daemon), left)
+        except asyncio.TimeoutError:
+            raise current_scope.get().exceeded()
         except (DaemonError, DaemonNotRunningError):
             # Fall back to CLI
             pass
+        finally:
+            request_actor.reset(token)
     
     # Fall back to CLI
-    return bd_sync(*args, timeout=timeout)
-
-
-async def _bd_via_daemon(daemon: BdDaemonClient, args: tuple) -> dict:
-    """Execute bd command via daemon client.
-    
-    Maps CLI-style args to daemon RPC calls.
-    """
-    if not args:
-        return {"error": "no command specified"}
-    
-    cmd = args[0]
-    
-    if cmd == "init":
-        # Init doesn't go through daemon
-        raise DaemonNotRunningError("init must use CLI")
-    
-    elif cmd == "ready":
-        limit = 5
-        # Parse --limit from args
-        for i, arg in enumerate(args):
-            if arg == "--limit" and i + 1 < len(args):
-                try:
-                    limit = int(args[i + 1])
-                except ValueError:
-                    pass
-        
-        issues = await daemon.ready(limit=limit)
-        return issues if isinstance(issues, list) else [issues] if issues else []
-    
-    elif cmd == "list":
-        status = None
-        limit = 10
-        for i, arg in enumerate(args):
-            if arg == "--status" and i + 1 < len(args):
-                status = args[i + 1]
-            elif arg == "--limit" and i + 1 < len(args):
-                try:
-                    limit = int(args[i + 1])
-                except ValueError:
-                    pass
-        
-        issues = await daemon.list_issues(status=status, limit=limit)
-        return issues if isinstance(issues, list) else [issues] if issues else []
-    
-    elif cmd == "show" and len(args) > 1:
-        issue_id = args[1]
-        return await daemon.show(issue_id)
-    
-    elif cmd == "create":
-        # Parse create args
-        title = args[1] if len(args) > 1 else ""
-        issue_type = "task"
-        priority = 2
-        description = ""
-        deps = []
-        has_labels = False
-        
-        i = 2
-        while i < len(args):
-            arg = args[i]
-            if arg in ("-t", "--type") and i + 1 < len(args):
-                issue_type = args[i + 1]
-                i += 2
-            elif arg in ("-p", "--priority") and i + 1 < len(args):
-                try:
-                    priority = int(args[i + 1])
-                except ValueError:
-                    pass
-                i += 2
-            elif arg in ("-d", "--description") and i + 1 < len(args):
-                description = args[i + 1]
-                i += 2
-            elif arg == "--deps" and i + 1 < len(args):
-                deps.append(args[i + 1])
-                i += 2
-            elif arg in ("--labels", "-l") and i + 1 < len(args):
-                # --labels is comma-separated for create command
-                has_labels = True
-                i += 2
-            elif arg == "--json":
-                i += 1  # Skip
-            else:
-                i += 1
-        
-        # If labels are used, fall back to CLI (daemon may not support labels yet)
-        if has_labels:
-            raise DaemonNotRunningError("Labels not supported by daemon, falling back to CLI")
-        
-        return await daemon.create(
-            title=title,
-            issue_type=issue_type,
-            priority=priority,
-            description=description,
-            deps=deps if deps else None,
-        )
-    
-    elif cmd == "update" and len(args) > 1:
-        issue_id = args[1]
-        status = None
-        priority = None
-        has_labels = False
-        
-        for i, arg in enumerate(args):
-            if arg == "--status" and i + 1 < len(args):
-                status = args[i + 1]
-            elif arg in ("-p", "--priority") and i + 1 < len(args):
-                try:
-                    priority = int(args[i + 1])
-                except ValueError:
-                    pass
-            elif arg in ("--add-label", "--remove-label", "--set-labels"):
-                # Any label-related flag means we need CLI fallback
-                has_labels = True
-        
-        # If labels are used, fall back to CLI (daemon may not support labels yet)
-        if has_labels:
-            raise DaemonNotRunningError("Labels not supported by daemon, falling back to CLI")
-        
-        return await daemon.update(issue_id, status=status, priority=priority)
-    
-    elif cmd == "close" and len(args) > 1:
-        issue_id = args[1]
-        reason = "Completed"
-        for i, arg in enumerate(args):
-            if arg == "--reason" and i + 1 < len(args):
-                reason = args[i + 1]
-        
-        return await daemon.close(issue_id, reason=reason)
-    
-    elif cmd == "sync":
-        return await daemon.sync()
-    
-    elif cmd == "stats":
-        return await daemon.stats()
-    
-    elif cmd == "dep" and len(args) > 3 and args[1] == "add":
-        from_id = args[2]
-        to_id = args[3]
-        dep_type = "blocks"
-        for i, arg in enumerate(args):
-            if arg == "--type" and i + 1 < len(args):
-                dep_type = args[i + 1]
-        
-        await daemon.add_dependency(from_id, to_id, dep_type)
-        return {"ok": 1}
-    
-    else:
-        # Command not supported by daemon, fall back to CLI
-        raise DaemonNotRunningError(f"Command '{cmd}' not supported by daemon")
+    return bd_sync(command, timeout=timeout, cwd=ctx.ws)
 
 
 def ensure_dir(base: str, name: str) -> str:
@@ -343,29 +431,25 @@ def global_mail_dir() -> str:
     Messages sent here are visible to agents in any workspace within the team.
     Used for cross-workspace coordination.
     """
-    d = _get_team_mail_dir(TEAM)
+    d = _get_team_mail_dir(S.team)
     os.makedirs(d, exist_ok=True)
     return d
 
 
-def agent_registry_dir() -> str:
-    """Agent registry directory - tracks active agents IN CURRENT TEAM.
-    
-    Each agent registers with: agent_id, workspace, capabilities, last_seen.
-    """
-    d = _get_team_registry_dir(TEAM)
-    os.makedirs(d, exist_ok=True)
-    return d
-
-
-def mail_dir() -> str:
-    """Mail directory - in current workspace."""
-    return ensure_dir(WS, ".mail")
+_team_mailboxes: Dict[str, Mailbox] = {}
 
 
-def reservation_dir() -> str:
-    """Reservation directory - in current workspace."""
-    return ensure_dir(WS, ".reservations")
+def team_mailbox() -> Mailbox:
+    """Team hub mailbox, sharded into per-day buckets.
+    
+    Every workspace of the team writes here, so it is split by day and
+    readers only open buckets newer than their read cursor.
+    """
+    d = global_mail_dir()
+    box = _team_mailboxes.get(d)
+    if box is None:
+        box = _team_mailboxes[d] = Mailbox(d, sharded=True)
+    return box
 
 
 def j(data: Any) -> str:
@@ -383,10 +467,10 @@ def to_posix_path(path: str) -> str:
     return path.replace("\\", "/")
 
 
-def normalize_path(path: str) -> str:
+def normalize_path(ctx: WorkspaceContext, path: str) -> str:
     """Normalize and validate path is within workspace.
     
-    Prevents path traversal attacks by ensuring path stays within WS.
+    Prevents path traversal attacks by ensuring path stays within the workspace.
     Returns relative path in POSIX format (forward slashes) for cross-platform consistency.
     
     Raises:
@@ -397,46 +481,41 @@ def normalize_path(path: str) -> str:
     if os.path.isabs(clean_path):
         abs_path = os.path.normpath(clean_path)
     else:
-        abs_path = os.path.normpath(os.path.join(WS, clean_path))
+        abs_path = os.path.normpath(os.path.join(ctx.ws, clean_path))
     
-    ws_abs = os.path.abspath(WS)
+    ws_abs = ctx.ws
     
     if not (abs_path.startswith(ws_abs + os.sep) or abs_path == ws_abs):
         raise ValueError(f"Path outside workspace: {path}")
     
-    rel_path = os.path.relpath(abs_path, WS)
+    rel_path = os.path.relpath(abs_path, ctx.ws)
     return to_posix_path(rel_path)
 
 
-def try_atomic_reserve(path: str, reservation: dict) -> tuple:
+def try_atomic_reserve(ctx: WorkspaceContext, path: str, reservation: Reservation) -> tuple:
     """Atomically try to create reservation file.
     
     Uses temp file + rename pattern for atomicity.
     On Windows, os.replace() is used which is atomic.
     
     Returns:
-        (success: bool, existing_reservation: Optional[dict])
+        (success: bool, existing_reservation: Optional[Reservation])
     """
-    res_file = os.path.join(reservation_dir(), f"{path_hash(path)}.json")
-    now = datetime.now()
+    res_file = os.path.join(ctx.reservation_dir, f"{path_hash(path)}.json")
     
-    if os.path.exists(res_file):
-        try:
-            with open(res_file, encoding="utf-8") as f:
-                existing = json.load(f)
-            if datetime.fromisoformat(existing["expires"]) > now:
-                if existing["agent"] != AGENT:
-                    return False, existing
-        except (json.JSONDecodeError, OSError, KeyError, ValueError):
-            pass
+    existing = load_reservation(res_file)
+    if existing is not None and existing.agent != S.agent:
+        existing.expires = reservation_expires(ctx, existing)
+        if existing.expires > time.time():
+            return False, existing
     
     fd = None
     tmp_path = None
     try:
-        fd, tmp_path = tempfile.mkstemp(dir=reservation_dir(), suffix=".tmp")
+        fd, tmp_path = tempfile.mkstemp(dir=ctx.reservation_dir, suffix=".tmp")
         with os.fdopen(fd, 'w', encoding="utf-8") as f:
             fd = None
-            json.dump(reservation, f)
+            json.dump(reservation.to_dict(), f)
         
         os.replace(tmp_path, res_file)
         tmp_path = None
@@ -460,61 +539,114 @@ def try_atomic_reserve(path: str, reservation: dict) -> tuple:
 # MAIL FUNCTIONS
 # ============================================================================
 
-async def send_msg(subj: str, body: str = "", to: str = "all", 
+def resolve_recipients(to: Any) -> List[str]:
+    """Expand a recipient spec into agent IDs.
+    
+    Accepts 'all', an agent ID, 'role:<role>' (active team agents with that
+    role, resolved against the agent registry), or a list of any of these.
+    """
+    specs = to if isinstance(to, list) else [to or "all"]
+    resolved: List[str] = []
+    active = None
+    
+    for spec in specs:
+        spec = str(spec).strip()
+        if not spec:
+            continue
+        if spec == "all":
+            return ["all"]
+        if spec.startswith("role:"):
+            role = spec[5:].lower().strip()
+            if active is None:
+                active = get_active_agents()
+            matches = [a.get("agent", "") for a in active
+                       if role in [c.lower() for c in a.get("capabilities", [])]]
+        else:
+            matches = [spec]
+        for agent_id in matches:
+            if agent_id and agent_id not in resolved:
+                resolved.append(agent_id)
+    
+    return resolved
+
+
+def post_msg(ctx: WorkspaceContext, subj: str, body: str = "", to: Any = "all",
+             thread_id: str = "", importance: str = "normal",
+             global_broadcast: bool = False) -> dict:
+    """Write a message; synchronous core of send_msg, safe off the event loop."""
+    targets = resolve_recipients(to)
+    if not targets:
+        return {"sent": 0, "global": global_broadcast, "to": []}
+    
+    msg = Message(
+        sender=S.agent,
+        to=targets[0] if len(targets) == 1 else targets,
+        subject=subj,
+        body=body,
+        ts=time.time(),
+        thread=thread_id or S.issue or "",
+        importance=importance,
+        issue=S.issue,
+        ws=ctx.ws,  # Include source workspace
+    )
+    
+    # Choose directory: local workspace or global hub
+    box = team_mailbox() if global_broadcast else ctx.mailbox
+    box.write(msg.to_dict(), ts=msg.ts)
+    return {"sent": 1, "global": global_broadcast, "to": targets}
+
+
+async def send_msg(ctx: WorkspaceContext, subj: str, body: str = "", to: Any = "all",
                    thread_id: str = "", importance: str = "normal",
                    global_broadcast: bool = False) -> dict:
     """Send message to other agents.
     
+    A message to several recipients is written once; the mailbox's
+    per-recipient index fans it out.
+    
     Args:
         subj: Message subject
         body: Message body
-        to: Recipient ('all' for broadcast, or specific agent ID)
+        to: Recipient ('all', agent ID, 'role:<role>', or a list of these)
         thread_id: Thread ID for grouping messages
         importance: 'low', 'normal', or 'high'
         global_broadcast: If True, send to global mail hub (visible to ALL agents across ALL workspaces)
     """
-    msg = {
-        "f": AGENT,
-        "t": to,
-        "s": subj,
-        "b": body,
-        "ts": datetime.now().isoformat(),
-        "thread": thread_id or S.issue or "",
-        "imp": importance,
-        "issue": S.issue,
-        "ws": WS,  # Include source workspace
-    }
-    ts = datetime.now().timestamp()
-    unique = uuid.uuid4().hex[:6]
-    
-    # Choose directory: local workspace or global hub
-    target_dir = global_mail_dir() if global_broadcast else mail_dir()
-    p = os.path.join(target_dir, f"{ts:.6f}_{unique}.json")
+    result = post_msg(ctx, subj, body, to, thread_id, importance, global_broadcast)
     
-    with open(p, "w", encoding="utf-8") as f:
-        json.dump(msg, f)
+    # Retention runs off the request path, at most once per interval
+    box = team_mailbox() if global_broadcast else ctx.mailbox
+    if result["sent"] and box.compaction_due(MAIL_COMPACT_INTERVAL):
+        asyncio.get_event_loop().run_in_executor(None, _auto_compact, box)
     
-    return {"sent": 1, "global": global_broadcast}
+    return result
 
 
-async def recv_msgs(n: int = 5, unread_only: bool = False, 
-                    include_global: bool = True) -> List[dict]:
+async def recv_msgs(ctx: WorkspaceContext, n: int = 5, unread_only: bool = False,
+                    include_global: bool = True,
+                    include_archived: bool = False,
+                    thread: str = "") -> List[tuple]:
     """Receive messages from other agents.
     
     Args:
         n: Maximum messages to return
         unread_only: Only return unread messages
         include_global: Also check global mail hub for cross-workspace messages
+        include_archived: Top up from compacted archive segments if fewer than n live messages
+        thread: Only messages of this thread (uses the thread index, includes archived)
+    
+    Returns:
+        (Message, is_global, is_archived) tuples, oldest first
     """
     msgs = []
     
-    # Collect from directories
-    dirs_to_check = [mail_dir()]
+    # Collect from mailboxes: (mailbox, is_global)
+    boxes = [(ctx.mailbox, False)]
     if include_global:
-        dirs_to_check.append(global_mail_dir())
+        boxes.append((team_mailbox(), True))
     
-    for d in dirs_to_check:
-        read_file = os.path.join(d, f".read_{AGENT}")
+    for box, is_global in boxes:
+        read_file = os.path.join(box.path, f".read_{S.agent}")
         read_ts = 0.0
         
         if os.path.exists(read_file):
@@ -524,90 +656,184 @@ async def recv_msgs(n: int = 5, unread_only: bool = False,
             except (OSError, ValueError):
                 read_ts = 0.0
         
-        try:
-            files = sorted(os.listdir(d))
-            for fname in files[-50:]:
-                if not fname.endswith(".json") or fname.startswith("."):
-                    continue
-                try:
-                    fp = os.path.join(d, fname)
-                    with open(fp, encoding="utf-8") as file:
-                        m = json.load(file)
-                    
-                    if m.get("t") not in ["all", AGENT]:
-                        continue
-                    
-                    if unread_only:
-                        ts_part = fname.replace(".json", "").split("_")[0]
-                        try:
-                            file_ts = float(ts_part)
-                            if file_ts <= read_ts:
-                                continue
-                        except ValueError:
-                            pass
-                    
-                    # Mark if from global hub
-                    if d == global_mail_dir():
-                        m["_global"] = True
-                    
-                    msgs.append(m)
-                except (json.JSONDecodeError, OSError):
-                    pass
-        except OSError:
-            pass
+        if thread:
+            candidates = box.thread(thread, limit=max(n, 50))
+        else:
+            # With a cursor, buckets older than it are never opened
+            candidates = box.inbox(S.agent, 50, since=read_ts if unread_only else None)
+        
+        for msg_id, header in candidates:
+            if unread_only and message_ts(msg_id) <= read_ts:
+                continue
+            
+            m = Message.from_dict(header, msg_id)
+            to = m.recipients
+            if "all" not in to and S.agent not in to:
+                continue
+            
+            msgs.append((m, is_global, False))
         
-        # Update read timestamp for this directory
-        if msgs:
+        # Update read timestamp for this directory; a thread lookup skips
+        # the rest of the inbox, so it must not mark that read
+        if msgs and not thread:
             try:
                 with open(read_file, "w", encoding="utf-8") as f:
-                    f.write(str(datetime.now().timestamp()))
+                    f.write(str(time.time()))
             except OSError:
                 pass
     
+    # Older history lives in archive segments after compaction
+    if include_archived and not thread and not unread_only and len(msgs) < n:
+        for box, is_global in boxes:
+            for m in box.query_archive(
+                match=lambda m: "all" in recipients(m) or S.agent in recipients(m),
+                limit=n - len(msgs),
+            ):
+                msgs.append((Message.from_dict(header_of(m), m.get("id", "")), is_global, True))
+    
     # Sort by timestamp and return last n
-    msgs.sort(key=lambda x: x.get("ts", ""))
+    msgs.sort(key=lambda x: x[0].ts)
     return msgs[-n:]
 
 
+def _auto_compact(box: Mailbox) -> None:
+    """Background retention pass for one mailbox (errors are non-fatal)."""
+    try:
+        box.maybe_compact(
+            interval=MAIL_COMPACT_INTERVAL,
+            max_age=MAIL_MAX_AGE_DAYS * 86400,
+            keep=MAIL_KEEP,
+        )
+    except Exception:
+        pass
+
+
+def compact_mail(ctx: WorkspaceContext, days: float = None, keep: int = None,
+                 include_global: bool = True) -> dict:
+    """Fold old messages into archive segments for local (and team hub) mail.
+    
+    Args:
+        days: Archive messages older than this (default: BEADS_MAIL_MAX_AGE_DAYS)
+        keep: Always keep this many newest messages live (default: BEADS_MAIL_KEEP)
+        include_global: Also compact the team hub
+    """
+    max_age = (MAIL_MAX_AGE_DAYS if days is None else days) * 86400
+    keep = MAIL_KEEP if keep is None else keep
+    
+    result = {"local": ctx.mailbox.compact(max_age=max_age, keep=keep)}
+    if include_global:
+        result["global"] = team_mailbox().compact(max_age=max_age, keep=keep)
+    return result
+
+
 # ============================================================================
 # AGENT REGISTRY FUNCTIONS
 # ============================================================================
 
-def register_agent(capabilities: List[str] = None) -> dict:
+def registry():
+    """Shared agent registry (team and workspace indexes over one store)."""
+    return get_registry(BEADS_VILLAGE_BASE)
+
+
+def _agent_view(agent: AgentInfo) -> dict:
+    """Registry record in the shape tools report to clients."""
+    return {
+        "agent": agent.agent_id,
+        "ws": agent.workspace,
+        "team": agent.team,
+        "capabilities": agent.capabilities,
+        "current_task": agent.current_task,
+        "last_seen": iso(agent.last_seen),
+    }
+
+
+def register_agent(ctx: WorkspaceContext, capabilities: List[str] = None) -> dict:
     """Register this agent in the team registry.
     
     Other agents in the same team can discover us and see what workspace we're in.
     """
-    reg_file = os.path.join(agent_registry_dir(), f"{AGENT}.json")
-    
-    registration = {
-        "agent": AGENT,
-        "ws": WS,
-        "team": TEAM,
-        "capabilities": capabilities or ["general"],
-        "registered": datetime.now().isoformat(),
-        "last_seen": datetime.now().isoformat(),
-    }
-    
-    with open(reg_file, "w", encoding="utf-8") as f:
-        json.dump(registration, f)
-    
-    return registration
+    agent_info = AgentInfo(
+        agent_id=S.agent,
+        team=S.team,
+        role=S.role,
+        workspace=ctx.ws,
+        is_leader=S.is_leader,
+        current_task=S.current_task,
+        capabilities=capabilities or ["general"],
+        heartbeat_interval=HEARTBEAT_INTERVAL,
+    )
+    registry().register(agent_info)
+    return _agent_view(agent_info)
 
 
 def update_agent_heartbeat() -> None:
-    """Update last_seen timestamp for this agent."""
-    reg_file = os.path.join(agent_registry_dir(), f"{AGENT}.json")
+    """Update last_seen, current task and reservation renewals in one write.
     
-    if os.path.exists(reg_file):
-        try:
-            with open(reg_file, encoding="utf-8") as f:
-                reg = json.load(f)
-            reg["last_seen"] = datetime.now().isoformat()
-            with open(reg_file, "w", encoding="utf-8") as f:
-                json.dump(reg, f)
-        except (json.JSONDecodeError, OSError):
-            pass
+    Reservations listed in the record stay valid while the record is fresh
+    (see reservation_expires), so renewing them costs no extra I/O.
+    """
+    try:
+        reg = registry()
+        # Drop prefetched tasks other agents have stolen or reclaimed; a
+        # claim may replace the batch meanwhile, so filter what is current
+        taken = [e for e in list(S.prefetched) if reg.prefetch_taken(S.team, S.agent, e)]
+        with S.prefetch_lock:
+            S.prefetched = [e for e in S.prefetched if e not in taken]
+            reg.heartbeat(S.agent, S.team,
+                          current_task=S.current_task,
+                          reservations=sorted(S.reserved_files),
+                          prefetched=S.prefetched)
+    except OSError:
+        pass
+
+
+def release_prefetched(ctx: WorkspaceContext) -> List[str]:
+    """Reopen our unstarted prefetched tasks (on shutdown) with one bd update."""
+    reg = registry()
+    with S.prefetch_lock:
+        batch, S.prefetched = S.prefetched, []
+    ids = [e["id"] for e in batch if reg.take_prefetched(S.team, S.agent, e, S.agent)]
+    if ids:
+        bd_sync(cmds.Update(*ids, status="open", assignee=""), cwd=ctx.ws)
+    try:
+        reg.heartbeat(S.agent, S.team, prefetched=[])
+    except OSError:
+        pass
+    return ids
+
+
+def reap_threshold(interval: float = None) -> float:
+    """Seconds of silence after which an agent beating every `interval`
+    seconds (by default our own interval) is reaped (0 = never)."""
+    interval = HEARTBEAT_INTERVAL if interval is None else interval
+    if REAP_AFTER <= 0 or interval <= 0:
+        return 0.0
+    return max(REAP_AFTER, 3 * interval)
+
+
+def _heartbeat_tick() -> None:
+    update_agent_heartbeat()
+    if reap_threshold() > 0:
+        reap_stale_agents(workspace())
+
+
+def start_heartbeat() -> bool:
+    """Start the session's background heartbeat (idempotent)."""
+    if S.heartbeat is None:
+        state = current_session()
+        
+        def tick() -> None:
+            # Heartbeat threads start with an empty context
+            bind_session(state)
+            _heartbeat_tick()
+        
+        S.heartbeat = Heartbeat(tick, HEARTBEAT_INTERVAL)
+    return S.heartbeat.start()
+
+
+def stop_heartbeat() -> None:
+    if S.heartbeat is not None:
+        S.heartbeat.stop()
 
 
 def get_active_agents(max_age_minutes: int = 30) -> List[dict]:
@@ -616,25 +842,8 @@ def get_active_agents(max_age_minutes: int = 30) -> List[dict]:
     Args:
         max_age_minutes: Consider agent inactive if not seen within this time
     """
-    agents = []
-    cutoff = datetime.now() - timedelta(minutes=max_age_minutes)
-    
-    try:
-        for fname in os.listdir(agent_registry_dir()):
-            if not fname.endswith(".json"):
-                continue
-            try:
-                with open(os.path.join(agent_registry_dir(), fname), encoding="utf-8") as f:
-                    reg = json.load(f)
-                last_seen = datetime.fromisoformat(reg.get("last_seen", "2000-01-01"))
-                if last_seen > cutoff:
-                    agents.append(reg)
-            except (json.JSONDecodeError, OSError, ValueError):
-                pass
-    except OSError:
-        pass
-    
-    return agents
+    agents = registry().get_team_agents(S.team, max_age=max_age_minutes * 60)
+    return [_agent_view(a) for a in agents]
 
 
 def discover_workspaces() -> List[dict]:
@@ -642,97 +851,175 @@ def discover_workspaces() -> List[dict]:
     
     Returns unique workspaces with their active agent counts.
     """
-    agents = get_active_agents()
-    ws_map = {}
-    
-    for agent in agents:
-        ws = agent.get("ws", "")
-        if ws:
-            if ws not in ws_map:
-                ws_map[ws] = {"ws": ws, "agents": [], "count": 0, "team": TEAM}
-            ws_map[ws]["agents"].append(agent.get("agent", "unknown"))
-            ws_map[ws]["count"] += 1
-    
-    return list(ws_map.values())
+    return registry().get_workspaces(S.team, max_age=30 * 60)
 
 
-# ============================================================================
-# RESERVATION FUNCTIONS
-# ============================================================================
+def reap_stale_agents(ctx: WorkspaceContext, max_age: float = None) -> dict:
+    """Reclaim work held by agents in this workspace that stopped heartbeating.
+    
+    Deletes their reservations, resets their claimed issues to open with a
+    single bd update, and posts one summary message. A team-wide lock keeps
+    concurrent reapers from doing the same work twice.
+    
+    Each agent is judged by its own recorded heartbeat interval (see
+    reap_threshold) unless `max_age` overrides that for everyone.
+    """
+    if (REAP_AFTER if max_age is None else max_age) <= 0:
+        return {"reaped": []}
+    reg = registry()
+
+    def silent() -> List[AgentInfo]:
+        now = time.time()
+        dead = []
+        for a in reg.stale_agents(S.team, REAP_AFTER if max_age is None else max_age, ctx.ws):
+            if a.agent_id == S.agent:
+                continue
+            # REAP_AFTER is the shortest per-agent threshold; hold each to its own
+            if max_age is None and not 0 < reap_threshold(a.heartbeat_interval) < now - a.last_seen:
+                continue
+            dead.append(a)
+        return dead
 
-def cleanup_expired_reservations():
-    """Remove expired reservations."""
-    now = datetime.now()
-    d = reservation_dir()
-    cleaned = 0
+    if not silent():
+        return {"reaped": []}
+    if not reg.acquire_reaper(S.team):
+        return {"reaped": [], "busy": True}
     
     try:
+        # Re-check under the lock: another reaper may have just finished
+        dead = silent()
+        dead_ids = {a.agent_id for a in dead}
+        if not dead:
+            return {"reaped": []}
+        
+        released = []
+        d = ctx.reservation_dir
         for fname in os.listdir(d):
             if not fname.endswith(".json"):
                 continue
             fp = os.path.join(d, fname)
-            try:
-                with open(fp, encoding="utf-8") as file:
-                    res = json.load(file)
-                if datetime.fromisoformat(res["expires"]) < now:
+            res = load_reservation(fp)
+            if res is not None and res.agent in dead_ids:
+                try:
                     os.remove(fp)
-                    cleaned += 1
-            except (json.JSONDecodeError, OSError, KeyError, ValueError):
-                pass
-    except OSError:
-        pass
-    
-    return cleaned
+                    released.append(res.path)
+                except OSError:
+                    pass
+        
+        claimed = {a.current_task for a in dead if a.current_task}
+        # Unstarted prefetched tasks: the lease marker keeps thieves out
+        claimed.update(e["id"] for a in dead for e in a.prefetched
+                       if reg.take_prefetched(S.team, a.agent_id, e, S.agent))
+        claimed = sorted(claimed)
+        if claimed:
+            # Leave alone anything already closed, reopened or re-claimed
+            # by someone else: only issues bd still gives to the dead
+            in_progress = bd_sync(cmds.ListIssues(status="in_progress"), cwd=ctx.ws)
+            if isinstance(in_progress, list):
+                held = {i.get("id") for i in in_progress if i.get("assignee") in dead_ids}
+                claimed = [i for i in claimed if i in held]
+            else:
+                claimed = []
+        reopened = []
+        if claimed:
+            r = bd_sync(cmds.Update(*claimed, status="open", assignee=""), cwd=ctx.ws)
+            if not (isinstance(r, dict) and r.get("error")):
+                reopened = claimed
+        
+        for agent in dead:
+            reg.mark_reaped(agent.agent_id, S.team)
+        reg.cleanup_stale(team=S.team)
+        
+        summary = f"Reclaimed work of unresponsive agents: {', '.join(sorted(dead_ids))}"
+        if reopened:
+            summary += f"; reopened {', '.join(reopened)}"
+        if released:
+            summary += f"; released {len(released)} reservation(s)"
+        post_msg(ctx, "reaped", summary, importance="high")
+        
+        return {"reaped": sorted(dead_ids), "reopened": reopened, "released": released}
+    finally:
+        reg.release_reaper(S.team)
 
 
-def get_active_reservations() -> List[dict]:
-    """Get all active (non-expired) reservations."""
-    cleanup_expired_reservations()
-    now = datetime.now()
-    d = reservation_dir()
+# ============================================================================
+# RESERVATION FUNCTIONS
+# ============================================================================
+
+def load_reservation(fp: str) -> Optional[Reservation]:
+    """Read one reservation file (None if missing or unreadable)."""
+    try:
+        with open(fp, encoding="utf-8") as f:
+            return Reservation.from_dict(json.load(f))
+    except (json.JSONDecodeError, OSError, KeyError, TypeError, ValueError):
+        return None
+
+
+def reservation_expires(ctx: WorkspaceContext, res: Reservation, holders: dict = None) -> float:
+    """Effective expiry of a reservation (see AgentRegistry.reservation_expires)."""
+    return registry().reservation_expires(res, ctx.ws, holders)
+
+
+def _scan_reservations(ctx: WorkspaceContext, remove_expired: bool = True) -> List[Reservation]:
+    """Active reservations of this workspace, with effective expiry applied.
+    
+    Expired reservation files are deleted along the way.
+    """
+    now = time.time()
+    d = ctx.reservation_dir
     active = []
+    holders = {}
     
     try:
-        for fname in os.listdir(d):
-            if not fname.endswith(".json"):
-                continue
+        names = os.listdir(d)
+    except OSError:
+        return active
+    
+    for fname in names:
+        if not fname.endswith(".json"):
+            continue
+        fp = os.path.join(d, fname)
+        res = load_reservation(fp)
+        if res is None:
+            continue
+        res.expires = reservation_expires(ctx, res, holders)
+        if res.expires > now:
+            active.append(res)
+        elif remove_expired:
             try:
-                with open(os.path.join(d, fname), encoding="utf-8") as fp:
-                    res = json.load(fp)
-                if datetime.fromisoformat(res["expires"]) > now:
-                    active.append(res)
-            except (json.JSONDecodeError, OSError, KeyError, ValueError):
+                os.remove(fp)
+            except OSError:
                 pass
-    except OSError:
-        pass
     
     return active
 
 
-def check_reservation_conflict(path: str) -> Optional[dict]:
+def cleanup_expired_reservations(ctx: WorkspaceContext):
+    """Remove expired reservations."""
+    d = ctx.reservation_dir
+    before = len([n for n in os.listdir(d) if n.endswith(".json")])
+    return before - len(_scan_reservations(ctx))
+
+
+def get_active_reservations(ctx: WorkspaceContext) -> List[Reservation]:
+    """Get all active (non-expired) reservations."""
+    return _scan_reservations(ctx)
+
+
+def check_reservation_conflict(ctx: WorkspaceContext, path: str) -> Optional[Reservation]:
     """Check if path conflicts with existing reservation."""
-    cleanup_expired_reservations()
-    now = datetime.now()
-    res_file = os.path.join(reservation_dir(), f"{path_hash(path)}.json")
-    
-    if os.path.exists(res_file):
-        try:
-            with open(res_file, encoding="utf-8") as f:
-                existing = json.load(f)
-            if datetime.fromisoformat(existing["expires"]) > now:
-                if existing["agent"] != AGENT:
-                    return existing
-        except (json.JSONDecodeError, OSError, KeyError, ValueError):
-            pass
-    
-    return None
+    existing = load_reservation(os.path.join(ctx.reservation_dir, f"{path_hash(path)}.json"))
+    if existing is None or existing.agent == S.agent:
+        return None
+    existing.expires = reservation_expires(ctx, existing)
+    return existing if existing.expires > time.time() else None
 
 
 # ============================================================================
 # TOOL IMPLEMENTATIONS
 # ============================================================================
 
-async def tool_init(args: dict) -> str:
+async def tool_init(ctx: WorkspaceContext, args: dict) -> str:
     """Initialize/join a beads workspace with actionable errors.
 
     Each workspace (BE/FE/Mobile) has its own isolated:
@@ -747,15 +1034,13 @@ async def tool_init(args: dict) -> str:
         leader: If True, this agent can assign tasks to others.
         start_tui: If True and leader, auto-launch bv TUI dashboard for human monitoring.
     """
-    global WS, TEAM
-
     # Switch to specified workspace
     if args.get("ws"):
-        WS = os.path.abspath(args["ws"])
+        S.ws = os.path.abspath(args["ws"])
 
     # Switch to specified team (allows runtime team switching!)
     if args.get("team"):
-        TEAM = args["team"]
+        S.team = args["team"]
     
     # Set agent role for task filtering
     if args.get("role"):
@@ -766,17 +1051,20 @@ async def tool_init(args: dict) -> str:
         S.is_leader = bool(args["leader"])
 
     # Ensure workspace directory exists
-    if not os.path.isdir(WS):
+    if not os.path.isdir(S.ws):
         # List available teams as hint
         available_teams = get_available_teams()
         return j({
-            "error": f"workspace not found: {WS}",
+            "error": f"workspace not found: {S.ws}",
             "hint": "Provide a valid directory path with ws parameter, or ensure current directory exists.",
             "available_teams": available_teams
         })
 
+    # The joined workspace's context (warm if this session used it before)
+    ctx = workspace(S.ws)
+
     # Init beads in this workspace
-    result = await bd("init")
+    result = await bd(ctx, cmds.Init())
     if result.get("error"):
         err_msg = str(result.get("error", ""))
         if "already" not in err_msg.lower():
@@ -786,11 +1074,11 @@ async def tool_init(args: dict) -> str:
             })
 
     # Ensure mail and reservation dirs
-    mail_dir()
-    reservation_dir()
+    ctx.mail_dir
+    ctx.reservation_dir
 
     # Clean up any expired reservations
-    cleanup_expired_reservations()
+    cleanup_expired_reservations(ctx)
     
     # Register agent in global registry (for cross-workspace discovery)
     # Include role in capabilities for other agents to see
@@ -799,28 +1087,21 @@ async def tool_init(args: dict) -> str:
         capabilities.append(S.role)
     if S.is_leader:
         capabilities.append("leader")
-    register_agent(capabilities=capabilities)
-    
-    # Register agent in new agent registry for tracking
-    S.team = TEAM  # Store team in state
-    registry = get_registry(WS)
-    agent_info = AgentInfo(
-        agent_id=AGENT,
-        team=S.team,
-        role=S.role,
-        workspace=WS,
-        is_leader=S.is_leader,
-        current_task=S.current_task
-    )
-    registry.register(agent_info)
+    register_agent(ctx, capabilities=capabilities)
+    start_heartbeat()
+    join_workspace(ctx)
+    # Off the event loop, keeping the session and request scope
+    daemon_ok = await asyncio.get_event_loop().run_in_executor(
+        None, copy_context().run, start_daemon_supervisor, ctx)
 
     # Announce agent joining this workspace (local)
     role_info = f" (role={S.role})" if S.role else ""
     leader_info = " [LEADER]" if S.is_leader else ""
-    await send_msg("join", f"Agent {AGENT}{role_info}{leader_info} joined workspace {WS}")
+    await send_msg(ctx, "join", f"Agent {S.agent}{role_info}{leader_info} joined workspace {ctx.ws}")
     
     # Also announce globally so other workspaces know
-    await send_msg("join", f"Agent {AGENT}{role_info}{leader_info} joined workspace {WS}", global_broadcast=True)
+    await send_msg(ctx, "join", f"Agent {S.agent}{role_info}{leader_info} joined workspace {ctx.ws}",
+                   global_broadcast=True)
 
     # Get available teams for user reference
     available_teams = get_available_teams()
@@ -833,7 +1114,7 @@ async def tool_init(args: dict) -> str:
             import sys
             # Start Textual dashboard in background process
             subprocess.Popen(
-                [sys.executable, "-m", "beads_village.dashboard", WS],
+                [sys.executable, "-m", "beads_village.dashboard", ctx.ws],
                 stdout=subprocess.DEVNULL,
                 stderr=subprocess.DEVNULL,
                 creationflags=subprocess.CREATE_NEW_PROCESS_GROUP if os.name == 'nt' else 0
@@ -844,28 +1125,190 @@ async def tool_init(args: dict) -> str:
 
     return j({
         "ok": 1,
-        "agent": AGENT,
-        "ws": WS,
-        "team": TEAM,
+        "agent": S.agent,
+        "ws": ctx.ws,
+        "team": S.team,
         "role": S.role,
         "is_leader": S.is_leader,
         "tui_started": tui_started,
+        "daemon": daemon_ok,
         "available_teams": available_teams,
         "hint": "Workspace ready. Use 'claim' to get a task, or 'ready' to see available tasks."
     })
 
 
-async def tool_claim(_args: dict) -> str:
+def _role_matches(tags: Optional[List[str]]) -> bool:
+    """Accept if: no tags, no role, or our role is in tags."""
+    return not tags or not S.role or S.role in [t.lower() for t in tags]
+
+
+def _lease(issue: dict, expires: float) -> dict:
+    """Registry entry for a prefetched (claimed but unstarted) task."""
+    return {
+        "id": issue.get("id", ""),
+        "t": issue.get("title", ""),
+        "p": issue.get("priority", 2),
+        "tags": issue.get("tags", []) or [],
+        "kind": scheduler.task_kind(issue),
+        "exp": round(expires, 3),
+    }
+
+
+def _next_prefetched() -> Optional[dict]:
+    """Start the next task of our own prefetched batch that nobody stole."""
+    reg = registry()
+    while True:
+        with S.prefetch_lock:
+            if not S.prefetched:
+                return None
+            entry = S.prefetched.pop(0)
+        if reg.take_prefetched(S.team, S.agent, entry, S.agent):
+            return entry
+
+
+def _steal_prefetched(ctx: WorkspaceContext, expired_only: bool) -> Optional[tuple]:
+    """Take an unstarted task from another agent's prefetched batch.
+    
+    Victims with the most queued work go first, and their batch is taken
+    from the tail, leaving the owner what it would start next. Returns
+    (entry, owner) or None.
+    """
+    now = time.time()
+    victims = []
+    for agent in registry().get_workspace_agents(ctx.ws, active_only=False):
+        if agent.agent_id == S.agent:
+            continue
+        entries = [e for e in agent.prefetched
+                   if _role_matches(e.get("tags")) and (not expired_only or e.get("exp", 0) < now)]
+        if entries:
+            victims.append((len(entries), agent, entries))
+    victims.sort(key=lambda v: -v[0])
+    for _, agent, entries in victims:
+        for entry in reversed(entries):
+            if registry().take_prefetched(agent.team, agent.agent_id, entry, S.agent):
+                return entry, agent.agent_id
+    return None
+
+
+async def _take_stolen(ctx: WorkspaceContext, expired_only: bool) -> Optional[tuple]:
+    """Steal a prefetched task (see _steal_prefetched) and reassign it in bd.
+    
+    bd still names the owner as assignee, which the claim compare-and-set
+    and the reaper go by; under the claim lock the task moves to us only if
+    the owner still holds it. Returns (entry, owner) or None.
+    """
+    while True:
+        stolen = _steal_prefetched(ctx, expired_only)
+        if stolen is None:
+            return None
+        entry, owner = stolen
+        if not await acquire_claim_lock(ctx):
+            return None
+        try:
+            r = await bd(ctx, cmds.Show(entry["id"]))
+            issue = r[0] if isinstance(r, list) and r else r
+            if (isinstance(issue, dict) and not issue.get("error")
+                    and issue.get("status") in ("open", "in_progress")
+                    and issue.get("assignee") in (owner, S.agent, None, "")):
+                r = await bd(ctx, cmds.Update(entry["id"], status="in_progress", assignee=S.agent))
+                if not (isinstance(r, dict) and r.get("error")):
+                    return stolen
+        finally:
+            release_claim_lock(ctx)
+
+
+async def _claimable(ctx: WorkspaceContext, issue_id: str) -> bool:
+    """Whether an issue is still open and unassigned, or assigned to us (re-read from bd)."""
+    r = await bd(ctx, cmds.Show(issue_id))
+    issue = r[0] if isinstance(r, list) and r else r
+    if not isinstance(issue, dict) or issue.get("error"):
+        return False
+    return issue.get("status") == "open" and issue.get("assignee") in (None, "", S.agent)
+
+
+async def _start_claimed(ctx: WorkspaceContext, entry: dict, prefetched: List[str], stolen_from: str = None) -> str:
+    """Make a claimed task current, publish it, and build the claim reply."""
+    issue_id = entry["id"]
+    
+    # Track in session state
+    S.issue = issue_id
+    S.current_task = issue_id
+    S.task_kind = entry.get("kind") or "task"
+    S.claimed_at = time.time()
+    
+    # Update agent registry with current task and remaining batch
+    registry().heartbeat(S.agent, S.team, current_task=issue_id, task_started=S.claimed_at,
+                         prefetched=S.prefetched)
+
+    # Notify other agents
+    role_info = f" [{S.role}]" if S.role else ""
+    body = f"{entry.get('t', '')}{role_info}"
+    if stolen_from:
+        body += f" (taken from {stolen_from}'s batch)"
+    await send_msg(ctx, f"claimed:{issue_id}", body, thread_id=issue_id, importance="high")
+
+    result = {
+        "id": issue_id,
+        "t": entry.get("t", ""),
+        "p": entry.get("p", 2),
+        "s": "in_progress",
+        "tags": entry.get("tags", []),
+        "hint": "Task claimed. Use 'reserve' before editing files, then 'done' when complete."
+    }
+    if prefetched:
+        result["prefetched"] = prefetched
+        result["hint"] += " Next 'claim' starts the prefetched tasks without a sync."
+    if stolen_from:
+        result["stolen_from"] = stolen_from
+    return j(result)
+
+
+async def tool_claim(ctx: WorkspaceContext, args: dict) -> str:
     """Claim next ready task (highest priority first) with actionable errors.
     
     If agent has a role set, will prioritize tasks with matching tags.
     Tasks with tags that don't match agent's role are filtered out.
+    With the "fastest" strategy, high-priority tasks are left to agents that
+    historically finish them sooner.
+    
+    Each candidate is re-read under a workspace claim lock and taken only
+    if it is still open and unassigned (compare-and-set); a candidate lost
+    to a concurrent claimer is skipped in favor of the next one.
+    
+    With n > 1, up to n-1 further tasks are prefetched in the same bd update
+    and leased to this agent for PREFETCH_LEASE seconds. Later claims start
+    them without touching bd. Idle agents with nothing ready steal unstarted
+    prefetched tasks, and anyone may take them once the lease has expired.
     """
-    # Sync first to get latest state
-    await bd("sync")
+    strategy = args.get("strategy") or CLAIM_STRATEGY
+    if strategy not in scheduler.STRATEGIES:
+        return j({
+            "error": f"unknown strategy '{strategy}'",
+            "hint": f"Use one of: {', '.join(scheduler.STRATEGIES)}."
+        })
+    n = args.get("n", 1)
+    if not isinstance(n, int) or isinstance(n, bool) or not 1 <= n <= MAX_CLAIM_BATCH:
+        return j({
+            "error": f"n must be an integer from 1 to {MAX_CLAIM_BATCH}",
+            "hint": "Use n>1 to prefetch a small batch of quick tasks."
+        })
+
+    # Work already leased to us, then leases others let expire
+    entry = _next_prefetched()
+    if entry:
+        return await _start_claimed(ctx, entry, [e["id"] for e in S.prefetched])
+    stolen = await _take_stolen(ctx, expired_only=True)
+    if stolen:
+        return await _start_claimed(ctx, stolen[0], [], stolen_from=stolen[1])
+
+    # Pull others' changes first, unless nothing can have changed since the
+    # last sync; the claim lock below keeps reads from the local store safe
+    sched = ctx.sync
+    if not sched.is_fresh(SYNC_STALE_AFTER):
+        await sched.wait_async(timeout=request_scope.remaining(SYNC_TIMEOUT))
 
     # Get ready issues
-    r = await bd("ready")
+    r = await bd(ctx, cmds.Ready(limit=max(n * 3, 10)))
 
     if isinstance(r, dict) and r.get("error"):
         return j({
@@ -873,64 +1316,83 @@ async def tool_claim(_args: dict) -> str:
             "hint": "Run 'init' first to initialize workspace, or 'doctor' to fix issues."
         })
 
-    if not r or (isinstance(r, list) and len(r) == 0):
+    issues = r if isinstance(r, list) else ([r] if r else [])
+    matching_issues = [i for i in issues if _role_matches(i.get("tags", []))]
+    if not matching_issues:
+        stolen = await _take_stolen(ctx, expired_only=False)
+        if stolen:
+            return await _start_claimed(ctx, stolen[0], [], stolen_from=stolen[1])
+        if not issues:
+            return j({
+                "ok": 0,
+                "msg": "no ready tasks",
+                "hint": "No tasks available to claim. Use 'add' to create new tasks, or 'ls' to see all issues."
+            })
         return j({
             "ok": 0,
-            "msg": "no ready tasks",
-            "hint": "No tasks available to claim. Use 'add' to create new tasks, or 'ls' to see all issues."
+            "msg": f"no tasks for role '{S.role}'",
+            "hint": f"No tasks with tag '{S.role}' or untagged tasks. Use 'ready' to see all available tasks.",
+            "total_ready": len(issues)
         })
+    issues = matching_issues
 
-    # Filter by role if agent has one
-    issues = r if isinstance(r, list) else [r]
-    
-    if S.role:
-        # Filter: only tasks with matching tag OR tasks without any tag
-        matching_issues = []
-        for issue in issues:
-            tags = issue.get("tags", []) or []
-            # Accept if: no tags, or our role is in tags
-            if not tags or S.role in [t.lower() for t in tags]:
-                matching_issues.append(issue)
+    me = registry().get_agent(S.agent, S.team) or AgentInfo(S.agent, S.team, S.role, ctx.ws, S.is_leader)
+    peers = registry().get_workspace_agents(ctx.ws)
+
+    # Compare-and-set: under the claim lock, take a candidate only if it is
+    # still open and unassigned, moving on to the next one otherwise
+    if not await acquire_claim_lock(ctx):
+        return j({
+            "error": "claim lock busy",
+            "hint": f"Another claim held the lock for {CLAIM_LOCK_TIMEOUT:g}s. Retry, or run 'doctor'."
+        })
+    try:
+        batch, lost = [], []
+        remaining = list(issues)
+        while remaining and len(batch) < n:
+            candidate = remaining[0] if batch else scheduler.choose(strategy, remaining, me, peers)
+            if candidate is None:
+                break
+            remaining.remove(candidate)
+            if await _claimable(ctx, candidate.get("id", "")):
+                batch.append(candidate)
+            else:
+                lost.append(candidate.get("id", ""))
         
-        if not matching_issues:
+        ids = [i.get("id", "") for i in batch]
+        # Update status and assignee; a batch goes out as one multi-id update
+        if ids:
+            r = await bd(ctx, cmds.Update(*ids, status="in_progress", assignee=S.agent))
+        if ids and isinstance(r, dict) and r.get("error"):
             return j({
-                "ok": 0,
-                "msg": f"no tasks for role '{S.role}'",
-                "hint": f"No tasks with tag '{S.role}' or untagged tasks. Use 'ready' to see all available tasks.",
-                "total_ready": len(issues)
+                "error": r["error"],
+                "hint": "Claim failed. Retry with n=1, or run 'doctor'."
             })
-        issues = matching_issues
-
-    # Get first matching issue
-    issue = issues[0]
-    issue_id = issue.get("id", "")
+    finally:
+        release_claim_lock(ctx)
 
-    # Update status (agents claim, not assigned per Steve's article)
-    await bd("update", issue_id, "--status", "in_progress")
+    if not batch:
+        if not remaining and lost:
+            return j({
+                "ok": 0,
+                "msg": "ready tasks were just claimed by other agents",
+                "hint": "Claim again to pick from the refreshed queue.",
+                "lost": lost
+            })
+        return j({
+            "ok": 0,
+            "msg": "deferred to faster agents",
+            "hint": "Agents that finish these tasks sooner will drain the queue first. Check 'ready' or claim again later.",
+            "total_ready": len(issues)
+        })
 
-    # Track in session state
-    S.issue = issue_id
-    S.current_task = issue_id
-    
-    # Update agent registry with current task
-    registry = get_registry(WS)
-    registry.update_task(AGENT, issue_id)
+    expires = time.time() + PREFETCH_LEASE
+    with S.prefetch_lock:
+        S.prefetched = [_lease(i, expires) for i in batch[1:]]
+    return await _start_claimed(ctx, _lease(batch[0], expires), ids[1:])
 
-    # Notify other agents
-    role_info = f" [{S.role}]" if S.role else ""
-    await send_msg(f"claimed:{issue_id}", f"{issue.get('title', '')}{role_info}", importance="high")
 
-    return j({
-        "id": issue_id,
-        "t": issue.get("title", ""),
-        "p": issue.get("priority", 2),
-        "s": "in_progress",
-        "tags": issue.get("tags", []),
-        "hint": "Task claimed. Use 'reserve' before editing files, then 'done' when complete."
-    })
-
-
-async def tool_done(args: dict) -> str:
+async def tool_done(ctx: WorkspaceContext, args: dict) -> str:
     """Close task and sync with actionable errors."""
     issue_id = args.get("id", S.issue)
     if not issue_id:
@@ -942,7 +1404,7 @@ async def tool_done(args: dict) -> str:
     msg = args.get("msg", "completed")
 
     # Close issue
-    r = await bd("close", issue_id, "--reason", msg)
+    r = await bd(ctx, cmds.Close(issue_id, reason=msg))
     if isinstance(r, dict) and r.get("error"):
         return j({
             "error": r["error"],
@@ -952,7 +1414,7 @@ async def tool_done(args: dict) -> str:
     # Release any file reservations
     if S.reserved_files:
         for path in list(S.reserved_files):
-            res_file = os.path.join(reservation_dir(), f"{path_hash(path)}.json")
+            res_file = os.path.join(ctx.reservation_dir, f"{path_hash(path)}.json")
             if os.path.exists(res_file):
                 try:
                     os.remove(res_file)
@@ -960,19 +1422,23 @@ async def tool_done(args: dict) -> str:
                     pass
         S.reserved_files.clear()
 
-    # Sync to share with other agents
-    await bd("sync")
+    # Share with other agents (coalesced background sync)
+    request_sync(ctx)
 
     # Notify
-    await send_msg(f"done:{issue_id}", msg, importance="high")
+    await send_msg(ctx, f"done:{issue_id}", msg, thread_id=issue_id, importance="high")
+
+    # Update agent registry - clear current task, recording how long it took
+    if issue_id == S.issue and S.claimed_at:
+        scheduler.record_completion(registry(), S.agent, S.team, S.task_kind, time.time() - S.claimed_at)
+    else:
+        registry().update_task(S.agent, None, S.team)
 
     S.issue = None
     S.current_task = None
+    S.task_kind = None
+    S.claimed_at = 0.0
     S.done += 1
-    
-    # Update agent registry - clear current task
-    registry = get_registry(WS)
-    registry.update_task(AGENT, None)
 
     return j({
         "ok": 1,
@@ -981,7 +1447,7 @@ async def tool_done(args: dict) -> str:
     })
 
 
-async def tool_add(args: dict) -> str:
+async def tool_add(ctx: WorkspaceContext, args: dict) -> str:
     """Create new issue (file issues for anything >2 min) with actionable errors.
     
     IMPORTANT: Always provide a meaningful description with context about:
@@ -1023,24 +1489,9 @@ async def tool_add(args: dict) -> str:
         tags = [tags]
     tags = [t.lower().strip() for t in tags if t]
 
-    # Build command arguments
-    cmd_args = ["create", title, "-t", typ, "-p", str(pri), "--json"]
-    
-    # Add description if provided
-    if description:
-        cmd_args.extend(["--description", description])
-    
-    # Add tags as labels (bd CLI uses --labels/-l, not --tag)
-    if tags:
-        cmd_args.extend(["--labels", ",".join(tags)])
-    
-    # Add dependencies if provided (format: "discovered-from:bd-123" or just "bd-123")
-    if deps:
-        for dep in deps:
-            cmd_args.extend(["--deps", dep])
-    
-    # Create issue
-    r = await bd(*cmd_args)
+    # Tags become labels; deps use the format "discovered-from:bd-123" or just "bd-123"
+    r = await bd(ctx, cmds.Create(title, issue_type=typ, priority=pri, description=description,
+                             deps=deps, labels=tags))
 
     if isinstance(r, dict) and r.get("error"):
         return j({
@@ -1059,7 +1510,7 @@ async def tool_add(args: dict) -> str:
 
     # Link to parent if specified and no deps provided (for backward compatibility)
     if parent and new_id and not deps:
-        await bd("dep", "add", new_id, parent, "--type", "discovered-from")
+        await bd(ctx, cmds.DepAdd(new_id, parent, "discovered-from"))
 
     return j({
         "id": new_id,
@@ -1074,7 +1525,7 @@ async def tool_add(args: dict) -> str:
     })
 
 
-async def tool_assign(args: dict) -> str:
+async def tool_assign(ctx: WorkspaceContext, args: dict) -> str:
     """Assign a task to a specific role or agent (leader only).
     
     Leaders can use this to explicitly assign tasks to specific roles.
@@ -1109,7 +1560,7 @@ async def tool_assign(args: dict) -> str:
     notify = args.get("notify", True)
     
     # Get current issue to verify it exists
-    issue = await bd("show", issue_id)
+    issue = await bd(ctx, cmds.Show(issue_id))
     if isinstance(issue, dict) and issue.get("error"):
         return j({
             "error": issue["error"],
@@ -1117,7 +1568,7 @@ async def tool_assign(args: dict) -> str:
         })
     
     # Add label to issue (bd CLI uses --add-label, not --tag)
-    r = await bd("update", issue_id, "--add-label", role)
+    r = await bd(ctx, cmds.Update(issue_id, add_labels=[role]))
     if isinstance(r, dict) and r.get("error"):
         # Fallback: try alternative approach if update --add-label not supported
         # We can store assignment in description or use a workaround
@@ -1126,9 +1577,10 @@ async def tool_assign(args: dict) -> str:
     # Notify team about assignment
     if notify:
         title = issue.get("title", issue_id) if isinstance(issue, dict) else issue_id
-        await send_msg(
+        await send_msg(ctx, 
             f"assigned:{issue_id}",
             f"Task '{title}' assigned to role: {role}",
+            thread_id=issue_id,
             importance="high",
             global_broadcast=True
         )
@@ -1141,7 +1593,7 @@ async def tool_assign(args: dict) -> str:
     })
 
 
-async def tool_ls(args: dict) -> str:
+async def tool_ls(ctx: WorkspaceContext, args: dict) -> str:
     """List issues with pagination.
     
     Consolidated tool that supports:
@@ -1154,7 +1606,7 @@ async def tool_ls(args: dict) -> str:
 
     # Handle 'ready' status specially - uses bd ready command
     if status == "ready":
-        r = await bd("ready")
+        r = await bd(ctx, cmds.Ready())
         
         if isinstance(r, dict) and r.get("error"):
             return j({
@@ -1191,7 +1643,7 @@ async def tool_ls(args: dict) -> str:
         })
 
     # Normal status filtering
-    r = await bd("list", "--status", status)
+    r = await bd(ctx, cmds.ListIssues(status=status))
 
     if isinstance(r, dict) and r.get("error"):
         return j({
@@ -1228,7 +1680,7 @@ async def tool_ls(args: dict) -> str:
     })
 
 
-async def tool_show(args: dict) -> str:
+async def tool_show(ctx: WorkspaceContext, args: dict) -> str:
     """Get issue details with actionable error messages."""
     issue_id = args.get("id", "")
     if not issue_id:
@@ -1237,7 +1689,7 @@ async def tool_show(args: dict) -> str:
             "hint": "Provide an issue ID. Use 'ls' or 'ready' to find available issues."
         })
 
-    r = await bd("show", issue_id)
+    r = await bd(ctx, cmds.Show(issue_id))
 
     if isinstance(r, dict) and r.get("error"):
         return j({
@@ -1248,37 +1700,73 @@ async def tool_show(args: dict) -> str:
     return j(r)
 
 
-async def tool_cleanup(args: dict) -> str:
+async def tool_cleanup(ctx: WorkspaceContext, args: dict) -> str:
     """Cleanup old closed issues (run every few days)."""
     days = args.get("days", 2)
     
-    r = await bd("cleanup", "--days", str(days))
-    await bd("sync")
+    r = await bd(ctx, cmds.Cleanup(days))
+    if isinstance(r, dict) and r.get("error"):
+        return j({
+            "error": r["error"],
+            "hint": "Cleanup failed. Run 'doctor' to check the beads database."
+        })
+    request_sync(ctx)
+    
+    # bd reports a count, or lists the deleted issues
+    if isinstance(r, dict):
+        cleaned = r.get("deleted", r.get("cleaned", 0))
+    else:
+        cleaned = len(r) if isinstance(r, list) else 0
+    if isinstance(cleaned, list):
+        cleaned = len(cleaned)
     
     return j({
         "ok": 1,
         "days": days,
-        "cleaned": r.get("deleted", r.get("cleaned", 0))
+        "cleaned": cleaned
     })
 
 
-async def tool_doctor(_args: dict) -> str:
+async def tool_doctor(ctx: WorkspaceContext, _args: dict) -> str:
     """Check and fix beads health."""
-    r = await bd("doctor", "--fix")
+    r = await bd(ctx, cmds.Doctor(fix=True))
     return j(r)
 
 
-async def tool_sync(_args: dict) -> str:
-    """Sync beads with git."""
-    r = await bd("sync")
-    return j({"ok": 1, "result": r})
+async def tool_sync(ctx: WorkspaceContext, args: dict) -> str:
+    """Sync beads with git.
+    
+    Schedules a coalesced background sync; with wait=true, blocks until a
+    sync started after this call has finished (a barrier).
+    """
+    sched = ctx.sync
+    if not args.get("wait", False):
+        sched.request()
+        return j({
+            "ok": 1,
+            "scheduled": True,
+            "in_flight": sched.in_flight,
+            "hint": "Sync runs in the background. Use sync(wait=true) when you need changes pushed/pulled now."
+        })
+    
+    if not await sched.wait_async(timeout=request_scope.remaining(SYNC_TIMEOUT)):
+        return j({
+            "error": "sync timed out",
+            "hint": f"No sync finished within {SYNC_TIMEOUT:g}s. Check git remote access, or run 'doctor'."
+        })
+    if sched.last_error:
+        return j({
+            "error": sched.last_error,
+            "hint": "bd sync failed. Check git status and remote access in the workspace."
+        })
+    return j({"ok": 1, "result": sched.last_result})
 
 
 # ============================================================================
 # FILE RESERVATION TOOLS
 # ============================================================================
 
-async def tool_reserve(args: dict) -> str:
+async def tool_reserve(ctx: WorkspaceContext, args: dict) -> str:
     """Reserve files/paths for exclusive editing.
     
     Use this before editing files to prevent conflicts with other agents.
@@ -1298,25 +1786,19 @@ async def tool_reserve(args: dict) -> str:
     conflicts = []
     grants = []
     errors = []
-    now = datetime.now()
-    expires = now + timedelta(seconds=ttl)
+    now = time.time()
+    expires = now + ttl
     
     for path in paths:
         try:
-            normalized = normalize_path(path)
+            normalized = normalize_path(ctx, path)
         except ValueError as e:
             errors.append({"path": path, "error": str(e)})
             continue
         
-        reservation = {
-            "path": normalized,
-            "agent": AGENT,
-            "reason": reason,
-            "created": now.isoformat(),
-            "expires": expires.isoformat()
-        }
+        reservation = Reservation(normalized, S.agent, S.team, reason, created=now, expires=expires)
         
-        success, existing = try_atomic_reserve(normalized, reservation)
+        success, existing = try_atomic_reserve(ctx, normalized, reservation)
         
         if success:
             grants.append(normalized)
@@ -1324,9 +1806,9 @@ async def tool_reserve(args: dict) -> str:
         elif existing:
             conflicts.append({
                 "path": normalized,
-                "holder": existing["agent"],
-                "reason": existing.get("reason", ""),
-                "expires": existing["expires"]
+                "holder": existing.agent,
+                "reason": existing.reason,
+                "expires": iso(existing.expires)
             })
         else:
             errors.append({"path": normalized, "error": "failed to reserve"})
@@ -1334,7 +1816,7 @@ async def tool_reserve(args: dict) -> str:
     result = {
         "granted": grants,
         "conflicts": conflicts,
-        "expires": expires.isoformat() if grants else None
+        "expires": iso(expires) if grants else None
     }
     if errors:
         result["errors"] = errors
@@ -1342,7 +1824,7 @@ async def tool_reserve(args: dict) -> str:
     return j(result)
 
 
-async def tool_release(args: dict) -> str:
+async def tool_release(ctx: WorkspaceContext, args: dict) -> str:
     """Release file reservations."""
     paths = args.get("paths", [])
     
@@ -1356,19 +1838,17 @@ async def tool_release(args: dict) -> str:
     
     for path in paths:
         try:
-            normalized = normalize_path(path)
+            normalized = normalize_path(ctx, path)
         except ValueError:
             normalized = path
         
-        res_file = os.path.join(reservation_dir(), f"{path_hash(normalized)}.json")
-        if os.path.exists(res_file):
+        res_file = os.path.join(ctx.reservation_dir, f"{path_hash(normalized)}.json")
+        res = load_reservation(res_file)
+        if res is not None and res.agent == S.agent:
             try:
-                with open(res_file, encoding="utf-8") as f:
-                    res = json.load(f)
-                if res.get("agent") == AGENT:
-                    os.remove(res_file)
-                    released.append(normalized)
-            except (json.JSONDecodeError, OSError):
+                os.remove(res_file)
+                released.append(normalized)
+            except OSError:
                 pass
         S.reserved_files.discard(path)
         S.reserved_files.discard(normalized)
@@ -1376,15 +1856,15 @@ async def tool_release(args: dict) -> str:
     return j({"released": released})
 
 
-async def tool_reservations(_args: dict) -> str:
+async def tool_reservations(ctx: WorkspaceContext, _args: dict) -> str:
     """List active file reservations."""
-    active = get_active_reservations()
+    active = get_active_reservations(ctx)
     
     items = [{
-        "path": r.get("path", ""),
-        "agent": r.get("agent", ""),
-        "reason": r.get("reason", ""),
-        "expires": r.get("expires", "")
+        "path": r.path,
+        "agent": r.agent,
+        "reason": r.reason,
+        "expires": iso(r.expires)
     } for r in active]
     
     return j(items)
@@ -1394,8 +1874,12 @@ async def tool_reservations(_args: dict) -> str:
 # MESSAGING TOOLS
 # ============================================================================
 
-async def tool_msg(args: dict) -> str:
-    """Send message to other agents."""
+async def tool_msg(ctx: WorkspaceContext, args: dict) -> str:
+    """Send message to other agents.
+    
+    `to` may be a list and/or contain role selectors ('role:fe'); the message
+    is stored once regardless of the number of recipients.
+    """
     subj = args.get("subj", "")
     if not subj:
         return j({"error": "subj required"})
@@ -1406,33 +1890,106 @@ async def tool_msg(args: dict) -> str:
     importance = args.get("importance", "normal")
     global_broadcast = args.get("global", False)
     
-    result = await send_msg(subj, body, to, thread_id, importance, global_broadcast)
+    if len(body) > MAIL_MAX_BODY:
+        return j({
+            "error": f"body too large: {len(body)} chars (max {MAIL_MAX_BODY})",
+            "hint": "Put large content in a file or issue and reference it in the message."
+        })
+    
+    result = await send_msg(ctx, subj, body, to, thread_id, importance, global_broadcast)
+    
+    if not result.get("sent"):
+        return j({
+            "error": f"no recipients matched: {to}",
+            "hint": "Use status(include_agents=true) to see active agents and their roles."
+        })
     
-    return j({"ok": 1, "global": global_broadcast})
+    return j({"ok": 1, "global": global_broadcast, "to": result["to"]})
 
 
-async def tool_inbox(args: dict) -> str:
+async def tool_inbox(ctx: WorkspaceContext, args: dict) -> str:
     """Get messages from other agents."""
     n = args.get("n", 5)
     unread = args.get("unread", False)
     include_global = args.get("global", True)  # Default: include global messages
+    include_archived = args.get("archived", False)
+    thread = args.get("thread", "")
     
-    msgs = await recv_msgs(n, unread, include_global)
+    msgs = await recv_msgs(ctx, n, unread, include_global, include_archived, thread)
     
     items = [{
-        "f": m.get("f", ""),
-        "s": m.get("s", ""),
-        "b": m.get("b", "")[:100],
-        "ts": m.get("ts", ""),
-        "imp": m.get("imp", "normal"),
-        "ws": m.get("ws", ""),  # Source workspace
-        "global": m.get("_global", False),  # Is from global hub
-    } for m in msgs]
+        "id": m.id,
+        "f": m.sender,
+        "s": m.subject,
+        "b": m.body[:100],
+        **({"more": True} if m.body_len > len(m.body[:100]) else {}),
+        "ts": iso(m.ts),
+        "imp": m.importance,
+        "ws": m.ws,  # Source workspace
+        "global": is_global,  # Is from global hub
+        **({"archived": True} if archived else {}),
+    } for m, is_global, archived in msgs]
     
     return j(items)
 
 
-async def tool_status(args: dict) -> str:
+async def tool_read_msg(ctx: WorkspaceContext, args: dict) -> str:
+    """Fetch a full message, including its complete body.
+    
+    inbox returns headers with a body preview; use this for messages marked
+    more=true. Looks in the workspace mailbox first, then the team hub,
+    including archived messages.
+    """
+    msg_id = args.get("id", "")
+    if not msg_id:
+        return j({"error": "id required", "hint": "Use the id field from inbox()"})
+    
+    for box, is_global in ((ctx.mailbox, False), (team_mailbox(), True)):
+        data = box.read(msg_id)
+        if data is None:
+            continue
+        m = Message.from_dict(data, msg_id)
+        to = m.recipients
+        if "all" not in to and S.agent not in to and m.sender != S.agent:
+            return j({"error": "not a recipient", "hint": f"Message '{msg_id}' was not sent to {S.agent}"})
+        return j({
+            "id": msg_id,
+            "f": m.sender,
+            "t": m.to,
+            "s": m.subject,
+            "b": m.body,
+            "ts": iso(m.ts),
+            "thread": m.thread,
+            "imp": m.importance,
+            "ws": m.ws,
+            "global": is_global,
+        })
+    
+    return j({"error": f"message not found: {msg_id}", "hint": "Use inbox() to list message ids"})
+
+
+async def tool_mail_compact(ctx: WorkspaceContext, args: dict) -> str:
+    """Archive old messages to keep mail directories small.
+    
+    Runs automatically in the background at most once per
+    BEADS_MAIL_COMPACT_INTERVAL; use this to force a pass or a tighter policy.
+    Archived messages stay readable via inbox(archived=true).
+    """
+    days = args.get("days")
+    keep = args.get("keep")
+    include_global = args.get("global", True)
+    
+    if days is not None and (not isinstance(days, (int, float)) or days < 0):
+        return j({"error": f"invalid days: {days}", "hint": "days must be >= 0"})
+    if keep is not None and (not isinstance(keep, int) or keep < 0):
+        return j({"error": f"invalid keep: {keep}", "hint": "keep must be an integer >= 0"})
+    
+    result = compact_mail(ctx, days, keep, include_global)
+    
+    return j({"ok": 1, **result})
+
+
+async def tool_status(ctx: WorkspaceContext, args: dict) -> str:
     """Get village status overview.
     
     Consolidated tool that includes:
@@ -1441,40 +1998,77 @@ async def tool_status(args: dict) -> str:
     - bv tool availability (include_bv=true)
     
     Replaces: discover, bv_status (now merged here)
+    
+    With include_agents and since=<agents_version from a previous call>,
+    only agents added, changed or removed since then are returned. A full
+    snapshot (since too old) lists active agents, like a call without
+    since; agents going quiet write nothing, so clients age deltas out
+    by last_seen.
     """
     include_agents = args.get("include_agents", False)
+    since = args.get("since")
+    if since is not None:
+        try:
+            since = int(since)
+        except (TypeError, ValueError):
+            return j({"error": "since must be an integer",
+                      "hint": "Pass agents_version from a previous status(include_agents=true) call"})
     include_bv = args.get("include_bv", False)
     
-    # Update our heartbeat
-    update_agent_heartbeat()
+    # Update our heartbeat (unless the background heartbeat already does,
+    # so polling with since= does not see our own record change every call)
+    if S.heartbeat is None or not S.heartbeat.running:
+        update_agent_heartbeat()
     
     # Get open issues count
-    lst = await bd("list", "--status", "open")
+    lst = await bd(ctx, cmds.ListIssues(status="open"))
     open_count = len(lst) if isinstance(lst, list) else 0
     
     # Get active reservations (local workspace)
-    reservations = get_active_reservations()
+    reservations = get_active_reservations(ctx)
     
     # Session duration
     mins = (datetime.now() - S.start).total_seconds() / 60
     
     result = {
-        "agent": AGENT,
-        "ws": WS,
-        "team": TEAM,
+        "agent": S.agent,
+        "ws": ctx.ws,
+        "team": S.team,
         "open": open_count,
         "warn": open_count > 200,
         "current": S.issue,
+        "prefetched": [e["id"] for e in S.prefetched],
         "reserved": len(S.reserved_files),
-        "local_agents": len(set(r.get("agent", "") for r in reservations)),
+        "local_agents": len(set(r.agent for r in reservations)),
         "min": round(mins, 1),
         "done": S.done
     }
+    if ctx.daemon is not None and ctx.daemon.state != "closed":
+        result["daemon"] = ctx.daemon.breaker_stats()
+    
+    # Both lookups are range queries over the registry's liveness index
+    all_agents = get_active_agents()
+    workspaces = discover_workspaces()
     
     # Include agent/team discovery info (replaces discover tool)
-    if include_agents:
-        all_agents = get_active_agents()
-        workspaces = discover_workspaces()
+    if include_agents and since is not None:
+        delta = registry().changes(since, team=S.team)
+        result["agents_version"] = delta["version"]
+        result["full"] = delta["full"]
+        changed = all_agents if delta["full"] else map(_agent_view, delta["agents"])
+        result["agents"] = [{
+            "agent": a["agent"],
+            "ws": a["ws"],
+            "capabilities": a["capabilities"],
+            "last_seen": a["last_seen"],
+        } for a in changed]
+        result["removed"] = [r["agent_id"] for r in delta["removed"]]
+        if delta["full"]:
+            result["workspaces"] = workspaces
+        result["team_agents"] = len(all_agents)
+        result["total_workspaces"] = len(workspaces)
+    elif include_agents:
+        result["agents_version"] = registry().version()
         result["agents"] = [{
             "agent": a.get("agent", ""),
             "ws": a.get("ws", ""),
@@ -1486,14 +2080,12 @@ async def tool_status(args: dict) -> str:
         result["total_workspaces"] = len(workspaces)
     else:
         # Just include counts for quick overview
-        all_agents = get_active_agents()
-        workspaces = discover_workspaces()
         result["team_agents"] = len(all_agents)
         result["workspaces"] = len(workspaces)
     
     # Include bv tool status (replaces bv_status tool)
     if include_bv:
-        bv = _get_bv()
+        bv = _get_bv(ctx)
         if bv.is_available:
             result["bv"] = {
                 "available": True,
@@ -1533,8 +2125,15 @@ TOOLS = {
     },
     "claim": {
         "fn": tool_claim,
-        "desc": "Claim next ready task. Filters by role if set. Auto-syncs, marks in_progress.",
-        "input": {"type": "object", "properties": {}, "required": []},
+        "desc": "Claim next ready task. Filters by role if set. Marks in_progress, syncs in background. n>1 prefetches a batch.",
+        "input": {
+            "type": "object",
+            "properties": {
+                "strategy": {"type": "string", "enum": ["first", "fastest"], "description": "first=highest priority (default), fastest=route by agent throughput"},
+                "n": {"type": "integer", "minimum": 1, "maximum": 10, "description": "Claim a batch: 1 current + n-1 prefetched tasks (default 1)"}
+            },
+            "required": []
+        },
         "annotations": {"readOnlyHint": False, "destructiveHint": False, "idempotentHint": False, "openWorldHint": True}
     },
     "done": {
@@ -1626,8 +2225,14 @@ TOOLS = {
     },
     "sync": {
         "fn": tool_sync,
-        "desc": "Sync with git. Pull/push changes.",
-        "input": {"type": "object", "properties": {}, "required": []},
+        "desc": "Sync with git. Pull/push changes. Background by default; wait=true blocks until done.",
+        "input": {
+            "type": "object",
+            "properties": {
+                "wait": {"type": "boolean", "description": "Block until a sync started after this call finishes (default: false)"}
+            },
+            "required": []
+        },
         "annotations": {"readOnlyHint": False, "destructiveHint": False, "idempotentHint": True, "openWorldHint": True}
     },
     # File reservations
@@ -1670,7 +2275,11 @@ TOOLS = {
             "properties": {
                 "subj": {"type": "string", "description": "Subject"},
                 "body": {"type": "string", "description": "Message body"},
-                "to": {"type": "string", "description": "Recipient or 'all'"},
+                "to": {
+                    "type": ["string", "array"],
+                    "items": {"type": "string"},
+                    "description": "'all', agent ID, 'role:<role>', or a list of these"
+                },
                 "thread": {"type": "string", "description": "Thread ID"},
                 "importance": {"type": "string", "description": "low|normal|high"},
                 "global": {"type": "boolean", "description": "Send to all workspaces"}
@@ -1681,18 +2290,44 @@ TOOLS = {
     },
     "inbox": {
         "fn": tool_inbox,
-        "desc": "Get messages. Includes global by default.",
+        "desc": "Get message headers with body preview. Includes global by default. Use read_msg for full body.",
         "input": {
             "type": "object",
             "properties": {
                 "n": {"type": "integer", "description": "Max messages (default:5)"},
                 "unread": {"type": "boolean", "description": "Unread only"},
-                "global": {"type": "boolean", "description": "Include cross-workspace"}
+                "global": {"type": "boolean", "description": "Include cross-workspace"},
+                "archived": {"type": "boolean", "description": "Also search archived (compacted) messages"},
+                "thread": {"type": "string", "description": "Only this thread (e.g. an issue ID)"}
             },
             "required": []
         },
         "annotations": {"readOnlyHint": True, "destructiveHint": False, "idempotentHint": True, "openWorldHint": False}
     },
+    "read_msg": {
+        "fn": tool_read_msg,
+        "desc": "Get full message body by id (inbox shows previews; more=true means truncated).",
+        "input": {
+            "type": "object",
+            "properties": {"id": {"type": "string", "description": "Message id from inbox"}},
+            "required": ["id"]
+        },
+        "annotations": {"readOnlyHint": True, "destructiveHint": False, "idempotentHint": True, "openWorldHint": False}
+    },
+    "mail_compact": {
+        "fn": tool_mail_compact,
+        "desc": "Archive old messages (age/count retention). Runs automatically; archived mail stays in inbox(archived=true).",
+        "input": {
+            "type": "object",
+            "properties": {
+                "days": {"type": "number", "description": "Archive messages older than N days (default:7)"},
+                "keep": {"type": "integer", "description": "Newest messages kept live per mailbox (default:500)"},
+                "global": {"type": "boolean", "description": "Also compact team hub (default:true)"}
+            },
+            "required": []
+        },
+        "annotations": {"readOnlyHint": False, "destructiveHint": False, "idempotentHint": True, "openWorldHint": False}
+    },
     # Status (consolidated: replaces discover, bv_status)
     "status": {
         "fn": tool_status,
@@ -1701,7 +2336,8 @@ TOOLS = {
             "type": "object",
             "properties": {
                 "include_agents": {"type": "boolean", "description": "Include detailed agent/workspace info (replaces discover)"},
-                "include_bv": {"type": "boolean", "description": "Include bv tool availability (replaces bv_status)"}
+                "include_bv": {"type": "boolean", "description": "Include bv tool availability (replaces bv_status)"},
+                "since": {"type": "integer", "description": "agents_version from a previous call: return only agents changed since"}
             },
             "required": []
         },
@@ -1714,6 +2350,20 @@ TOOLS = {
 # MCP PROTOCOL HANDLER
 # ============================================================================
 
+def tool_deadline(name: str) -> float:
+    """Deadline budget of a tool in seconds (0 = unlimited)."""
+    return TOOL_DEADLINES.get(name, TOOL_DEADLINE)
+
+
+def cancel_request(state: State, request_id: Any) -> bool:
+    """Cancel a session's in-flight tool call (safe from any thread)."""
+    scope = state.requests.get(request_id)
+    if scope is None:
+        return False
+    scope.cancel()
+    return True
+
+
 async def handle_request(req: dict) -> Optional[dict]:
     """Handle JSON-RPC request."""
     method = req.get("method", "")
@@ -1728,7 +2378,7 @@ async def handle_request(req: dict) -> Optional[dict]:
                 "protocolVersion": "2024-11-05",
                 "capabilities": {"tools": {}},
                 "serverInfo": {"name": "beads-village", "version": "2.0"},
-                "instructions": """Beads Village MCP - Multi-agent task coordination (21 tools).
+                "instructions": f"""Beads Village MCP - Multi-agent task coordination ({len(TOOLS)} tools).
 
 WORKFLOW: init() → claim() → reserve() → work → done() → restart session
 
@@ -1745,6 +2395,10 @@ CONSOLIDATED: broadcast→msg(global=true) | discover→status(include_agents=tr
     elif method == "notifications/initialized":
         return None
     
+    elif method == "notifications/cancelled":
+        cancel_request(current_session(), params.get("requestId"))
+        return None
+    
     elif method == "tools/list":
         tools = []
         for k, v in TOOLS.items():
@@ -1764,8 +2418,15 @@ CONSOLIDATED: broadcast→msg(global=true) | discover→status(include_agents=tr
         args = params.get("arguments", {})
 
         if name in TOOLS:
+            # Tracked so notifications/cancelled can stop it (see request_scope.py)
+            scope = RequestScope(req_id, tool_deadline(name))
+            scope.attach()
+            session = current_session()
+            session.requests[req_id] = scope
+            token = current_scope.set(scope)
             try:
-                result = await TOOLS[name]["fn"](args)
+                # Bound now: a later init(ws=...) does not move this call
+                result = await TOOLS[name]["fn"](workspace(), args)
                 return {
                     "jsonrpc": "2.0",
                     "id": req_id,
@@ -1773,6 +2434,21 @@ CONSOLIDATED: broadcast→msg(global=true) | discover→status(include_agents=tr
                         "content": [{"type": "text", "text": result}]
                     }
                 }
+            except DeadlineExceeded as e:
+                return {
+                    "jsonrpc": "2.0",
+                    "id": req_id,
+                    "result": {
+                        "content": [{
+                            "type": "text",
+                            "text": j({
+                                "error": str(e),
+                                "hint": f"Raise it with BEADS_TOOL_DEADLINES=\"{name}=<seconds>\""
+                            })
+                        }],
+                        "isError": True
+                    }
+                }
             except Exception as e:
                 return {
                     "jsonrpc": "2.0",
@@ -1788,6 +2464,9 @@ CONSOLIDATED: broadcast→msg(global=true) | discover→status(include_agents=tr
                         "isError": True
                     }
                 }
+            finally:
+                current_scope.reset(token)
+                session.requests.pop(req_id, None)
 
         return {
             "jsonrpc": "2.0",
@@ -1808,6 +2487,70 @@ CONSOLIDATED: broadcast→msg(global=true) | discover→status(include_agents=tr
     }
 
 
+def end_session() -> None:
+    """Release what the current session holds when its client goes away."""
+    stop_heartbeat()
+    if S.prefetched:
+        release_prefetched(workspace())
+    leave_workspace()
+    release_daemons()
+
+
+def serve_stream(lines: Iterable[bytes], write: Callable[[dict], None]) -> None:
+    """Serve newline-delimited JSON-RPC for the current session until EOF.
+    
+    Requests are handled one at a time, as they arrive. Lines are read on a
+    separate thread so that a notifications/cancelled reaches the request
+    being handled (or drops a queued one) instead of waiting behind it.
+    """
+    state = current_session()
+    pending: 'queue.Queue[Optional[dict]]' = queue.Queue()
+    dropped = set()  # ids of queued requests cancelled before they started
+    
+    def read() -> None:
+        try:
+            for line in lines:
+                try:
+                    req = json.loads(line.decode().strip())
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    continue
+                if not isinstance(req, dict) or req.get("method") != "notifications/cancelled":
+                    pending.put(req)
+                    continue
+                request_id = (req.get("params") or {}).get("requestId")
+                if not cancel_request(state, request_id):
+                    with pending.mutex:
+                        if any(isinstance(r, dict) and r.get("id") == request_id for r in pending.queue):
+                            dropped.add(request_id)
+        except (OSError, ValueError):
+            pass  # stream closed
+        finally:
+            pending.put(None)
+    
+    threading.Thread(target=read, name="beads-reader", daemon=True).start()
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        while True:
+            req = pending.get()
+            if req is None:
+                break
+            if not isinstance(req, dict):
+                continue
+            if req.get("id") is not None and req.get("id") in dropped:
+                dropped.discard(req.get("id"))
+                continue
+            try:
+                resp = loop.run_until_complete(handle_request(req))
+            except asyncio.CancelledError:
+                continue  # cancelled requests get no response
+            if resp:
+                write(resp)
+    finally:
+        loop.run_until_complete(loop.shutdown_asyncgens())
+        loop.close()
+
+
 def run_server():
     """Run MCP server on stdio."""
     import warnings
@@ -1819,29 +2562,17 @@ def run_server():
         msvcrt.setmode(sys.stdin.fileno(), os.O_BINARY)
         msvcrt.setmode(sys.stdout.fileno(), os.O_BINARY)
     
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
+    def write(resp: dict) -> None:
+        out = json.dumps(resp) + "\n"
+        sys.stdout.buffer.write(out.encode())
+        sys.stdout.buffer.flush()
     
     try:
-        while True:
-            line = sys.stdin.buffer.readline()
-            if not line:
-                break
-            
-            try:
-                req = json.loads(line.decode().strip())
-            except json.JSONDecodeError:
-                continue
-            
-            resp = loop.run_until_complete(handle_request(req))
-            
-            if resp:
-                out = json.dumps(resp) + "\n"
-                sys.stdout.buffer.write(out.encode())
-                sys.stdout.buffer.flush()
+        serve_stream(iter(sys.stdin.buffer.readline, b""), write)
     finally:
-        loop.run_until_complete(loop.shutdown_asyncgens())
-        loop.close()
+        end_session()
+        # Flushes pending syncs and releases managed daemons
+        _workspaces.close_all()
 
 
 def main():
@@ -1852,44 +2583,42 @@ def main():
 # Beads Viewer Integration Tools (optional - requires bv binary)
 # ============================================================================
 
-from beads_village.bv_manager import get_bv_manager, BvManager
-
-
-def _get_workspace() -> str:
-    """Get current workspace path"""
-    return WS
+try:
+    from .bv_manager import get_bv_manager, BvManager
+except ImportError:
+    from bv_manager import get_bv_manager, BvManager
 
 
-def _get_bv() -> BvManager:
-    """Get BvManager for current workspace"""
-    return get_bv_manager(str(_get_workspace()))
+def _get_bv(ctx: WorkspaceContext) -> BvManager:
+    """Get BvManager for a workspace"""
+    return get_bv_manager(ctx.ws)
 
 
-async def tool_bv_insights(_args: dict) -> str:
+async def tool_bv_insights(ctx: WorkspaceContext, _args: dict) -> str:
     """Graph analysis: bottlenecks, keystones, cycles, PageRank, Betweenness.
     
     Returns pre-computed graph metrics for AI decision making.
     Requires bv binary (install: go install github.com/Dicklesworthstone/beads_viewer/cmd/bv@latest)
     """
-    bv = _get_bv()
+    bv = _get_bv(ctx)
     if not bv.is_available:
         return j({'error': 'bv not available', 'hint': 'Install bv for graph analysis'})
     return j(bv.get_insights())
 
 
-async def tool_bv_plan(_args: dict) -> str:
+async def tool_bv_plan(ctx: WorkspaceContext, _args: dict) -> str:
     """Parallel execution plan with tracks.
     
     Returns issue tracks that can be worked on in parallel.
     Uses Union-Find algorithm to detect independent work streams.
     """
-    bv = _get_bv()
+    bv = _get_bv(ctx)
     if not bv.is_available:
         return j({'error': 'bv not available', 'hint': 'Install bv for execution planning'})
     return j(bv.get_plan())
 
 
-async def tool_bv_priority(args: dict) -> str:
+async def tool_bv_priority(ctx: WorkspaceContext, args: dict) -> str:
     """Priority recommendations based on graph analysis.
     
     Ranks issues by impact score combining:
@@ -1903,13 +2632,13 @@ async def tool_bv_priority(args: dict) -> str:
         limit: Max issues to return (default 5)
     """
     limit = args.get("limit", 5)
-    bv = _get_bv()
+    bv = _get_bv(ctx)
     if not bv.is_available:
         return j({'error': 'bv not available', 'hint': 'Install bv for priority recommendations'})
     return j(bv.get_priority(limit))
 
 
-async def tool_bv_diff(args: dict) -> str:
+async def tool_bv_diff(ctx: WorkspaceContext, args: dict) -> str:
     """Compare issue changes between git revisions.
     
     Args:
@@ -1923,13 +2652,13 @@ async def tool_bv_diff(args: dict) -> str:
     """
     since = args.get("since")
     as_of = args.get("as_of")
-    bv = _get_bv()
+    bv = _get_bv(ctx)
     if not bv.is_available:
         return j({'error': 'bv not available', 'hint': 'Install bv for diff analysis'})
     return j(bv.get_diff(since, as_of))
 
 
-async def tool_bv_tui(args: dict) -> str:
+async def tool_bv_tui(ctx: WorkspaceContext, args: dict) -> str:
     """Launch Beads Viewer TUI dashboard in new terminal.
     
     Opens interactive TUI for human operators to view:
@@ -1942,18 +2671,18 @@ async def tool_bv_tui(args: dict) -> str:
         recipe: Filter preset (default, actionable, recent, blocked, high-impact, stale)
     """
     recipe = args.get("recipe")
-    bv = _get_bv()
+    bv = _get_bv(ctx)
     if not bv.is_available:
         return j({'error': 'bv not available', 'hint': 'Install bv for TUI dashboard'})
     return j(bv.start_tui(recipe))
 
 
-async def tool_bv_status(_args: dict) -> str:
+async def tool_bv_status(ctx: WorkspaceContext, _args: dict) -> str:
     """Check bv availability and version.
     
     Returns bv binary status and version info.
     """
-    bv = _get_bv()
+    bv = _get_bv(ctx)
     if not bv.is_available:
         return j({
             'available': False,
@@ -2015,7 +2744,7 @@ TOOLS.update({
 # Village Dashboard Tool
 # ============================================================================
 
-async def tool_village_tui(args: dict) -> str:
+async def tool_village_tui(ctx: WorkspaceContext, args: dict) -> str:
     """Launch Beads Village Dashboard TUI.
     
     Shows:
@@ -2029,7 +2758,7 @@ async def tool_village_tui(args: dict) -> str:
     import shutil
     
     python_exe = sys.executable
-    workspace = WS
+    workspace = ctx.ws
     
     # Check if textual is installed
     try:
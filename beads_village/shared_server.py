@@ -0,0 +1,161 @@
+"""
+Shared Server - One local server process for many agent sessions
+
+Started by the first shim (see shim.py) and listening on a Unix socket.
+Each connection is one agent session: its first line names the agent,
+workspace and team, then MCP JSON-RPC requests follow one per line, exactly
+as on stdio. A connection is served by its own thread, which binds a fresh
+server.State (reached through `server.S`), so sessions never see each
+other's task, reservations or heartbeat. The workspace pool, daemon
+clients, sync schedulers and daemon supervisors are shared by all of them.
+
+When a session disconnects its heartbeat stops and its prefetched tasks are
+released. After BEADS_SHARED_IDLE seconds without sessions the server
+flushes every workspace and exits.
+"""
+import json
+import os
+import socket
+import socketserver
+import threading
+import time
+
+try:
+    from . import server
+    from .shim import default_socket_path
+except ImportError:
+    import server
+    from shim import default_socket_path
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Exit after this many seconds without a connected session (0 = never)
+IDLE_TIMEOUT = float(os.environ.get("BEADS_SHARED_IDLE", "300"))
+
+
+class SessionHandler(socketserver.StreamRequestHandler):
+    """Serves one agent session"""
+
+    def handle(self):
+        try:
+            hello = json.loads(self.rfile.readline() or b"{}").get("session") or {}
+        except ValueError:
+            return
+        state = server.State(
+            agent=hello.get("agent") or server.AGENT,
+            ws=os.path.abspath(hello.get("ws") or server.WS),
+            team=hello.get("team") or server.TEAM,
+        )
+        server.bind_session(state)
+        self.server.attach()
+        try:
+            server.serve_stream(self.rfile, self._write)
+        except OSError:
+            pass  # shim went away
+        finally:
+            server.end_session()
+            self.server.detach()
+
+    def _write(self, resp: dict) -> None:
+        self.wfile.write((json.dumps(resp) + "\n").encode())
+        self.wfile.flush()
+
+
+class SharedServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Unix socket server hosting many sessions; see `serve`"""
+
+    daemon_threads = True
+
+    def __init__(self, path: str, idle_timeout: float = IDLE_TIMEOUT):
+        self.path = os.path.abspath(path)
+        self.idle_timeout = idle_timeout
+        self.sessions = 0
+        self.idle_since = time.time()
+        self._sessions_lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with _BindLock(self.path + ".lock"):
+            _remove_stale_socket(self.path)
+            super().__init__(self.path, SessionHandler)
+
+    def attach(self) -> None:
+        with self._sessions_lock:
+            self.sessions += 1
+
+    def detach(self) -> None:
+        with self._sessions_lock:
+            self.sessions -= 1
+            if not self.sessions:
+                self.idle_since = time.time()
+
+    def idle(self) -> bool:
+        """No session for longer than the idle timeout"""
+        with self._sessions_lock:
+            return (self.idle_timeout > 0 and not self.sessions
+                    and time.time() - self.idle_since > self.idle_timeout)
+
+    def serve(self, poll_interval: float = 0.5) -> None:
+        """Accept sessions until idle, then flush every workspace and exit"""
+        try:
+            self.timeout = poll_interval
+            while not self.idle():
+                self.handle_request()
+        finally:
+            self.server_close()
+            server._workspaces.close_all()
+
+    def server_close(self) -> None:
+        super().server_close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+def _remove_stale_socket(path: str) -> None:
+    """Remove a socket left by a crashed server; fail if one is listening"""
+    if not os.path.exists(path):
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except OSError:
+        os.remove(path)
+    else:
+        raise OSError(f"shared server already listening on {path}")
+    finally:
+        probe.close()
+
+
+class _BindLock:
+    """flock serializing the stale-socket check and bind of racing servers"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.fd = None
+
+    def __enter__(self):
+        if fcntl is not None:
+            self.fd = os.open(self.path, os.O_CREAT | os.O_WRONLY)
+            fcntl.flock(self.fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self.fd is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+            os.close(self.fd)
+        return False
+
+
+def main():
+    try:
+        shared = SharedServer(default_socket_path())
+    except OSError:
+        return  # another server won the race; shims connect to it
+    shared.serve()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Shim - Thin stdio front end of the shared server
+
+An MCP client starts one server process per agent. With BEADS_SHARED=1 the
+launcher starts this shim instead: it connects to the shared server's Unix
+socket (starting the server if none is listening), introduces the session
+(agent, workspace, team from this process's environment) and then copies
+stdin to the socket and the socket to stdout. Every agent on the machine
+thus shares one process with warm workspace contexts and daemon clients.
+
+Stdlib only, so it starts fast. Where Unix sockets are unavailable it runs
+the regular in-process stdio server.
+"""
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+# How long to wait for a freshly spawned server to listen
+CONNECT_TIMEOUT = 10.0
+
+PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def default_socket_path() -> str:
+    """BEADS_SHARED_SOCKET, or server.sock in the village base directory"""
+    path = os.environ.get("BEADS_SHARED_SOCKET")
+    if path:
+        return path
+    base = os.environ.get("BEADS_VILLAGE_BASE", os.path.join(os.path.expanduser("~"), ".beads-village"))
+    return os.path.join(base, "server.sock")
+
+
+def session_hello() -> dict:
+    """Identity the server binds to this connection"""
+    return {"session": {
+        "agent": os.environ.get("BEADS_AGENT", f"agent-{os.getpid()}"),
+        "ws": os.path.abspath(os.environ.get("BEADS_WS", os.getcwd())),
+        "team": os.environ.get("BEADS_TEAM", "default"),
+    }}
+
+
+def _connect(path: str) -> socket.socket:
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+def spawn_server(path: str) -> None:
+    """Start a detached shared server listening on `path`"""
+    env = dict(os.environ, BEADS_SHARED_SOCKET=path)
+    pythonpath = env.get("PYTHONPATH")
+    env["PYTHONPATH"] = PACKAGE_ROOT + (os.pathsep + pythonpath if pythonpath else "")
+    subprocess.Popen(
+        [sys.executable, "-m", "beads_village.shared_server"],
+        stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        cwd=PACKAGE_ROOT, env=env, start_new_session=True,
+    )
+
+
+def connect(path: str = None, timeout: float = CONNECT_TIMEOUT) -> socket.socket:
+    """Connect to the shared server, starting it if nothing listens"""
+    path = path or default_socket_path()
+    try:
+        return _connect(path)
+    except OSError:
+        pass
+    spawn_server(path)
+    deadline = time.time() + timeout
+    delay = 0.02
+    while True:
+        try:
+            return _connect(path)
+        except OSError:
+            if time.time() >= deadline:
+                raise
+        time.sleep(delay)
+        delay = min(delay * 2, 0.5)
+
+
+def _pump_out(sock: socket.socket) -> None:
+    with sock.makefile("rb") as f:
+        for line in f:
+            sys.stdout.buffer.write(line)
+            sys.stdout.buffer.flush()
+
+
+def run_shim(path: str = None) -> None:
+    sock = connect(path)
+    sock.sendall((json.dumps(session_hello()) + "\n").encode())
+    reader = threading.Thread(target=_pump_out, args=(sock,), daemon=True)
+    reader.start()
+    try:
+        for line in sys.stdin.buffer:
+            sock.sendall(line)
+    except OSError:
+        pass  # server went away
+    finally:
+        # The server ends the session and closes once it has answered
+        try:
+            sock.shutdown(socket.SHUT_WR)
+        except OSError:
+            pass
+        reader.join()
+        sock.close()
+
+
+def main():
+    if not hasattr(socket, "AF_UNIX"):
+        sys.path.insert(0, PACKAGE_ROOT)
+        from beads_village.server import run_server
+        run_server()
+        return
+    run_shim()
+
+
+if __name__ == "__main__":
+    main()
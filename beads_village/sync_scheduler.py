@@ -0,0 +1,309 @@
+"""
+Sync Scheduler - Debounced, coalesced background `bd sync`
+
+Tools request a sync instead of running one. Requests arriving within the
+debounce window are folded together, and at most one sync runs at a time:
+requests made while it runs collapse into a single pending follow-up. A
+caller that needs the remote to be current waits on a barrier, which is
+satisfied by the first sync that *started* after its request.
+
+`sync_token()` captures, mostly from git's ref files, what a sync depends
+on: the upstream branch head and the committed `issues.jsonl` object. When the
+token still matches the one taken after the last successful sync, and that
+sync is recent enough, there is nothing new to pull.
+"""
+import asyncio
+import os
+import subprocess
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    from . import request_scope
+except ImportError:
+    import request_scope
+
+
+class SyncScheduler:
+    """Runs `run` on a background thread, coalescing requests.
+
+    `debounce` is how long a request waits for others to join it before the
+    sync starts; barrier waiters skip the wait. With a debounce of 0 or less
+    every request runs the sync inline, as before.
+    """
+
+    def __init__(self, run: Callable[[], Any], debounce: float = 2.0,
+                 snapshot: Optional[Callable[[], Any]] = None):
+        self.run = run
+        self.debounce = debounce
+        self.snapshot = snapshot  # taken after each successful sync, see is_fresh
+        self._cond = threading.Condition()
+        self._requested = 0  # generation of the newest request
+        self._started = 0  # generation covered by the sync in flight / last run
+        self._completed = 0  # generation covered by the last finished sync
+        self._waiters = 0
+        self._futures: List[Tuple[int, asyncio.AbstractEventLoop, asyncio.Future]] = []  # see wait_async
+        self._thread: Optional[threading.Thread] = None
+        self.runs = 0
+        self.last_result: Any = None
+        self.last_error: Optional[str] = None
+        self.last_finished = 0.0
+        self.last_ok = 0.0
+        self.token: Any = None
+
+    @property
+    def in_flight(self) -> bool:
+        return self._started > self._completed
+
+    @property
+    def pending(self) -> bool:
+        return self._requested > self._started
+
+    def request(self) -> int:
+        """Ask for a sync soon; returns the request's generation"""
+        if self.debounce <= 0:
+            with self._cond:
+                self._requested += 1
+                generation = self._requested
+            self._run_once(generation)
+            return generation
+        with self._cond:
+            self._requested += 1
+            generation = self._requested
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._worker, name="beads-sync", daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+            return generation
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Request a sync and block until one started after the request has finished"""
+        with self._cond:
+            self._waiters += 1
+        try:
+            generation = self.request()
+            deadline = None if timeout is None else time.time() + timeout
+            with self._cond:
+                self._cond.notify_all()
+                while self._completed < generation:
+                    remaining = None if deadline is None else deadline - time.time()
+                    if remaining is not None and remaining <= 0:
+                        return False
+                    self._cond.wait(remaining)
+                return True
+        finally:
+            with self._cond:
+                self._waiters -= 1
+
+    async def wait_async(self, timeout: Optional[float] = None) -> bool:
+        """`wait` for tools: awaits a future the sync resolves, so the event
+        loop keeps running and a cancelled call stops waiting at once"""
+        loop = asyncio.get_running_loop()
+        done = loop.create_future()
+        with self._cond:
+            self._waiters += 1
+        try:
+            generation = self.request()
+            with self._cond:
+                if self._completed >= generation:
+                    return True
+                self._futures.append((generation, loop, done))
+                self._cond.notify_all()
+            try:
+                await asyncio.wait_for(done, timeout)
+            except asyncio.TimeoutError:
+                return False
+            return True
+        finally:
+            with self._cond:
+                self._waiters -= 1
+                self._futures = [f for f in self._futures if f[2] is not done]
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait for pending and in-flight syncs without requesting a new one"""
+        with self._cond:
+            if self._completed >= self._requested:
+                return True
+            self._waiters += 1
+        try:
+            deadline = None if timeout is None else time.time() + timeout
+            with self._cond:
+                self._cond.notify_all()
+                while self._completed < self._requested:
+                    remaining = None if deadline is None else deadline - time.time()
+                    if remaining is not None and remaining <= 0:
+                        return False
+                    self._cond.wait(remaining)
+                return True
+        finally:
+            with self._cond:
+                self._waiters -= 1
+
+    def is_fresh(self, max_age: float) -> bool:
+        """Whether the last successful sync is recent and nothing moved since"""
+        if not self.last_ok or time.time() - self.last_ok > max_age:
+            return False
+        if self.snapshot is None:
+            return True
+        try:
+            return self.snapshot() == self.token
+        except Exception:
+            return False
+
+    def _worker(self) -> None:
+        while True:
+            with self._cond:
+                if self._requested <= self._started:
+                    self._thread = None
+                    return
+                # Debounce: let more requests pile up unless someone is waiting
+                deadline = time.time() + self.debounce
+                while not self._waiters:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                generation = self._requested
+            self._run_once(generation)
+
+    def _run_once(self, generation: int) -> None:
+        with self._cond:
+            self._started = max(self._started, generation)
+        result, error = None, None
+        try:
+            result = self.run()
+            if isinstance(result, dict) and result.get("error"):
+                error = str(result["error"])
+        except Exception as e:
+            error = str(e)[:200]
+        token = None
+        if error is None and self.snapshot is not None:
+            try:
+                token = self.snapshot()
+            except Exception:
+                pass
+        with self._cond:
+            if error is None:
+                self.last_ok = time.time()
+                self.token = token
+            self.runs += 1
+            self.last_result, self.last_error = result, error
+            self.last_finished = time.time()
+            self._completed = max(self._completed, generation)
+            finished = [f for f in self._futures if f[0] <= self._completed]
+            self._futures = [f for f in self._futures if f[0] > self._completed]
+            self._cond.notify_all()
+        for _, loop, done in finished:
+            try:
+                loop.call_soon_threadsafe(_resolve, done)
+            except RuntimeError:
+                pass  # loop closed; its waiter is gone
+
+
+def _resolve(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(True)
+
+
+# ============================================================================
+# FRESHNESS TOKEN
+# ============================================================================
+
+def git_dir(ws: str) -> Optional[str]:
+    """The .git directory of the repository containing `ws` (worktrees resolved)"""
+    path = os.path.abspath(ws)
+    while True:
+        dot_git = os.path.join(path, '.git')
+        if os.path.isdir(dot_git):
+            return dot_git
+        if os.path.isfile(dot_git):
+            try:
+                with open(dot_git, encoding='utf-8') as f:
+                    line = f.read().strip()
+            except OSError:
+                return None
+            if line.startswith('gitdir:'):
+                return os.path.normpath(os.path.join(path, line[7:].strip()))
+            return None
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None
+        path = parent
+
+
+def _common_dir(gdir: str) -> str:
+    try:
+        with open(os.path.join(gdir, 'commondir'), encoding='utf-8') as f:
+            return os.path.normpath(os.path.join(gdir, f.read().strip()))
+    except OSError:
+        return gdir
+
+
+def read_ref(gdir: str, ref: str) -> str:
+    """Resolve a ref from loose ref files or packed-refs ("" if unknown)"""
+    for base in (gdir, _common_dir(gdir)):
+        try:
+            with open(os.path.join(base, ref), encoding='utf-8') as f:
+                value = f.read().strip()
+        except OSError:
+            continue
+        if value.startswith('ref:'):
+            return read_ref(gdir, value[4:].strip())
+        return value
+    try:
+        with open(os.path.join(_common_dir(gdir), 'packed-refs'), encoding='utf-8') as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 2 and parts[1] == ref:
+                    return parts[0]
+    except OSError:
+        pass
+    return ""
+
+
+def _head_branch(gdir: str) -> str:
+    try:
+        with open(os.path.join(gdir, 'HEAD'), encoding='utf-8') as f:
+            head = f.read().strip()
+    except OSError:
+        return ""
+    return head[len('ref: refs/heads/'):] if head.startswith('ref: refs/heads/') else ""
+
+
+# (ws, HEAD sha) -> committed issues.jsonl object id
+_blob_ids: Dict[Tuple[str, str], str] = {}
+
+
+def _issues_blob(ws: str, head: str) -> str:
+    key = (ws, head)
+    if key not in _blob_ids:
+        blob = ""
+        try:
+            result = request_scope.run(
+                ["git", "rev-parse", "-q", "--verify", f"{head}:./.beads/issues.jsonl"],
+                timeout=5, cwd=ws,
+            )
+            if result.returncode == 0:
+                blob = result.stdout.decode().strip()
+        except (OSError, subprocess.TimeoutExpired):
+            pass
+        if len(_blob_ids) > 64:
+            _blob_ids.clear()
+        _blob_ids[key] = blob
+    return _blob_ids[key]
+
+
+def sync_token(ws: str) -> Tuple[str, str]:
+    """(upstream head, committed issues.jsonl object id) of a workspace.
+
+    Reads ref files only; git itself runs just once per new local HEAD to
+    resolve the issues.jsonl blob.
+    """
+    gdir = git_dir(ws)
+    if gdir is None:
+        return ("", "")
+    branch = _head_branch(gdir)
+    upstream = read_ref(gdir, f"refs/remotes/origin/{branch}") if branch else ""
+    head = read_ref(gdir, 'HEAD')
+    return (upstream, _issues_blob(ws, head) if head else "")
@@ -0,0 +1,138 @@
+"""
+Workspace - Per-workspace session state, kept warm in an LRU pool
+
+An agent can move between workspaces (BE, FE, mobile) with `init(ws=...)`
+and come back. Everything tied to one workspace lives on its
+WorkspaceContext: the bd daemon client (with its circuit breaker), the
+background sync scheduler, the daemon supervisor, the mailbox handle (with
+its archive segment cache) and the reservation and mail directories,
+created once.
+
+The server keeps the most recently used contexts in a WorkspacePool and
+hands each tool the context its call started in, so a tool keeps working
+on one workspace even if another call switches the session elsewhere.
+A session holds the workspace it joined with `init` until it switches or
+ends; held contexts are never evicted, since their sync scheduler and
+daemon supervisor are in use. Evicted contexts are closed: pending syncs
+are flushed and a managed daemon reference is released.
+"""
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional
+
+try:
+    from .mail_store import Mailbox
+except ImportError:
+    from mail_store import Mailbox
+
+
+class WorkspaceContext:
+    """State of one workspace for this session"""
+
+    __slots__ = ('ws', 'daemon', 'sync', 'supervisor', 'holders', '_mailbox', '_dirs')
+
+    def __init__(self, ws: str, daemon=None, sync=None):
+        self.ws = os.path.abspath(ws)
+        self.daemon = daemon  # BdDaemonClient, created on first use
+        self.sync = sync  # SyncScheduler
+        self.supervisor = None  # DaemonSupervisor, started by init
+        self.holders = set()  # sessions that joined this workspace (see WorkspacePool.hold)
+        self._mailbox: Optional[Mailbox] = None
+        self._dirs = set()
+
+    def ensure_dir(self, name: str) -> str:
+        """Directory under the workspace, created on first use"""
+        d = os.path.join(self.ws, name)
+        if name not in self._dirs:
+            os.makedirs(d, exist_ok=True)
+            self._dirs.add(name)
+        return d
+
+    @property
+    def mail_dir(self) -> str:
+        return self.ensure_dir(".mail")
+
+    @property
+    def reservation_dir(self) -> str:
+        return self.ensure_dir(".reservations")
+
+    @property
+    def mailbox(self) -> Mailbox:
+        """Workspace mailbox (small, unsharded)"""
+        if self._mailbox is None:
+            self._mailbox = Mailbox(self.mail_dir)
+        return self._mailbox
+
+    @property
+    def claim_lock_path(self) -> str:
+        return os.path.join(self.ws, ".beads", ".claim.lock")
+
+    def close(self, timeout: float = 30.0) -> None:
+        """Flush pending syncs and release the managed daemon"""
+        if self.sync is not None:
+            self.sync.flush(timeout)
+        if self.supervisor is not None:
+            try:
+                self.supervisor.stop()
+            except (OSError, TimeoutError):
+                pass
+            self.supervisor = None
+
+    def __repr__(self) -> str:
+        return f"<WorkspaceContext {self.ws}>"
+
+
+class WorkspacePool:
+    """Most recently used workspace contexts, at most `capacity` of them"""
+
+    def __init__(self, factory: Callable[[str], WorkspaceContext], capacity: int = 8):
+        self.factory = factory
+        self.capacity = max(capacity, 1)
+        self._contexts: 'OrderedDict[str, WorkspaceContext]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, ws: str) -> WorkspaceContext:
+        """Context of a workspace, created (and the oldest unheld evicted) if needed
+
+        When every other context is held the pool grows past its capacity.
+        """
+        key = os.path.abspath(ws)
+        evicted = []
+        with self._lock:
+            ctx = self._contexts.get(key)
+            if ctx is None:
+                ctx = self._contexts[key] = self.factory(key)
+                while len(self._contexts) > self.capacity:
+                    idle = next((k for k, c in self._contexts.items() if k != key and not c.holders), None)
+                    if idle is None:
+                        break
+                    evicted.append(self._contexts.pop(idle))
+            else:
+                self._contexts.move_to_end(key)
+        for old in evicted:
+            old.close()
+        return ctx
+
+    def hold(self, ctx: WorkspaceContext, holder: str) -> None:
+        """Keep a context pooled until `holder` releases it"""
+        with self._lock:
+            ctx.holders.add(holder)
+
+    def release(self, ctx: WorkspaceContext, holder: str) -> None:
+        """Drop a hold; the context stays warm until evicted"""
+        with self._lock:
+            ctx.holders.discard(holder)
+
+    def close_all(self, timeout: float = 30.0) -> None:
+        with self._lock:
+            contexts = list(self._contexts.values())
+            self._contexts.clear()
+        for ctx in contexts:
+            ctx.close(timeout)
+
+    def __contains__(self, ws: str) -> bool:
+        return os.path.abspath(ws) in self._contexts
+
+    def __len__(self) -> int:
+        return len(self._contexts)
@@ -10,10 +10,12 @@ const { spawn, spawnSync } = require('child_process');
 const path = require('path');
 const fs = require('fs');
 
-const serverPath = path.join(__dirname, '..', 'beads_village', 'server.py');
+// BEADS_SHARED=1: connect to the shared multi-session server through the shim
+const entry = process.env.BEADS_SHARED === '1' ? 'shim.py' : 'server.py';
+const serverPath = path.join(__dirname, '..', 'beads_village', entry);
 
 if (!fs.existsSync(serverPath)) {
-    console.error('Error: server.py not found at', serverPath);
+    console.error(`Error: ${entry} not found at`, serverPath);
     process.exit(1);
 }
 
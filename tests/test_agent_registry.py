@@ -0,0 +1,402 @@
+"""Tests for the per-agent registry."""
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+import unittest
+from datetime import datetime
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from beads_village.agent_registry import AgentInfo, AgentRegistry, Heartbeat, LivenessIndex
+from beads_village.records import Reservation
+
+
+def _agent(agent_id, team="t1", workspace="/ws"):
+    return AgentInfo(agent_id=agent_id, team=team, role="fe", workspace=workspace, is_leader=False)
+
+
+def _churn(base, agent_id, rounds):
+    reg = AgentRegistry(base)
+    reg.register(_agent(agent_id))
+    for i in range(rounds):
+        reg.heartbeat(agent_id)
+        reg.update_task(agent_id, f"bd-{i}")
+
+
+def _update_field(base, agent_id, field, rounds):
+    reg = AgentRegistry(base)
+    for i in range(rounds):
+        reg.heartbeat(agent_id, **{field: [f"{field}-{i}"]})
+
+
+class TestAgentRegistry(unittest.TestCase):
+    """Test per-agent records and the cached read model."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.reg = AgentRegistry(self.temp_dir)
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_one_record_per_agent(self):
+        """Test each agent gets its own file."""
+        self.reg.register(_agent("fe-1"))
+        self.reg.register(_agent("be/1"))
+        names = sorted(os.listdir(os.path.join(self.temp_dir, "t1", "agents")))
+        self.assertEqual(names, ["be%2F1.json", "fe-1.json"])
+        self.assertEqual(sorted(a.agent_id for a in self.reg.get_all_agents()), ["be/1", "fe-1"])
+
+    def test_heartbeat_and_task(self):
+        """Test updates touch only the agent's own record."""
+        self.reg.register(_agent("fe-1"))
+        self.reg.register(_agent("be-1"))
+        other_path = os.path.join(self.temp_dir, "t1", "agents", "be-1.json")
+        with open(other_path, "rb") as f:
+            other = f.read()
+
+        self.assertTrue(self.reg.update_task("fe-1", "bd-7"))
+        self.assertFalse(self.reg.heartbeat("nobody"))
+        self.assertEqual(self.reg.get_agent("fe-1").current_task, "bd-7")
+        with open(other_path, "rb") as f:
+            self.assertEqual(f.read(), other)
+
+    def test_read_model_sees_other_writers(self):
+        """Test a second registry instance picks up changes and removals."""
+        reader = AgentRegistry(self.temp_dir)
+        self.reg.register(_agent("fe-1"))
+        self.assertEqual(len(reader.get_all_agents()), 1)
+
+        self.reg.update_task("fe-1", "bd-1")
+        self.assertEqual(reader.get_all_agents()[0].current_task, "bd-1")
+
+        self.reg.unregister("fe-1")
+        self.assertEqual(reader.get_all_agents(), [])
+
+    def test_cleanup_stale(self):
+        """Test old records are removed and fresh ones kept."""
+        self.reg.register(_agent("fe-1"))
+        stale = _agent("old-1").to_dict()
+        stale["last_seen"] = time.time() - 7200
+        self.reg._dir("t1").write("old-1", stale)
+
+        self.assertEqual(self.reg.cleanup_stale(3600), 1)
+        self.assertEqual([a.agent_id for a in self.reg.get_all_agents()], ["fe-1"])
+
+    def test_legacy_team_record(self):
+        """Test records written by the old team registry still load."""
+        agents_dir = os.path.join(self.temp_dir, "t1", "agents")
+        os.makedirs(agents_dir)
+        with open(os.path.join(agents_dir, "fe-1.json"), "w") as f:
+            json.dump({"agent": "fe-1", "ws": "/ws", "team": "t1",
+                       "capabilities": ["general", "fe", "leader"],
+                       "registered": "2024-01-01T00:00:00",
+                       "last_seen": datetime.now().isoformat()}, f)
+
+        (agent,) = self.reg.get_active_agents()
+        self.assertEqual((agent.agent_id, agent.workspace, agent.role), ("fe-1", "/ws", "fe"))
+        self.assertTrue(agent.is_leader)
+        self.assertTrue(self.reg.heartbeat("fe-1"))
+        self.assertEqual(self.reg.get_agent("fe-1").capabilities, ["general", "fe", "leader"])
+
+    def test_team_and_workspace_indexes(self):
+        """Test lookups by team and by workspace over one store."""
+        self.reg.register(_agent("fe-1", team="t1", workspace="/a"))
+        self.reg.register(_agent("be-1", team="t1", workspace="/b"))
+        self.reg.register(_agent("qa-1", team="t2", workspace="/a"))
+
+        self.assertEqual(sorted(a.agent_id for a in self.reg.get_team_agents("t1")), ["be-1", "fe-1"])
+        self.assertEqual(sorted(a.agent_id for a in self.reg.get_workspace_agents("/a/")), ["fe-1", "qa-1"])
+        workspaces = {w["ws"]: w["agents"] for w in self.reg.get_workspaces("t1")}
+        self.assertEqual(workspaces, {"/a": ["fe-1"], "/b": ["be-1"]})
+
+    def test_register_moves_between_teams(self):
+        """Test switching team leaves a single record."""
+        self.reg.register(_agent("fe-1", team="t1"))
+        self.reg.register(_agent("fe-1", team="t2"))
+        self.assertEqual([a.team for a in self.reg.get_all_agents()], ["t2"])
+
+    def test_concurrent_writers_lose_nothing(self):
+        """Test agents in separate processes never clobber each other."""
+        procs = [
+            multiprocessing.Process(target=_churn, args=(self.temp_dir, f"agent-{i}", 20))
+            for i in range(8)
+        ]
+        for p in procs:
+            p.start()
+        for p in procs:
+            p.join()
+
+        agents = {a.agent_id: a for a in self.reg.get_all_agents()}
+        self.assertEqual(len(agents), 8)
+        self.assertTrue(all(a.current_task == "bd-19" for a in agents.values()))
+
+    def test_concurrent_updates_of_one_agent(self):
+        """Test writers changing different fields of one record keep each other's changes."""
+        self.reg.register(_agent("a1"))
+        procs = [
+            multiprocessing.Process(target=_update_field, args=(self.temp_dir, "a1", field, 50))
+            for field in ("reservations", "capabilities")
+        ]
+        for p in procs:
+            p.start()
+        for p in procs:
+            p.join()
+
+        agent = AgentRegistry(self.temp_dir).get_agent("a1", "t1")
+        self.assertEqual((agent.reservations, agent.capabilities), (["reservations-49"], ["capabilities-49"]))
+
+    def test_active_set_follows_heartbeats(self):
+        """Test the liveness index tracks updates, staleness and removals."""
+        self.reg.register(_agent("fe-1"))
+        self.reg.register(_agent("be-1"))
+        old = self.reg._dir("t1").read("be-1")
+        old["last_seen"] = time.time() - 600
+        self.reg._dir("t1").write("be-1", old)
+
+        self.assertEqual([a.agent_id for a in self.reg.get_active_agents()], ["fe-1"])
+        self.reg.heartbeat("be-1")
+        self.assertEqual([a.agent_id for a in self.reg.get_active_agents()], ["be-1", "fe-1"])
+
+        # Changes by another process are picked up too
+        AgentRegistry(self.temp_dir).unregister("fe-1")
+        self.assertEqual([a.agent_id for a in self.reg.get_active_agents()], ["be-1"])
+
+    def test_reader_waits_for_index_update(self):
+        """Test a reader on another thread never sees a half-updated index."""
+        import threading
+        self.reg.register(_agent("a1"))
+        self.reg.register(_agent("a2"))
+        self.reg.get_active_agents()
+        self.reg.unregister("a2")
+
+        index = self.reg._liveness["t1"]
+        remove = index.remove
+        seen, errors, readers = [], [], []
+
+        def read():
+            try:
+                seen.append([a.agent_id for a in self.reg.get_active_agents()])
+            except Exception as e:
+                errors.append(e)
+
+        def paused_remove(agent_id):
+            # Another thread reads while this one is mid-update
+            readers.append(threading.Thread(target=read))
+            readers[0].start()
+            readers[0].join(0.2)
+            remove(agent_id)
+
+        index.remove = paused_remove
+        self.reg.get_active_agents()
+        del index.remove
+        readers[0].join()
+
+        self.assertEqual((errors, seen), ([], [["a1"]]))
+
+    def test_reservation_renewed_by_heartbeat(self):
+        """Test a listed reservation lasts its TTL past the holder's last beat."""
+        now = time.time()
+        self.reg.register(_agent("fe-1", workspace=self.temp_dir))
+        self.reg.heartbeat("fe-1", reservations=["a.py"])
+        listed = Reservation("a.py", "fe-1", "t1", created=now - 900, expires=now - 300)
+        unlisted = Reservation("b.py", "fe-1", "t1", created=now - 900, expires=now - 300)
+
+        self.assertGreater(self.reg.reservation_expires(listed, self.temp_dir), now + 590)
+        self.assertEqual(self.reg.reservation_expires(unlisted, self.temp_dir), now - 300)
+        self.assertEqual(self.reg.reservation_expires(listed, "/elsewhere"), now - 300)
+
+    def _age(self, agent_id, seconds, **fields):
+        data = self.reg._dir("t1").read(agent_id)
+        data.update(fields, last_seen=time.time() - seconds)
+        self.reg._dir("t1").write(agent_id, data)
+
+    def test_stale_agents_reaped_once(self):
+        """Test silent agents are reported until marked reaped."""
+        self.reg.register(_agent("fe-1", workspace="/a"))
+        self.reg.register(_agent("be-1", workspace="/a"))
+        self.reg.register(_agent("qa-1", workspace="/b"))
+        self._age("be-1", 2000, current_task="bd-1", reservations=["x.py"])
+        self._age("qa-1", 2000)
+
+        stale = self.reg.stale_agents("t1", 900, workspace="/a")
+        self.assertEqual([a.agent_id for a in stale], ["be-1"])
+
+        self.reg.mark_reaped("be-1", "t1")
+        agent = self.reg.get_agent("be-1")
+        self.assertEqual((agent.current_task, agent.reservations), (None, []))
+        self.assertLess(agent.last_seen, time.time() - 1000)
+        self.assertEqual(self.reg.stale_agents("t1", 900, workspace="/a"), [])
+
+    def test_cleanup_keeps_unreaped_work(self):
+        """Test stale records holding work survive until reaped."""
+        self.reg.register(_agent("be-1"))
+        self._age("be-1", 7200, current_task="bd-1")
+        self.assertEqual(self.reg.cleanup_stale(3600), 0)
+
+        self.reg.mark_reaped("be-1", "t1")
+        self.assertEqual(self.reg.cleanup_stale(3600), 1)
+
+    def test_reaper_lock(self):
+        """Test only one reaper per team, and stale locks are broken."""
+        self.assertTrue(self.reg.acquire_reaper("t1"))
+        self.assertFalse(self.reg.acquire_reaper("t1"))
+        self.assertTrue(self.reg.acquire_reaper("t1", stale_after=0))
+        self.reg.release_reaper("t1")
+        self.assertTrue(self.reg.acquire_reaper("t1"))
+
+    def test_prefetch_lease_taken_once(self):
+        """Test owner, thief and reaper race on one marker per lease."""
+        self.reg.register(_agent("fe-1"))
+        entry = {"id": "bd-2", "exp": time.time() + 60}
+        self.reg.heartbeat("fe-1", "t1", prefetched=[entry])
+        self.assertEqual(self.reg.get_agent("fe-1").prefetched, [entry])
+
+        self.assertFalse(self.reg.prefetch_taken("t1", "fe-1", entry))
+        self.assertTrue(self.reg.take_prefetched("t1", "fe-1", entry, "be-1"))
+        self.assertFalse(self.reg.take_prefetched("t1", "fe-1", entry, "fe-1"))
+        self.assertTrue(self.reg.prefetch_taken("t1", "fe-1", entry))
+        # A later lease of the same issue is a new race
+        self.assertTrue(self.reg.take_prefetched("t1", "fe-1", dict(entry, exp=entry["exp"] + 1), "fe-1"))
+
+    def test_prefetched_work_kept_until_reaped(self):
+        """Test stale records with a prefetched batch survive cleanup until reaped."""
+        self.reg.register(_agent("be-1"))
+        self._age("be-1", 7200, prefetched=[{"id": "bd-3", "exp": 0}])
+        self.assertEqual(self.reg.cleanup_stale(3600), 0)
+
+        self.reg.mark_reaped("be-1", "t1")
+        self.assertEqual(self.reg.get_agent("be-1").prefetched, [])
+        self.assertEqual(self.reg.cleanup_stale(3600), 1)
+
+
+class TestRegistryDelta(unittest.TestCase):
+    """Test versioned change queries."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.reg = AgentRegistry(self.temp_dir)
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_delta_since_version(self):
+        """Test only agents touched after a version are returned."""
+        self.reg.register(_agent("fe-1"))
+        self.reg.register(_agent("be-1", team="t2"))
+        snap = self.reg.changes()
+        self.assertTrue(snap["full"])
+        self.assertEqual(len(snap["agents"]), 2)
+
+        v = snap["version"]
+        self.assertEqual(self.reg.changes(v)["agents"], [])
+        self.reg.update_task("fe-1", "bd-1")
+        self.reg.unregister("be-1")
+        delta = self.reg.changes(v)
+        self.assertFalse(delta["full"])
+        self.assertEqual([a.agent_id for a in delta["agents"]], ["fe-1"])
+        self.assertEqual(delta["removed"], [{"agent_id": "be-1", "team": "t2"}])
+        self.assertGreater(delta["version"], v)
+        self.assertEqual(delta["version"], self.reg.version())
+
+        # Team filter
+        self.assertEqual(self.reg.changes(v, team="t2")["agents"], [])
+
+    def test_version_survives_rotation(self):
+        """Test rotation keeps versions growing and old cursors get a snapshot."""
+        import beads_village.agent_registry as agent_registry
+        self.reg.register(_agent("fe-1"))
+        v0 = self.reg.version()
+        old_max = agent_registry.JOURNAL_MAX
+        agent_registry.JOURNAL_MAX = 200
+        try:
+            for _ in range(60):
+                self.reg.heartbeat("fe-1")
+        finally:
+            agent_registry.JOURNAL_MAX = old_max
+
+        v1 = self.reg.version()
+        self.assertGreater(v1, v0)
+        self.assertLess(os.path.getsize(os.path.join(self.temp_dir, ".journal")), 300)
+        self.assertTrue(self.reg.changes(v0)["full"])
+        self.assertEqual(self.reg.changes(v1)["agents"], [])
+        self.reg.heartbeat("fe-1")
+        self.assertEqual(len(self.reg.changes(v1)["agents"]), 1)
+
+
+class TestLivenessIndex(unittest.TestCase):
+    """Test the last_seen ordering."""
+
+    def test_range_query_and_moves(self):
+        """Test seen_since is a newest-first range and updates move entries."""
+        index = LivenessIndex()
+        index.update("a", 10.0, "/ws")
+        index.update("b", 20.0, "/ws/")
+        index.update("c", 30.0, "/other")
+        self.assertEqual(index.seen_since(15.0), ["c", "b"])
+        self.assertEqual(index.in_workspace("/ws"), {"a", "b"})
+
+        index.update("a", 40.0, "/other")
+        self.assertEqual(index.seen_since(15.0), ["a", "c", "b"])
+        self.assertEqual(index.in_workspace("/ws"), {"b"})
+
+        index.remove("c")
+        self.assertEqual(index.seen_since(0.0), ["a", "b"])
+        self.assertEqual(len(index), 2)
+
+
+class TestHeartbeat(unittest.TestCase):
+    """Test the background heartbeat."""
+
+    def test_ticks_until_stopped(self):
+        """Test beat runs periodically and stops cleanly."""
+        beats = []
+        hb = Heartbeat(lambda: beats.append(time.time()), interval=0.01)
+        self.assertTrue(hb.start())
+        self.assertFalse(hb.start())
+        time.sleep(0.1)
+        hb.stop()
+        count = len(beats)
+        self.assertGreater(count, 2)
+        time.sleep(0.05)
+        self.assertEqual(len(beats), count)
+
+    def test_disabled_and_errors(self):
+        """Test interval 0 disables and failing beats keep ticking."""
+        self.assertFalse(Heartbeat(lambda: None, interval=0).start())
+
+        calls = []
+        def boom():
+            calls.append(1)
+            raise OSError("disk full")
+        hb = Heartbeat(boom, interval=0.01)
+        hb.start()
+        time.sleep(0.05)
+        hb.stop()
+        self.assertGreater(len(calls), 1)
+
+    def test_single_write_carries_task_and_reservations(self):
+        """Test one heartbeat updates last_seen, task and reservations together."""
+        temp_dir = tempfile.mkdtemp()
+        try:
+            reg = AgentRegistry(temp_dir)
+            reg.register(_agent("fe-1"))
+            before = reg.get_agent("fe-1").last_seen
+            time.sleep(0.01)
+            reg.heartbeat("fe-1", "t1", current_task="bd-3", reservations=["src/a.py"])
+            agent = reg.get_agent("fe-1")
+            self.assertGreater(agent.last_seen, before)
+            self.assertEqual((agent.current_task, agent.reservations), ("bd-3", ["src/a.py"]))
+        finally:
+            import shutil
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    unittest.main()
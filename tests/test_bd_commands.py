@@ -0,0 +1,40 @@
+"""Tests for typed bd commands."""
+import os
+import sys
+import unittest
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from beads_village import bd_commands as cmds
+
+
+class TestArgv(unittest.TestCase):
+    """Test CLI rendering."""
+
+    def test_json_flag_appended(self):
+        """Test --json follows the arguments of JSON commands only."""
+        self.assertEqual(cmds.Show("bd-1").argv(), ["show", "bd-1", "--json"])
+        self.assertEqual(cmds.Close("bd-1").argv(), ["close", "bd-1", "--reason", "Completed"])
+        self.assertEqual(cmds.Doctor().argv(), ["doctor", "--fix", "--json"])
+
+    def test_create(self):
+        """Test create renders labels comma-joined and one --deps per dependency."""
+        argv = cmds.Create("Login", issue_type="bug", priority=1, description="d",
+                           deps=["bd-1", "blocks:bd-2"], labels=["fe", "qa"]).argv()
+        self.assertEqual(argv, ["create", "Login", "-t", "bug", "-p", "1", "--description", "d",
+                                "--labels", "fe,qa", "--deps", "bd-1", "--deps", "blocks:bd-2", "--json"])
+
+    def test_update_clears_assignee(self):
+        """Test an empty assignee is rendered while None is omitted."""
+        self.assertEqual(cmds.Update("bd-1", assignee="").argv(), ["update", "bd-1", "--assignee", ""])
+        self.assertEqual(cmds.Update("bd-1", status="open").argv(), ["update", "bd-1", "--status", "open"])
+
+    def test_multi_id_update(self):
+        """Test several ids go into one update."""
+        argv = cmds.Update("bd-1", "bd-2", status="closed").argv()
+        self.assertEqual(argv, ["update", "bd-1", "bd-2", "--status", "closed"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,209 @@
+"""Tests for daemon RPC coverage, socket lookup and the circuit breaker."""
+import asyncio
+import json
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from beads_village import bd_daemon_client
+from beads_village.bd_daemon_client import (
+    BdDaemonClient, DaemonCircuitOpenError, DaemonError, DaemonTimeoutError,
+    find_socket_path, forget_socket_path,
+)
+from beads_village import bd_commands as cmds
+
+
+class _FakeDaemon(BdDaemonClient):
+    """Client whose RPCs are answered in-process and recorded."""
+
+    def __init__(self, responses=None):
+        super().__init__(working_dir="/ws")
+        self.calls = []
+        self.responses = responses or {}
+
+    async def _send_request(self, operation, args):
+        self.calls.append((operation, args))
+        if operation not in self.responses:
+            return {}
+        response = self.responses[operation]
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+class TestDaemonLabels(unittest.TestCase):
+    """Test tagged writes stay on the daemon."""
+
+    def test_create_with_labels(self):
+        """Test --labels is sent with the create RPC."""
+        daemon = _FakeDaemon({"create": {"id": "bd-1"}})
+        r = _run(cmds.Create("Login form", priority=1, labels=["fe", "qa"]).rpc(daemon))
+        self.assertEqual(r, {"id": "bd-1"})
+        self.assertEqual(daemon.calls[0][1]["labels"], ["fe", "qa"])
+
+    def test_update_labels(self):
+        """Test label flags map to label operations, with no empty update RPC."""
+        daemon = _FakeDaemon()
+        _run(cmds.Update("bd-1", add_labels=["be"], remove_labels=["fe"]).rpc(daemon))
+        self.assertEqual(daemon.calls, [("label_add", {"id": "bd-1", "label": "be"}),
+                                        ("label_remove", {"id": "bd-1", "label": "fe"})])
+
+    def test_set_labels_diffs_current(self):
+        """Test --set-labels only adds and removes what differs."""
+        daemon = _FakeDaemon({"show": {"id": "bd-1", "labels": ["fe", "qa"]}})
+        _run(cmds.Update("bd-1", status="open", set_labels=["qa", "be"]).rpc(daemon))
+        ops = [(op, args.get("label")) for op, args in daemon.calls]
+        self.assertEqual(ops, [("update", None), ("show", None), ("label_add", "be"), ("label_remove", "fe")])
+
+    def test_multi_id_update(self):
+        """Test every listed issue is updated."""
+        daemon = _FakeDaemon({"update": {"ok": 1}})
+        r = _run(cmds.Update("bd-1", "bd-2", status="in_progress", assignee="fe-1").rpc(daemon))
+        self.assertEqual(len(r), 2)
+        self.assertEqual([a["id"] for _, a in daemon.calls], ["bd-1", "bd-2"])
+        self.assertEqual(daemon.calls[1][1]["assignee"], "fe-1")
+
+    def test_unknown_operation_falls_back(self):
+        """Test a daemon without label support surfaces an error the caller falls back on."""
+        daemon = _FakeDaemon({"label_add": DaemonError("unknown operation: label_add")})
+        with self.assertRaises(DaemonError):
+            _run(cmds.Update("bd-1", add_labels=["be"]).rpc(daemon))
+
+
+class TestDaemonCleanup(unittest.TestCase):
+    """Test cleanup runs over RPC."""
+
+    def test_forwards_to_daemon_cleanup(self):
+        """Test cleanup is one call to the daemon's cleanup operation."""
+        daemon = _FakeDaemon({"cleanup": {"deleted": 1}})
+        r = _run(cmds.Cleanup(2).rpc(daemon))
+        self.assertEqual(r, {"deleted": 1})
+        self.assertEqual(daemon.calls, [("cleanup", {"older_than_days": 2})])
+
+    def test_unknown_operation_falls_back(self):
+        """Test a daemon without cleanup surfaces an error the caller falls back on."""
+        daemon = _FakeDaemon({"cleanup": DaemonError("unknown operation: cleanup")})
+        with self.assertRaises(DaemonError):
+            _run(cmds.Cleanup(2).rpc(daemon))
+
+
+class _SocketDaemon:
+    """Unix socket server that answers every request, or accepts and hangs."""
+
+    def __init__(self, path, answer=True, error=None):
+        self.answer = answer
+        self.error = error
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.bind(path)
+        self.sock.listen(16)
+        self.conns = []
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            self.conns.append(conn)
+            if self.answer:
+                conn.makefile().readline()
+                reply = {"success": False, "error": self.error} if self.error else {"success": True, "data": {"ok": 1}}
+                conn.sendall(json.dumps(reply).encode() + b"\n")
+                conn.close()
+
+    def close(self):
+        for conn in self.conns:
+            conn.close()
+        self.sock.close()
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    """Test a failing daemon costs one slow call per cooldown."""
+
+    def setUp(self):
+        self.ws = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.ws, ".beads"))
+        self.sock_path = os.path.join(self.ws, ".beads", "bd.sock")
+        forget_socket_path()
+
+    def tearDown(self):
+        forget_socket_path()
+        shutil.rmtree(self.ws, ignore_errors=True)
+
+    def test_wedged_daemon_fails_fast_after_first_timeout(self):
+        """Test calls skip a daemon that stopped answering until the cooldown ends."""
+        server = _SocketDaemon(self.sock_path, answer=False)
+        self.addCleanup(server.close)
+        client = BdDaemonClient(working_dir=self.ws, timeout=0.3, cooldown=60, probe_timeout=0.05)
+        with self.assertRaises(DaemonTimeoutError):
+            _run(client.ping())
+        self.assertEqual(client.state, "open")
+        self.assertFalse(client.available())
+
+        start = time.time()
+        for _ in range(20):
+            with self.assertRaises(DaemonCircuitOpenError):
+                _run(client.ping())
+        self.assertLess(time.time() - start, 0.2)
+
+    def test_half_open_probe(self):
+        """Test a failed probe reopens quickly and a good one closes the circuit."""
+        server = _SocketDaemon(self.sock_path, answer=False)
+        client = BdDaemonClient(working_dir=self.ws, timeout=5, cooldown=60, probe_timeout=0.05)
+        client._trip(DaemonTimeoutError("no answer"))
+        client.opened_at -= 60
+
+        start = time.time()
+        with self.assertRaises(DaemonTimeoutError):
+            _run(client.stats())
+        self.assertLess(time.time() - start, 1.0)
+        self.assertEqual(client.state, "open")
+        self.assertEqual(client.failures, 2)
+
+        server.close()
+        os.remove(self.sock_path)
+        server = _SocketDaemon(self.sock_path)
+        self.addCleanup(server.close)
+        client.opened_at -= 60
+        self.assertEqual(_run(client.stats()), {"ok": 1})
+        self.assertEqual(client.state, "closed")
+
+    def test_daemon_errors_keep_circuit_closed(self):
+        """Test errors reported by a responsive daemon do not open the circuit."""
+        server = _SocketDaemon(self.sock_path, error="issue not found")
+        self.addCleanup(server.close)
+        client = BdDaemonClient(working_dir=self.ws, timeout=5)
+        with self.assertRaises(DaemonError):
+            _run(client.show("bd-9"))
+        self.assertEqual(client.state, "closed")
+        self.assertTrue(client.available())
+
+    def test_socket_lookup_cached(self):
+        """Test the directory walk is reused and a removed socket is noticed."""
+        server = _SocketDaemon(self.sock_path)
+        self.addCleanup(server.close)
+        nested = os.path.join(self.ws, "src", "pkg")
+        os.makedirs(nested)
+        self.assertEqual(find_socket_path(nested), os.path.realpath(self.sock_path))
+        self.assertIn(nested, bd_daemon_client._socket_cache)
+
+        os.remove(self.sock_path)
+        self.assertIsNone(find_socket_path(nested))
+        self.assertEqual(bd_daemon_client._socket_cache[nested][0], None)
+
+
+if __name__ == "__main__":
+    unittest.main()
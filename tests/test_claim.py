@@ -0,0 +1,329 @@
+"""Tests for conflict-free claiming under concurrency."""
+import asyncio
+import contextvars
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from beads_village import server
+
+# Minimal bd: one file per issue holding "<status> <assignee>"; every
+# update is appended to updates.log so double claims are visible
+FAKE_BD = r"""#!/bin/sh
+D="$FAKE_BD_DIR"
+cmd="$1"; shift
+case "$cmd" in
+  sync) ;;
+  ready)
+    out=""
+    for f in "$D"/issues/*; do
+      read st as < "$f"
+      [ "$st" = open ] || continue
+      out="$out${out:+,}{\"id\":\"${f##*/}\",\"priority\":1}"
+    done
+    echo "[$out]" ;;
+  list)
+    out=""
+    for f in "$D"/issues/*; do
+      read st as < "$f"
+      [ "$st" = "$2" ] || continue
+      out="$out${out:+,}{\"id\":\"${f##*/}\",\"status\":\"$st\",\"assignee\":\"$as\"}"
+    done
+    echo "[$out]" ;;
+  show)
+    read st as < "$D/issues/$1"
+    echo "[{\"id\":\"$1\",\"status\":\"$st\",\"assignee\":\"$as\"}]" ;;
+  update)
+    ids=""
+    while [ $# -gt 0 ]; do
+      case "$1" in
+        --status) st="$2"; shift 2 ;;
+        --assignee) as="$2"; shift 2 ;;
+        --*) shift ;;
+        *) ids="$ids $1"; shift ;;
+      esac
+    done
+    for id in $ids; do
+      echo "$st $as" > "$D/issues/$id"
+      echo "$id $as" >> "$D/updates.log"
+    done ;;
+esac
+"""
+
+
+def _claimer(root, agent, start, results, n=1):
+    os.environ["PATH"] = os.path.join(root, "bin") + os.pathsep + os.environ["PATH"]
+    os.environ["FAKE_BD_DIR"] = root
+    server.S.agent = agent
+    server.S.ws = os.path.join(root, "ws")
+    server.USE_DAEMON = False
+    server.BEADS_VILLAGE_BASE = os.path.join(root, "base")
+    start.wait()
+    reply = json.loads(asyncio.run(server.tool_claim(server.workspace(), {"n": n})))
+    results.put((agent, reply))
+
+
+@unittest.skipIf(sys.platform == "win32", "uses a POSIX shell stand-in for bd")
+class TestConcurrentClaim(unittest.TestCase):
+    """Benchmark: many agents claiming at once never share an issue."""
+
+    CLAIMERS = 50
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        for sub in ("bin", "issues", "ws"):
+            os.makedirs(os.path.join(self.root, sub))
+        bd = os.path.join(self.root, "bin", "bd")
+        with open(bd, "w") as f:
+            f.write(FAKE_BD)
+        os.chmod(bd, 0o755)
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def _issues(self, count):
+        for i in range(count):
+            with open(os.path.join(self.root, "issues", f"bd-{i:03d}"), "w") as f:
+                f.write("open \n")
+
+    def _run(self, n=1):
+        ctx = multiprocessing.get_context("fork")
+        start, results = ctx.Event(), ctx.Queue()
+        procs = [ctx.Process(target=_claimer, args=(self.root, f"agent-{i}", start, results, n))
+                 for i in range(self.CLAIMERS)]
+        for p in procs:
+            p.start()
+        start.set()
+        replies = dict(results.get(timeout=120) for _ in procs)
+        for p in procs:
+            p.join()
+
+        with open(os.path.join(self.root, "updates.log")) as f:
+            updates = [line.split() for line in f]
+        return replies, updates
+
+    def _assert_no_double_claims(self, replies, updates):
+        owners = {}
+        for issue_id, agent in updates:
+            self.assertNotIn(issue_id, owners, f"{issue_id} claimed by {owners.get(issue_id)} and {agent}")
+            owners[issue_id] = agent
+        for agent, reply in replies.items():
+            for issue_id in [reply.get("id")] + reply.get("prefetched", []):
+                if issue_id:
+                    self.assertEqual(owners[issue_id], agent)
+
+    def test_fifty_claimers_one_issue_each(self):
+        """Test every claimer gets a distinct issue when there are enough."""
+        self._issues(self.CLAIMERS)
+        replies, updates = self._run()
+        self._assert_no_double_claims(replies, updates)
+        self.assertEqual(sorted(r["id"] for r in replies.values()), [f"bd-{i:03d}" for i in range(self.CLAIMERS)])
+
+    def test_contention_for_few_issues(self):
+        """Test losers retry other candidates and the rest come back empty-handed."""
+        self._issues(10)
+        replies, updates = self._run(n=2)
+        self._assert_no_double_claims(replies, updates)
+        self.assertEqual(len(updates), 10)
+        self.assertEqual(sum(1 for r in replies.values() if r.get("id")), 5)
+
+
+@unittest.skipIf(sys.platform == "win32", "uses a POSIX shell stand-in for bd")
+class TestStealPrefetched(unittest.TestCase):
+    """Test stolen prefetched tasks are reassigned in bd."""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        for sub in ("bin", "issues", "ws"):
+            os.makedirs(os.path.join(self.root, sub))
+        bd = os.path.join(self.root, "bin", "bd")
+        with open(bd, "w") as f:
+            f.write(FAKE_BD)
+        os.chmod(bd, 0o755)
+        self._saved = (os.environ["PATH"], server.USE_DAEMON, server.BEADS_VILLAGE_BASE)
+        os.environ["PATH"] = os.path.join(self.root, "bin") + os.pathsep + os.environ["PATH"]
+        os.environ["FAKE_BD_DIR"] = self.root
+        server.USE_DAEMON = False
+        server.BEADS_VILLAGE_BASE = os.path.join(self.root, "base")
+        self.ws = os.path.join(self.root, "ws")
+        entry = {"id": "bd-1", "t": "", "p": 1, "tags": [], "kind": "task", "exp": time.time() - 1}
+        server.registry().register(server.AgentInfo("victim", "default", None, self.ws, False,
+                                                     prefetched=[entry]))
+
+    def tearDown(self):
+        os.environ["PATH"], server.USE_DAEMON, server.BEADS_VILLAGE_BASE = self._saved
+        os.environ.pop("FAKE_BD_DIR", None)
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def _issue(self, content=None):
+        path = os.path.join(self.root, "issues", "bd-1")
+        if content is not None:
+            with open(path, "w") as f:
+                f.write(content)
+        with open(path) as f:
+            return f.read().split()
+
+    def _claim(self):
+        def claim():
+            server.bind_session(server.State(agent="thief", ws=self.ws))
+            return json.loads(asyncio.run(server.tool_claim(server.workspace(), {})))
+        return contextvars.Context().run(claim)
+
+    def test_expired_lease_reassigned(self):
+        """Test the thief becomes bd's assignee of an expired prefetched task."""
+        self._issue("in_progress victim\n")
+        reply = self._claim()
+        self.assertEqual((reply["id"], reply["stolen_from"]), ("bd-1", "victim"))
+        self.assertEqual(self._issue(), ["in_progress", "thief"])
+
+    def test_reclaimed_task_not_stolen(self):
+        """Test a task bd already gave to someone else is left alone."""
+        self._issue("in_progress other\n")
+        reply = self._claim()
+        self.assertNotIn("id", reply)
+        self.assertEqual(self._issue(), ["in_progress", "other"])
+
+
+@unittest.skipIf(sys.platform == "win32", "uses a POSIX shell stand-in for bd")
+class TestReaper(TestStealPrefetched):
+    """Test the reaper reopens only tasks bd still gives to dead agents."""
+
+    def setUp(self):
+        super().setUp()
+        for agent, task in (("dead-1", "bd-1"), ("dead-2", "bd-2")):
+            server.registry().register(server.AgentInfo(agent, "default", None, self.ws, False,
+                                                         current_task=task))
+        for issue, owner in (("bd-1", "live"), ("bd-2", "dead-2")):
+            with open(os.path.join(self.root, "issues", issue), "w") as f:
+                f.write(f"in_progress {owner}\n")
+
+    def _reap(self, max_age=None):
+        def reap():
+            server.bind_session(server.State(agent="reaper", ws=self.ws))
+            return server.reap_stale_agents(server.workspace(), max_age)
+        return contextvars.Context().run(reap)
+
+    def test_reclaimed_task_kept(self):
+        """Test a dead agent's task re-claimed by a live agent stays with it."""
+        time.sleep(0.01)
+        result = self._reap(max_age=0.001)
+        self.assertEqual(result["reopened"], ["bd-2"])
+        with open(os.path.join(self.root, "issues", "bd-1")) as f:
+            self.assertEqual(f.read().split(), ["in_progress", "live"])
+
+    def test_reaped_by_own_heartbeat_interval(self):
+        """Test each agent is given three of its own heartbeat periods."""
+        for agent, interval in (("dead-1", 0.001), ("dead-2", 100)):
+            record = server.registry().get_agent(agent, "default")
+            record.heartbeat_interval = interval
+            server.registry().register(record)
+        saved = server.REAP_AFTER
+        server.REAP_AFTER = 0.001
+        try:
+            time.sleep(0.01)
+            result = self._reap()
+        finally:
+            server.REAP_AFTER = saved
+        self.assertEqual(result["reaped"], ["dead-1"])
+
+    def test_no_reaping_without_heartbeats(self):
+        """Test silence is not taken for death when heartbeats are off."""
+        saved = server.HEARTBEAT_INTERVAL
+        server.HEARTBEAT_INTERVAL = 0
+        try:
+            self.assertEqual(server.reap_threshold(), 0)
+            self.assertEqual(self._reap(), {"reaped": []})
+        finally:
+            server.HEARTBEAT_INTERVAL = saved
+
+
+class TestHeartbeatPrefetched(unittest.TestCase):
+    """Test the heartbeat thread never undoes a claim's fresh batch."""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self._base = server.BEADS_VILLAGE_BASE
+        server.BEADS_VILLAGE_BASE = self.root
+
+    def tearDown(self):
+        server.BEADS_VILLAGE_BASE = self._base
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_batch_claimed_mid_filter_kept(self):
+        """Test a batch assigned while the heartbeat filters is left intact."""
+        fresh = [{"id": "bd-2", "exp": time.time() + 60}]
+
+        def beat():
+            state = server.State(agent="a1", ws=self.root)
+            server.bind_session(state)
+            state.prefetched = [{"id": "bd-1", "exp": 0}]
+            reg = server.registry()
+            reg.register(server.AgentInfo("a1", state.team, None, self.root, False))
+
+            def taken(team, owner, entry):
+                state.prefetched = fresh  # a claim lands on the event loop
+                return True
+
+            reg.prefetch_taken = taken
+            try:
+                server.update_agent_heartbeat()
+            finally:
+                del reg.prefetch_taken
+            return state.prefetched, reg.get_agent("a1", state.team)
+
+        prefetched, record = contextvars.Context().run(beat)
+        self.assertEqual(prefetched, fresh)
+        self.assertEqual(record.prefetched, fresh)
+
+
+class TestClaimLock(unittest.TestCase):
+    """Test the workspace claim lock."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self._ws = server.S.ws
+        server.S.ws = self.temp_dir
+
+    def tearDown(self):
+        server.S.ws = self._ws
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_exclusive_and_stale(self):
+        """Test the lock times out while held and is broken once abandoned."""
+        ctx = server.workspace()
+        self.assertTrue(asyncio.run(server.acquire_claim_lock(ctx)))
+        self.assertFalse(asyncio.run(server.acquire_claim_lock(ctx, timeout=0.05)))
+        old = time.time() - server.CLAIM_LOCK_STALE - 1
+        os.utime(ctx.claim_lock_path, (old, old))
+        self.assertTrue(asyncio.run(server.acquire_claim_lock(ctx, timeout=0.05)))
+        server.release_claim_lock(ctx)
+        self.assertFalse(os.path.exists(ctx.claim_lock_path))
+
+    def test_wait_cancelled(self):
+        """Test a claim waiting for the lock stops when its call is cancelled."""
+        ctx = server.workspace()
+        self.assertTrue(asyncio.run(server.acquire_claim_lock(ctx)))
+
+        async def main():
+            waiter = asyncio.ensure_future(server.acquire_claim_lock(ctx, timeout=10))
+            await asyncio.sleep(0.05)
+            waiter.cancel()
+            began = time.time()
+            with self.assertRaises(asyncio.CancelledError):
+                await waiter
+            return time.time() - began
+
+        self.assertLess(asyncio.run(main()), 1)
+        server.release_claim_lock(ctx)
+
+
+if __name__ == "__main__":
+    unittest.main()
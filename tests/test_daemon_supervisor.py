@@ -0,0 +1,171 @@
+"""Tests for the managed bd daemon supervisor."""
+import contextvars
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from beads_village.agent_registry import AgentRegistry
+from beads_village.daemon_supervisor import DaemonSupervisor, _bd_daemon
+from beads_village.request_scope import DeadlineExceeded, RequestScope, current_scope
+
+
+class _FakeDaemon:
+    """Stand-in for `bd daemon --start/--stop` and the ping."""
+
+    def __init__(self, running=False, fail_starts=0):
+        self.running = running
+        self.fail_starts = fail_starts
+        self.starts = 0
+        self.stops = 0
+
+    def start(self):
+        self.starts += 1
+        if self.fail_starts:
+            self.fail_starts -= 1
+            return False
+        self.running = True
+        return True
+
+    def stop(self):
+        self.stops += 1
+        self.running = False
+        return True
+
+    def supervisor(self, registry, ws, agent_id, interval=0):
+        return DaemonSupervisor(ws, registry, agent_id, interval=interval, max_backoff=4,
+                                start_daemon=self.start, stop_daemon=self.stop,
+                                alive=lambda: self.running)
+
+
+class TestDaemonSupervisor(unittest.TestCase):
+    """Test daemon start, restart and reference-counted shutdown."""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.ws = os.path.join(self.root, "ws")
+        os.makedirs(self.ws)
+        self.registry = AgentRegistry(os.path.join(self.root, "base"))
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_last_session_stops_daemon(self):
+        """Test the daemon starts once and stops when the last reference goes."""
+        daemon = _FakeDaemon()
+        first = daemon.supervisor(self.registry, self.ws, "a1")
+        second = daemon.supervisor(self.registry, self.ws, "a2")
+        self.assertTrue(first.start())
+        self.assertTrue(second.start())
+        self.assertEqual(daemon.starts, 1)
+        self.assertEqual(self.registry.daemon_refs(self.ws), ["a1", "a2"])
+
+        self.assertFalse(first.stop())
+        self.assertTrue(daemon.running)
+        self.assertTrue(second.stop())
+        self.assertFalse(daemon.running)
+        self.assertFalse(second.managed)
+
+    def test_sessions_sharing_a_supervisor(self):
+        """Test each session on a shared supervisor holds and releases its own reference."""
+        daemon = _FakeDaemon()
+        sup = daemon.supervisor(self.registry, self.ws, "a1")
+        self.assertTrue(sup.start("a1"))
+        self.assertTrue(sup.start("a2"))
+        self.assertEqual(self.registry.daemon_refs(self.ws), ["a1", "a2"])
+
+        self.assertFalse(sup.stop(agent_id="a1"))
+        self.assertEqual(self.registry.daemon_refs(self.ws), ["a2"])
+        self.assertTrue(daemon.running)
+        self.assertTrue(sup.stop(agent_id="a2"))
+        self.assertFalse(daemon.running)
+
+    def test_external_daemon_left_running(self):
+        """Test a daemon that was already running is not stopped."""
+        daemon = _FakeDaemon(running=True)
+        sup = daemon.supervisor(self.registry, self.ws, "a1")
+        self.assertTrue(sup.start())
+        self.assertFalse(sup.stop())
+        self.assertEqual((daemon.starts, daemon.stops), (0, 0))
+
+    def test_restart_with_backoff(self):
+        """Test a dead daemon is restarted, waiting longer after each failed start."""
+        daemon = _FakeDaemon(fail_starts=2)
+        sup = daemon.supervisor(self.registry, self.ws, "a1")
+        sup.interval = 1
+        self.assertFalse(sup.start())
+        first_wait = sup.next_attempt - time.time()
+        self.assertFalse(sup.check())  # still backing off
+        self.assertEqual(daemon.starts, 1)
+
+        sup.next_attempt = 0
+        self.assertFalse(sup.check())
+        self.assertGreater(sup.next_attempt - time.time(), first_wait)
+        sup.next_attempt = 0
+        self.assertTrue(sup.check())
+        self.assertEqual((daemon.starts, sup.failures, sup.restarts), (3, 0, 1))
+        sup.interval = 0
+        self.assertTrue(sup.stop())
+
+    def test_monitor_thread_restarts(self):
+        """Test the background check brings a crashed daemon back."""
+        daemon = _FakeDaemon()
+        sup = daemon.supervisor(self.registry, self.ws, "a1", interval=0.05)
+        self.assertTrue(sup.start())
+        daemon.running = False
+        deadline = time.time() + 5
+        while not daemon.running and time.time() < deadline:
+            time.sleep(0.02)
+        self.assertTrue(daemon.running)
+        sup.stop()
+        self.assertFalse(sup.running)
+
+    def test_refs_of_exited_sessions_pruned(self):
+        """Test a reference left by a crashed process does not keep the daemon."""
+        proc = subprocess.Popen([sys.executable, "-c", "pass"])
+        proc.wait()
+        self.registry.add_daemon_ref(self.ws, "ghost", pid=proc.pid)
+        daemon = _FakeDaemon()
+        sup = daemon.supervisor(self.registry, self.ws, "a1")
+        sup.start()
+        self.assertEqual(self.registry.daemon_refs(self.ws), ["a1"])
+        self.assertTrue(sup.stop())
+
+
+@unittest.skipIf(sys.platform == "win32", "uses a POSIX shell stand-in for bd")
+class TestBdDaemon(unittest.TestCase):
+    """Test `bd daemon` runs follow the request that started them."""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.root, "bin"))
+        with open(os.path.join(self.root, "bin", "bd"), "w") as f:
+            f.write("#!/bin/sh\nsleep 30\n")
+        os.chmod(os.path.join(self.root, "bin", "bd"), 0o755)
+        self._path = os.environ["PATH"]
+        os.environ["PATH"] = os.path.join(self.root, "bin") + os.pathsep + self._path
+
+    def tearDown(self):
+        os.environ["PATH"] = self._path
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_killed_at_request_deadline(self):
+        """Test a hanging daemon start ends with the request's deadline."""
+        def start():
+            current_scope.set(RequestScope(1, budget=0.3))
+            return _bd_daemon(self.root, "--start")
+
+        started = time.time()
+        with self.assertRaises(DeadlineExceeded):
+            contextvars.Context().run(start)
+        self.assertLess(time.time() - started, 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
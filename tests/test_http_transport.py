@@ -0,0 +1,182 @@
+"""Tests for the streamable HTTP transport."""
+import asyncio
+import http.client
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+from urllib.parse import quote
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from beads_village import server
+from beads_village.http_transport import HttpTransport
+
+
+def _rpc(method, req_id=None, **params):
+    msg = {"jsonrpc": "2.0", "method": method, "params": params}
+    if req_id is not None:
+        msg["id"] = req_id
+    return msg
+
+
+class TestHttpTransport(unittest.TestCase):
+    """Test sessions, keep-alive and SSE against a localhost server."""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.ws = os.path.join(self.root, "ws")
+        os.makedirs(self.ws)
+        self._saved = (server.USE_DAEMON, server.MANAGE_DAEMON, server.HEARTBEAT_INTERVAL,
+                       server.BEADS_VILLAGE_BASE)
+        server.USE_DAEMON = False
+        server.MANAGE_DAEMON = False
+        server.HEARTBEAT_INTERVAL = 0
+        server.BEADS_VILLAGE_BASE = os.path.join(self.root, "base")
+
+        self.loop = asyncio.new_event_loop()
+        self.transport = HttpTransport("127.0.0.1", 0)
+        self.loop.run_until_complete(self.transport.start())
+        self.thread = threading.Thread(target=self.loop.run_forever)
+        self.thread.start()
+
+    def tearDown(self):
+        asyncio.run_coroutine_threadsafe(self.transport.stop(), self.loop).result(10)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(10)
+        self.loop.close()
+        (server.USE_DAEMON, server.MANAGE_DAEMON, server.HEARTBEAT_INTERVAL,
+         server.BEADS_VILLAGE_BASE) = self._saved
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def _conn(self):
+        return http.client.HTTPConnection("127.0.0.1", self.transport.port, timeout=10)
+
+    def _post(self, conn, message, session=None, path=None, accept="application/json, text/event-stream"):
+        headers = {"Content-Type": "application/json", "Accept": accept}
+        if session:
+            headers["Mcp-Session-Id"] = session
+        conn.request("POST", path or "/mcp", json.dumps(message), headers)
+        resp = conn.getresponse()
+        return resp, resp.read()
+
+    def _open(self, conn, agent):
+        path = f"/mcp?agent={agent}&ws={quote(self.ws)}&team=t1"
+        resp, _ = self._post(conn, _rpc("initialize", 1), path=path)
+        self.assertEqual(resp.status, 200)
+        return resp.getheader("Mcp-Session-Id")
+
+    def _status(self, conn, session):
+        resp, body = self._post(conn, _rpc("tools/call", 2, name="status", arguments={}), session)
+        self.assertEqual(resp.status, 200)
+        return json.loads(json.loads(body)["result"]["content"][0]["text"])
+
+    def test_sessions_keep_their_identity(self):
+        """Test two sessions on one keep-alive connection report their own agent."""
+        conn = self._conn()
+        alice = self._open(conn, "alice")
+        sock = conn.sock
+        bob = self._open(conn, "bob")
+        self.assertNotEqual(alice, bob)
+        self.assertEqual(self._status(conn, alice)["agent"], "alice")
+        status = self._status(conn, bob)
+        self.assertEqual((status["agent"], status["team"], status["ws"]), ("bob", "t1", self.ws))
+        self.assertIs(conn.sock, sock)  # one TCP connection throughout
+        conn.close()
+
+    def test_concurrent_sessions(self):
+        """Test sessions on separate connections are served at the same time."""
+        results = {}
+
+        def run(agent):
+            conn = self._conn()
+            results[agent] = self._status(conn, self._open(conn, agent))["agent"]
+            conn.close()
+
+        threads = [threading.Thread(target=run, args=(f"a{i}",)) for i in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(30)
+        self.assertEqual(results, {f"a{i}": f"a{i}" for i in range(4)})
+
+    def test_session_required(self):
+        """Test requests without or with an ended session are refused."""
+        conn = self._conn()
+        resp, _ = self._post(conn, _rpc("tools/list", 1))
+        self.assertEqual(resp.status, 400)
+        session = self._open(conn, "alice")
+        resp, body = self._post(conn, _rpc("notifications/initialized"), session)
+        self.assertEqual((resp.status, body), (202, b""))
+        conn.request("DELETE", "/mcp", headers={"Mcp-Session-Id": session})
+        self.assertEqual(conn.getresponse().read(), b"")
+        resp, _ = self._post(conn, _rpc("tools/list", 3), session)
+        self.assertEqual(resp.status, 404)
+        conn.close()
+
+    def test_sse_response(self):
+        """Test a client accepting only SSE gets the response as an event."""
+        conn = self._conn()
+        session = self._open(conn, "alice")
+        resp, body = self._post(conn, _rpc("ping", 7), session, accept="text/event-stream")
+        self.assertEqual(resp.getheader("Content-Type"), "text/event-stream")
+        event = body.decode().strip().split("\n")
+        self.assertEqual(event[0], "event: message")
+        self.assertEqual(json.loads(event[1][len("data: "):])["id"], 7)
+        # The connection is still usable after the stream ended
+        self.assertEqual(self._status(conn, session)["agent"], "alice")
+        conn.close()
+
+    def test_get_not_offered(self):
+        """Test GET is refused since the server sends nothing unprompted."""
+        conn = self._conn()
+        session_id = self._open(conn, "alice")
+        conn.request("GET", "/mcp", headers={"Accept": "text/event-stream", "Mcp-Session-Id": session_id})
+        resp = conn.getresponse()
+        resp.read()
+        self.assertEqual((resp.status, resp.getheader("Allow")), (405, "POST, DELETE"))
+        conn.close()
+
+
+class TestHttpAuth(unittest.TestCase):
+    """Test the loopback-only default and bearer tokens."""
+
+    def test_non_loopback_needs_token(self):
+        """Test binding a public address without a token is refused."""
+        with self.assertRaises(ValueError):
+            HttpTransport("0.0.0.0", 0, token="")
+        HttpTransport("0.0.0.0", 0, token="s3cret").executor.shutdown()
+        HttpTransport("::1", 0, token="").executor.shutdown()
+
+    def test_token_required(self):
+        """Test a configured token is checked on every request."""
+        loop = asyncio.new_event_loop()
+        transport = HttpTransport("127.0.0.1", 0, token="s3cret")
+        loop.run_until_complete(transport.start())
+        thread = threading.Thread(target=loop.run_forever)
+        thread.start()
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", transport.port, timeout=10)
+            body = json.dumps(_rpc("ping", 1))
+            for auth, status in ((None, 401), ("Bearer wrong", 401), ("Bearer s3cret", 400)):
+                headers = {"Content-Type": "application/json", "Accept": "application/json"}
+                if auth:
+                    headers["Authorization"] = auth
+                conn.request("POST", "/mcp", body, headers)
+                resp = conn.getresponse()
+                resp.read()
+                self.assertEqual(resp.status, status)  # 400: authorized, but no session yet
+            conn.close()
+        finally:
+            asyncio.run_coroutine_threadsafe(transport.stop(), loop).result(10)
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join(10)
+            loop.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,369 @@
+"""Tests for the file-backed mail store."""
+import asyncio
+import contextvars
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from beads_village import server
+from beads_village.mail_store import BODY_PREVIEW, Mailbox, bucket_name, message_ts
+
+
+class TestMailboxCompaction(unittest.TestCase):
+    """Test retention and archival."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.box = Mailbox(self.temp_dir)
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def _fill(self, count, start, step=1.0):
+        ids = []
+        for i in range(count):
+            ids.append(self.box.write({"f": "a", "t": "all", "s": f"m{i}"}, ts=start + i * step))
+        return ids
+
+    def test_write_and_recent(self):
+        """Test messages come back oldest first."""
+        ids = self._fill(3, time.time())
+        recent = self.box.recent(10)
+        self.assertEqual([i for i, _ in recent], ids)
+        self.assertEqual(recent[-1][1]["s"], "m2")
+
+    def test_compact_by_count(self):
+        """Test only the newest `keep` messages stay live."""
+        now = time.time()
+        ids = self._fill(10, now - 100)
+        result = self.box.compact(max_age=3600, keep=4, now=now)
+        self.assertEqual(result["archived"], 6)
+        self.assertEqual(self.box.count(), 4)
+        self.assertEqual([i for i, _ in self.box.recent(10)], ids[6:])
+
+    def test_compact_by_age(self):
+        """Test messages older than max_age are archived."""
+        now = time.time()
+        self._fill(3, now - 10000)
+        self._fill(2, now - 10)
+        result = self.box.compact(max_age=3600, keep=100, now=now)
+        self.assertEqual(result["archived"], 3)
+        self.assertEqual(self.box.count(), 2)
+
+    def test_unreadable_message_quarantined(self):
+        """Test compaction sets aside a message file it cannot parse instead of deleting it."""
+        now = time.time()
+        ids = self._fill(3, now - 10000)
+        with open(os.path.join(self.temp_dir, f"{ids[1]}.json"), "w") as f:
+            f.write("{truncated")
+        result = self.box.compact(max_age=3600, keep=0, now=now)
+        self.assertEqual((result["archived"], result["quarantined"]), (2, 1))
+        self.assertEqual(self.box.count(), 0)
+        with open(os.path.join(self.temp_dir, ".quarantine", f"{ids[1]}.json")) as f:
+            self.assertEqual(f.read(), "{truncated")
+
+    def test_archive_is_queryable(self):
+        """Test archived messages can still be read, newest first."""
+        now = time.time()
+        ids = self._fill(5, now - 100)
+        self.box.compact(max_age=3600, keep=0, now=now)
+        self.assertEqual(self.box.count(), 0)
+
+        archived = list(self.box.query_archive())
+        self.assertEqual([m["id"] for m in archived], list(reversed(ids)))
+
+        subset = list(self.box.query_archive(match=lambda m: m["s"] == "m1"))
+        self.assertEqual(len(subset), 1)
+
+        after = list(self.box.query_archive(since=message_ts(ids[3])))
+        self.assertEqual(len(after), 2)
+
+    def test_compact_noop_and_lock(self):
+        """Test nothing happens when under policy or when another compaction runs."""
+        self._fill(2, time.time())
+        self.assertEqual(self.box.compact(keep=10)["archived"], 0)
+
+        open(os.path.join(self.temp_dir, ".compact.lock"), "w").close()
+        self.assertTrue(self.box.compact(keep=0).get("busy"))
+
+    def test_maybe_compact_throttled(self):
+        """Test automatic policy runs at most once per interval."""
+        self._fill(3, time.time() - 100)
+        first = self.box.maybe_compact(interval=3600, keep=1)
+        self.assertEqual(first["archived"], 2)
+        self.assertIsNone(self.box.maybe_compact(interval=3600, keep=0))
+
+
+class TestThreadIndex(unittest.TestCase):
+    """Test thread-scoped lookups."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.box = Mailbox(self.temp_dir)
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_thread_lookup(self):
+        """Test only messages of the requested thread are returned, in order."""
+        now = time.time()
+        a1 = self.box.write({"s": "claimed:bd-1", "thread": "bd-1"}, ts=now)
+        self.box.write({"s": "claimed:bd-2", "thread": "bd-2"}, ts=now + 1)
+        a2 = self.box.write({"s": "done:bd-1", "thread": "bd-1"}, ts=now + 2)
+        self.box.write({"s": "chatter"}, ts=now + 3)
+
+        thread = self.box.thread("bd-1")
+        self.assertEqual([i for i, _ in thread], [a1, a2])
+        self.assertEqual(self.box.thread("bd-1", limit=1)[0][0], a2)
+        self.assertEqual(self.box.thread("missing"), [])
+
+    def test_thread_survives_compaction(self):
+        """Test archived thread members resolve through the archive."""
+        now = time.time()
+        old = self.box.write({"s": "claimed:bd-1", "thread": "bd-1"}, ts=now - 100)
+        new = self.box.write({"s": "done:bd-1", "thread": "bd-1"}, ts=now)
+        self.box.compact(max_age=3600, keep=1, now=now)
+
+        thread = self.box.thread("bd-1")
+        self.assertEqual([i for i, _ in thread], [old, new])
+        self.assertEqual(thread[0][1]["s"], "claimed:bd-1")
+
+    def test_legacy_mailbox_backfill(self):
+        """Test mailboxes written without an index are indexed on first use."""
+        import json
+        legacy_id = "1700000000.000000_abcdef"
+        with open(os.path.join(self.temp_dir, f"{legacy_id}.json"), "w") as f:
+            json.dump({"s": "done:bd-9", "thread": "bd-9"}, f)
+
+        self.assertEqual([i for i, _ in self.box.thread("bd-9")], [legacy_id])
+
+
+class TestReadCursor(unittest.TestCase):
+    """Test which reads advance an agent's unread cursor."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self._saved = (server.USE_DAEMON, server.MANAGE_DAEMON)
+        server.USE_DAEMON = server.MANAGE_DAEMON = False
+
+    def tearDown(self):
+        import shutil
+        server.USE_DAEMON, server.MANAGE_DAEMON = self._saved
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def _as(self, agent, fn, *args, **kwargs):
+        def call():
+            server.bind_session(server.State(agent=agent, ws=self.temp_dir))
+            return fn(server.workspace(), *args, **kwargs)
+        return contextvars.Context().run(call)
+
+    def _unread(self):
+        msgs = self._as("bob", lambda ctx: asyncio.run(
+            server.recv_msgs(ctx, unread_only=True, include_global=False)))
+        return [m.subject for m, _, _ in msgs]
+
+    def test_thread_read_keeps_inbox_unread(self):
+        """Test reading one thread leaves other unread mail unread."""
+        self._as("alice", server.post_msg, "claimed:bd-1", to="bob", thread_id="bd-1")
+        self._as("alice", server.post_msg, "question", to="bob", thread_id="bd-2")
+        thread = self._as("bob", lambda ctx: asyncio.run(
+            server.recv_msgs(ctx, include_global=False, thread="bd-1")))
+        self.assertEqual([m.subject for m, _, _ in thread], ["claimed:bd-1"])
+        self.assertEqual(self._unread(), ["claimed:bd-1", "question"])
+        self.assertEqual(self._unread(), [])
+
+
+class TestRecipientIndex(unittest.TestCase):
+    """Test per-recipient fan-out."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.box = Mailbox(self.temp_dir)
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_multi_recipient_single_record(self):
+        """Test one stored message reaches every listed recipient."""
+        now = time.time()
+        msg_id = self.box.write({"s": "sync up", "t": ["fe-1", "be-1"]}, ts=now)
+        self.box.write({"s": "private", "t": "qa-1"}, ts=now + 1)
+        broadcast = self.box.write({"s": "hello", "t": "all"}, ts=now + 2)
+
+        self.assertEqual(self.box.count(), 3)
+        self.assertEqual([i for i, _ in self.box.inbox("fe-1")], [msg_id, broadcast])
+        self.assertEqual([i for i, _ in self.box.inbox("be-1")], [msg_id, broadcast])
+        self.assertEqual(len(self.box.inbox("qa-1")), 2)
+        self.assertEqual([i for i, _ in self.box.inbox("nobody")], [broadcast])
+
+    def test_inbox_limit_reads_tail(self):
+        """Test inbox returns only the newest messages."""
+        now = time.time()
+        ids = [self.box.write({"t": "all"}, ts=now + i) for i in range(30)]
+        self.assertEqual([i for i, _ in self.box.inbox("a", limit=5)], ids[-5:])
+
+
+class TestLazyBodies(unittest.TestCase):
+    """Test header/body split."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.box = Mailbox(self.temp_dir)
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_inbox_returns_headers_only(self):
+        """Test long bodies come back as previews and are read on demand."""
+        body = "x" * 1000
+        msg_id = self.box.write({"t": "all", "s": "big", "b": body})
+
+        (_, header), = self.box.inbox("a")
+        self.assertEqual(header["b"], body[:BODY_PREVIEW])
+        self.assertEqual(header["bl"], 1000)
+        self.assertEqual(self.box.read(msg_id)["b"], body)
+
+    def test_short_body_inline(self):
+        """Test short bodies need no blob."""
+        msg_id = self.box.write({"t": "all", "b": "hi"})
+        self.assertFalse(os.path.isdir(os.path.join(self.temp_dir, ".blobs")))
+        self.assertEqual(self.box.read(msg_id)["b"], "hi")
+
+    def test_full_body_survives_compaction(self):
+        """Test archived messages keep their full body."""
+        body = "y" * 500
+        msg_id = self.box.write({"t": "all", "b": body, "thread": "bd-1"})
+        self.box.compact(max_age=0, keep=0)
+
+        self.assertEqual(self.box.read(msg_id)["b"], body)
+        self.assertEqual(self.box.thread("bd-1")[0][1]["bl"], 500)
+        self.assertEqual(os.listdir(os.path.join(self.temp_dir, ".blobs")), [])
+
+
+class TestShardedMailbox(unittest.TestCase):
+    """Test per-day bucketing of the team hub."""
+
+    DAY = 86400
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.box = Mailbox(self.temp_dir, sharded=True)
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_messages_land_in_day_buckets(self):
+        """Test each day gets its own bucket listed in the manifest."""
+        now = time.time()
+        old = self.box.write({"t": "all"}, ts=now - 3 * self.DAY)
+        new = self.box.write({"t": "all"}, ts=now)
+
+        self.assertEqual(self.box.buckets(), sorted({bucket_name(now - 3 * self.DAY), bucket_name(now)}))
+        self.assertTrue(os.path.exists(os.path.join(self.temp_dir, bucket_name(now), f"{new}.json")))
+        self.assertEqual([i for i, _ in self.box.inbox("a")], [old, new])
+        self.assertEqual(self.box.count(), 2)
+
+    def test_inbox_since_skips_old_buckets(self):
+        """Test a cursor keeps older buckets from being read at all."""
+        now = time.time()
+        self.box.write({"t": "all"}, ts=now - 3 * self.DAY)
+        new = self.box.write({"t": "all"}, ts=now)
+
+        # Make the old bucket unreadable: results must not depend on it
+        import shutil
+        shutil.rmtree(os.path.join(self.temp_dir, bucket_name(now - 3 * self.DAY), ".index"))
+        self.assertEqual([i for i, _ in self.box.inbox("a", since=now - 1)], [new])
+
+    def test_flat_hub_migrates(self):
+        """Test messages from an unsharded hub move into buckets."""
+        flat = Mailbox(self.temp_dir)
+        legacy = flat.write({"t": "all", "s": "old"})
+
+        self.assertEqual([i for i, _ in self.box.inbox("a")], [legacy])
+        self.assertFalse(os.path.exists(os.path.join(self.temp_dir, f"{legacy}.json")))
+
+    def test_compaction_drops_empty_buckets(self):
+        """Test fully archived days disappear from disk and manifest."""
+        now = time.time()
+        old = self.box.write({"t": "all", "thread": "bd-1"}, ts=now - 10 * self.DAY)
+        self.box.write({"t": "all"}, ts=now)
+
+        self.box.compact(max_age=7 * self.DAY, keep=100, now=now)
+        self.assertEqual(self.box.buckets(), [bucket_name(now)])
+        self.assertFalse(os.path.isdir(os.path.join(self.temp_dir, bucket_name(now - 10 * self.DAY))))
+        self.assertEqual([i for i, _ in self.box.thread("bd-1")], [old])
+
+    def test_drop_keeps_bucket_registered_meanwhile(self):
+        """Test dropping empty buckets never unlists one a writer just added."""
+        now = time.time()
+        self.box._ensure_bucket(bucket_name(now - 10 * self.DAY))
+
+        # A writer registers a new bucket between the drop's scan and its write
+        real = self.box.buckets
+        added = []
+
+        def buckets():
+            result = real()
+            if not added:
+                added.append(None)
+                added[0] = self.box.write({"t": "all"}, ts=now - 2 * self.DAY)
+            return result
+
+        self.box.buckets = buckets
+        self.box._drop_empty_buckets()
+        del self.box.buckets
+
+        self.assertEqual(self.box.buckets(), [bucket_name(now - 2 * self.DAY)])
+        self.assertEqual([i for i, _ in self.box.inbox("a")], added)
+
+    def test_recreated_bucket_is_relisted(self):
+        """Test a write into an unlisted bucket directory registers it again."""
+        now = time.time()
+        self.box.write({"t": "all"}, ts=now)
+        self.box._update_manifest(drop=[bucket_name(now)])
+
+        new = self.box.write({"t": "all"}, ts=now)
+        self.assertEqual(self.box.buckets(), [bucket_name(now)])
+        self.assertEqual(len(self.box.inbox("a")), 2)
+        self.assertIn(new, [i for i, _ in self.box.inbox("a")])
+
+    def test_trim_keeps_concurrent_appends(self):
+        """Test an index trim never loses a line appended while it runs."""
+        import threading
+        from beads_village.mail_store import INDEX_TRIM_SIZE
+        first = self.box.write({"t": "bob"})
+        path = self.box._index_path("to", "bob", self.box.buckets()[0])
+        with open(path, "a", encoding="utf-8") as f:
+            f.write("0-stale\n" * (INDEX_TRIM_SIZE // 8 + 1))
+
+        done = threading.Event()
+
+        def trim():
+            while not done.is_set():
+                self.box._trim_recipient_indexes("0-stale")
+                with open(path, "a", encoding="utf-8") as f:
+                    f.write("0-stale\n" * (INDEX_TRIM_SIZE // 8 + 1))
+
+        t = threading.Thread(target=trim)
+        t.start()
+        try:
+            ids = [first] + [self.box.write({"t": "bob"}) for _ in range(50)]
+        finally:
+            done.set()
+            t.join()
+        self.box._trim_recipient_indexes("0-stale")
+        self.assertEqual([i for i, _ in self.box.inbox("bob", limit=100)], ids)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+"""Tests for the shared record types."""
+import os
+import sys
+import time
+import unittest
+from datetime import datetime
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from beads_village.records import AgentInfo, Message, Reservation, iso, to_epoch
+
+
+class TestRecords(unittest.TestCase):
+    """Test slotted records and their serializers."""
+
+    def test_slotted(self):
+        """Test records carry no per-instance dict."""
+        for record in (AgentInfo("a", "t", None, "/ws", False), Reservation("p", "a"), Message("a")):
+            self.assertFalse(hasattr(record, "__dict__"))
+
+    def test_agent_round_trip(self):
+        """Test to_dict/from_dict are inverse."""
+        agent = AgentInfo("fe-1", "t1", "fe", "/ws", True, current_task="bd-1",
+                          last_seen=time.time(), capabilities=["general", "fe"],
+                          heartbeat_interval=30.0)
+        self.assertEqual(AgentInfo.from_dict(agent.to_dict()), agent)
+        self.assertEqual(agent.status, "working")
+
+    def test_reservation_reads_iso(self):
+        """Test reservations written with ISO timestamps load as epoch floats."""
+        now = datetime.now()
+        res = Reservation.from_dict({"path": "a.py", "agent": "fe-1",
+                                     "created": now.isoformat(), "expires": now.isoformat()})
+        self.assertAlmostEqual(res.expires, now.timestamp(), places=3)
+        self.assertEqual(res.ttl, 0.0)
+        stored = Reservation("a.py", "fe-1", created=100.0, expires=700.0).to_dict()
+        self.assertEqual(Reservation.from_dict(stored).ttl, 600.0)
+
+    def test_message_formats(self):
+        """Test short-key, legacy long-key and preview handling."""
+        msg = Message("fe-1", to=["be-1", "qa-1"], subject="hi", body="x" * 10, ts=123.5, body_len=500)
+        back = Message.from_dict(msg.to_dict(), "id-1")
+        self.assertEqual((back.id, back.recipients, back.ts), ("id-1", ["be-1", "qa-1"], 123.5))
+        self.assertTrue(back.truncated)
+
+        legacy = Message.from_dict({"from": "old", "subject": "s", "body": "b",
+                                    "ts": "2024-01-01T00:00:00", "importance": "high"})
+        self.assertEqual((legacy.sender, legacy.importance, legacy.recipients), ("old", "high", ["all"]))
+        self.assertEqual(iso(legacy.ts), "2024-01-01T00:00:00")
+
+    def test_to_epoch(self):
+        """Test epoch conversion tolerates bad input."""
+        self.assertEqual(to_epoch(5), 5.0)
+        self.assertEqual(to_epoch(None), 0.0)
+        self.assertEqual(to_epoch("garbage"), 0.0)
+        self.assertEqual(iso(0), "")
+
+
+if __name__ == "__main__":
+    unittest.main()
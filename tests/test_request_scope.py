@@ -0,0 +1,198 @@
+"""Tests for request deadlines and cancellation."""
+import asyncio
+import contextvars
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from beads_village import server
+from beads_village.request_scope import DeadlineExceeded, RequestScope, current_scope, run
+
+# Stand-in for bd that hangs, recording the pid of a child it spawned
+FAKE_BD = """#!/bin/sh
+sleep 30 &
+echo $! > "$FAKE_BD_DIR/child.pid"
+wait
+"""
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except OSError:
+        return False
+    # A killed child stays a zombie until its reaper notices
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().split()[2] != "Z"
+    except OSError:
+        return True
+
+
+def _in_scope(scope, fn, *args):
+    def call():
+        current_scope.set(scope)
+        return fn(*args)
+    return contextvars.Context().run(call)
+
+
+@unittest.skipIf(sys.platform == "win32", "uses a POSIX shell stand-in for bd")
+class TestRun(unittest.TestCase):
+    """Test child processes follow their request's deadline and cancellation."""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_outside_scope(self):
+        """Test run without a request behaves like subprocess.run."""
+        self.assertEqual(run(["echo", "hi"]).stdout, b"hi\n")
+
+    def test_deadline_cuts_timeout(self):
+        """Test a child outliving the request's deadline is killed."""
+        scope = RequestScope(1, budget=0.3)
+        started = time.time()
+        with self.assertRaises(DeadlineExceeded):
+            _in_scope(scope, run, ["sleep", "30"], 60)
+        self.assertLess(time.time() - started, 5)
+        self.assertLessEqual(scope.remaining(10), 0)
+
+    def test_cancel_kills_process_group(self):
+        """Test cancelling from another thread kills the child and what it spawned."""
+        script = os.path.join(self.root, "bd")
+        with open(script, "w") as f:
+            f.write(FAKE_BD)
+        os.chmod(script, 0o755)
+        os.environ["FAKE_BD_DIR"] = self.root
+        self.addCleanup(os.environ.pop, "FAKE_BD_DIR", None)
+        pid_file = os.path.join(self.root, "child.pid")
+        scope = RequestScope(1)
+
+        def cancel_when_started():
+            deadline = time.time() + 5
+            while not os.path.exists(pid_file) and time.time() < deadline:
+                time.sleep(0.02)
+            time.sleep(0.05)
+            scope.cancel()
+
+        threading.Thread(target=cancel_when_started).start()
+        with self.assertRaises(asyncio.CancelledError):
+            _in_scope(scope, run, [script])
+        with open(pid_file) as f:
+            grandchild = int(f.read())
+        deadline = time.time() + 5
+        while _alive(grandchild) and time.time() < deadline:
+            time.sleep(0.02)
+        self.assertFalse(_alive(grandchild))
+
+
+@unittest.skipIf(sys.platform == "win32", "uses a POSIX shell stand-in for bd")
+class TestToolCalls(unittest.TestCase):
+    """Test cancellation notifications and deadlines of tool calls."""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.root, "bin"))
+        with open(os.path.join(self.root, "bin", "bd"), "w") as f:
+            f.write(FAKE_BD)
+        os.chmod(os.path.join(self.root, "bin", "bd"), 0o755)
+        self._env = (os.environ.get("PATH"), os.environ.get("FAKE_BD_DIR"))
+        os.environ["PATH"] = os.path.join(self.root, "bin") + os.pathsep + os.environ["PATH"]
+        os.environ["FAKE_BD_DIR"] = self.root
+        self._use_daemon = server.USE_DAEMON
+        server.USE_DAEMON = False
+        self.state = server.State(agent="a1", ws=self.root)
+
+    def tearDown(self):
+        os.environ["PATH"] = self._env[0]
+        if self._env[1] is None:
+            os.environ.pop("FAKE_BD_DIR", None)
+        server.USE_DAEMON = self._use_daemon
+        server.TOOL_DEADLINES.pop("show", None)
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def _serve(self, messages, pause=0.3):
+        """Feed messages to serve_stream, pausing after the first; returns the replies"""
+        replies = []
+
+        def lines():
+            for i, message in enumerate(messages):
+                yield (json.dumps(message) + "\n").encode()
+                if i == 0:
+                    time.sleep(pause)
+
+        def serve():
+            server.bind_session(self.state)
+            server.serve_stream(lines(), replies.append)
+
+        contextvars.Context().run(serve)
+        return replies
+
+    def test_cancelled_call_stops(self):
+        """Test notifications/cancelled stops a running call, which gets no reply."""
+        started = time.time()
+        replies = self._serve([
+            {"jsonrpc": "2.0", "id": 1, "method": "tools/call",
+             "params": {"name": "show", "arguments": {"id": "bd-1"}}},
+            {"jsonrpc": "2.0", "method": "notifications/cancelled", "params": {"requestId": 1}},
+            {"jsonrpc": "2.0", "id": 2, "method": "ping"},
+        ])
+        self.assertLess(time.time() - started, 10)
+        self.assertEqual([r["id"] for r in replies], [2])
+        self.assertEqual(self.state.requests, {})
+
+    def test_queued_call_dropped(self):
+        """Test a call cancelled before it started is skipped."""
+        show = {"name": "show", "arguments": {"id": "bd-1"}}
+        started = time.time()
+        replies = self._serve([
+            {"jsonrpc": "2.0", "id": 1, "method": "tools/call", "params": show},
+            {"jsonrpc": "2.0", "id": 2, "method": "tools/call", "params": show},
+            {"jsonrpc": "2.0", "method": "notifications/cancelled", "params": {"requestId": 2}},
+            {"jsonrpc": "2.0", "method": "notifications/cancelled", "params": {"requestId": 1}},
+            {"jsonrpc": "2.0", "id": 3, "method": "ping"},
+        ])
+        self.assertLess(time.time() - started, 10)
+        self.assertEqual([r["id"] for r in replies], [3])
+
+    def test_deadline(self):
+        """Test a tool over its budget returns an error naming the deadline."""
+        server.TOOL_DEADLINES["show"] = 0.3
+        started = time.time()
+        replies = self._serve([
+            {"jsonrpc": "2.0", "id": 1, "method": "tools/call",
+             "params": {"name": "show", "arguments": {"id": "bd-1"}}},
+        ], pause=0)
+        self.assertLess(time.time() - started, 10)
+        result = replies[0]["result"]
+        self.assertTrue(result["isError"])
+        self.assertIn("deadline", json.loads(result["content"][0]["text"])["error"])
+
+
+class TestDeadlineConfig(unittest.TestCase):
+    """Test per-tool budgets from the environment."""
+
+    def test_bad_entry_skipped(self):
+        """Test a malformed BEADS_TOOL_DEADLINES entry is reported and the rest applied."""
+        env = dict(os.environ, BEADS_TOOL_DEADLINES="sync=soon,claim=5")
+        code = "from beads_village import server; print(server.TOOL_DEADLINES['claim'], server.TOOL_DEADLINES['sync'])"
+        result = subprocess.run([sys.executable, "-c", code], capture_output=True, env=env,
+                                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.split(), [b"5.0", b"180.0"])
+        self.assertIn(b"'sync=soon'", result.stderr)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+"""Tests for load-aware claim routing."""
+import os
+import random
+import shutil
+import sys
+import tempfile
+import unittest
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from beads_village.agent_registry import AgentRegistry
+from beads_village.records import AgentInfo
+from beads_village import scheduler
+
+
+def _agent(agent_id, throughput=None, current_task=None, task_started=0.0, role=None):
+    return AgentInfo(agent_id, "t1", role, "/ws", False, current_task=current_task,
+                     task_started=task_started, throughput=throughput or {})
+
+
+class TestThroughput(unittest.TestCase):
+    """Test throughput bookkeeping."""
+
+    def test_updated_throughput(self):
+        """Test the first sample sets the mean and later ones are smoothed."""
+        stats = scheduler.updated_throughput({}, "fe", 100.0)
+        self.assertEqual(stats, {"fe": [1, 100.0], "*": [1, 100.0]})
+        stats = scheduler.updated_throughput(stats, "be", 200.0)
+        self.assertEqual(stats["be"], [1, 200.0])
+        self.assertEqual(stats["*"], [2, 130.0])
+
+    def test_record_completion_in_registry(self):
+        """Test completions persist on the agent record and clear its task."""
+        temp_dir = tempfile.mkdtemp()
+        try:
+            reg = AgentRegistry(temp_dir)
+            reg.register(_agent("a1"))
+            reg.update_task("a1", "bd-1", "t1")
+            self.assertGreater(reg.get_agent("a1").task_started, 0)
+
+            self.assertTrue(scheduler.record_completion(reg, "a1", "t1", "fe", 42.0))
+            agent = reg.get_agent("a1")
+            self.assertIsNone(agent.current_task)
+            self.assertEqual(agent.throughput["fe"], [1, 42.0])
+            self.assertFalse(scheduler.record_completion(reg, "ghost", "t1", "fe", 1.0))
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+class TestPick(unittest.TestCase):
+    """Test the fastest strategy."""
+
+    ISSUES = [{"id": "bd-1", "priority": 0}, {"id": "bd-2", "priority": 1}]
+
+    def test_fast_agent_gets_top_priority(self):
+        """Test a slower agent leaves the top issue to a faster idle peer."""
+        fast = _agent("fast", {"*": [5, 10.0]})
+        slow = _agent("slow", {"*": [5, 15.0]})
+        self.assertEqual(scheduler.pick(self.ISSUES, fast, [fast, slow], now=0)["id"], "bd-1")
+        self.assertEqual(scheduler.pick(self.ISSUES, slow, [fast, slow], now=0)["id"], "bd-2")
+
+    def test_defers_to_busy_faster_agent(self):
+        """Test a slow agent defers when a busy peer would still finish first."""
+        fast = _agent("fast", {"*": [5, 10.0]}, current_task="bd-0", task_started=95.0)
+        slow = _agent("slow", {"*": [5, 100.0]})
+        self.assertIsNone(scheduler.pick(self.ISSUES[:1], slow, [fast, slow], now=100.0))
+        self.assertEqual(scheduler.choose("first", self.ISSUES[:1], slow, [fast, slow])["id"], "bd-1")
+
+    def test_ties_and_role_filter(self):
+        """Test newcomers win ties and peers only plan work their role allows."""
+        me, peer = _agent("me"), _agent("peer", role="be")
+        self.assertEqual(scheduler.pick(self.ISSUES, me, [peer, me], now=0)["id"], "bd-1")
+        tagged = [{"id": "bd-3", "priority": 0, "tags": ["fe"]}]
+        fast_be = _agent("be", {"*": [5, 1.0]}, role="be")
+        self.assertEqual(scheduler.pick(tagged, _agent("fe", {"*": [5, 50.0]}), [fast_be])["id"], "bd-3")
+
+
+class TestSimulation(unittest.TestCase):
+    """Test that routing by throughput drains a backlog sooner."""
+
+    def _drain(self, speeds, make_tasks, runs=30):
+        totals = {}
+        for strategy in scheduler.STRATEGIES:
+            totals[strategy] = 0.0
+            for seed in range(runs):
+                result = scheduler.simulate(speeds, make_tasks(random.Random(seed)), strategy)
+                self.assertEqual(result["done"], len(make_tasks(random.Random(seed))))
+                totals[strategy] += result["drain"]
+        return totals
+
+    def test_heterogeneous_speeds(self):
+        """Test fast/slow agents drain random backlogs sooner on average."""
+        totals = self._drain({"fast": 1.0, "mid": 2.0, "slow": 6.0},
+                             lambda r: [(r.randint(0, 4), r.uniform(5, 15)) for _ in range(30)])
+        self.assertLess(totals["fastest"], totals["first"] * 0.97)
+
+    def test_specialized_agents(self):
+        """Test per-kind throughput routes work to the agent that is fast at it."""
+        totals = self._drain({"a": {"fe": 1.0, "be": 4.0}, "b": {"fe": 4.0, "be": 1.0}},
+                             lambda r: [(r.randint(0, 4), r.uniform(5, 15), r.choice(["fe", "be"]))
+                                        for _ in range(30)])
+        self.assertLess(totals["fastest"], totals["first"] * 0.8)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+"""Tests for the shared multi-session server."""
+import json
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import unittest
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from beads_village import server
+from beads_village.shared_server import SharedServer
+
+
+class _Session:
+    """One shim-like connection speaking line-delimited JSON-RPC."""
+
+    def __init__(self, path, agent, ws):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(10)
+        self.sock.connect(path)
+        self.file = self.sock.makefile("rb")
+        self.send({"session": {"agent": agent, "ws": ws, "team": "t1"}})
+        self.next_id = 0
+
+    def send(self, obj):
+        self.sock.sendall((json.dumps(obj) + "\n").encode())
+
+    def call(self, tool, **arguments):
+        self.next_id += 1
+        self.send({"jsonrpc": "2.0", "id": self.next_id, "method": "tools/call",
+                   "params": {"name": tool, "arguments": arguments}})
+        resp = json.loads(self.file.readline())
+        return json.loads(resp["result"]["content"][0]["text"])
+
+    def close(self):
+        self.file.close()
+        self.sock.close()
+
+
+@unittest.skipUnless(hasattr(socket, "AF_UNIX"), "needs Unix sockets")
+class TestSharedServer(unittest.TestCase):
+    """Test sessions on one server keep their own identity."""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.ws = os.path.join(self.root, "ws")
+        os.makedirs(self.ws)
+        self._saved = (server.USE_DAEMON, server.MANAGE_DAEMON, server.HEARTBEAT_INTERVAL,
+                       server.BEADS_VILLAGE_BASE)
+        server.USE_DAEMON = False
+        server.MANAGE_DAEMON = False
+        server.HEARTBEAT_INTERVAL = 0
+        server.BEADS_VILLAGE_BASE = os.path.join(self.root, "base")
+        self.shared = SharedServer(os.path.join(self.root, "server.sock"), idle_timeout=0.2)
+        self.thread = threading.Thread(target=self.shared.serve, kwargs={"poll_interval": 0.05})
+        self.thread.start()
+
+    def tearDown(self):
+        self.thread.join(10)
+        (server.USE_DAEMON, server.MANAGE_DAEMON, server.HEARTBEAT_INTERVAL,
+         server.BEADS_VILLAGE_BASE) = self._saved
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_sessions_keep_their_identity(self):
+        """Test two connections report their own agent and team, then the server idles out."""
+        first = _Session(self.shared.path, "alice", self.ws)
+        second = _Session(self.shared.path, "bob", self.ws)
+        try:
+            self.assertEqual(first.call("status")["agent"], "alice")
+            status = second.call("status")
+            self.assertEqual((status["agent"], status["team"], status["ws"]), ("bob", "t1", self.ws))
+            self.assertEqual(first.call("status")["agent"], "alice")
+            self.assertEqual(self.shared.sessions, 2)
+        finally:
+            first.close()
+            second.close()
+        self.thread.join(10)
+        self.assertFalse(self.thread.is_alive())
+        self.assertFalse(os.path.exists(self.shared.path))
+
+    def test_stale_socket_replaced(self):
+        """Test a socket file nobody listens on does not block a new server."""
+        stale = os.path.join(self.root, "stale.sock")
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(stale)
+        sock.close()
+        other = SharedServer(stale)
+        other.server_close()
+        with self.assertRaises(OSError):
+            SharedServer(self.shared.path)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,209 @@
+"""Tests for the background sync scheduler."""
+import asyncio
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from beads_village.sync_scheduler import SyncScheduler, read_ref, sync_token
+
+
+class _SlowSync:
+    """Stand-in for `bd sync` that records overlapping runs."""
+
+    def __init__(self, duration=0.0):
+        self.duration = duration
+        self.calls = 0
+        self.active = 0
+        self.max_active = 0
+        self.started = threading.Event()
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            self.calls += 1
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        self.started.set()
+        time.sleep(self.duration)
+        with self._lock:
+            self.active -= 1
+        return {"ok": 1, "call": self.calls}
+
+
+class TestSyncScheduler(unittest.TestCase):
+    """Test coalescing, debouncing and barriers."""
+
+    def test_burst_coalesces_into_one_sync(self):
+        """Test requests within the debounce window share one run."""
+        run = _SlowSync()
+        sched = SyncScheduler(run, debounce=0.1)
+        for _ in range(20):
+            sched.request()
+        self.assertEqual(run.calls, 0)  # nothing on the caller's path
+        self.assertTrue(sched.flush(timeout=5))
+        self.assertEqual(run.calls, 1)
+
+    def test_one_in_flight_plus_one_pending(self):
+        """Test requests during a running sync collapse into one follow-up."""
+        run = _SlowSync(duration=0.2)
+        sched = SyncScheduler(run, debounce=0.01)
+        sched.request()
+        self.assertTrue(run.started.wait(5))
+        for _ in range(10):
+            sched.request()
+        self.assertTrue(sched.in_flight and sched.pending)
+        self.assertTrue(sched.flush(timeout=5))
+        self.assertEqual(run.calls, 2)
+        self.assertEqual(run.max_active, 1)
+
+    def test_wait_is_a_barrier(self):
+        """Test wait() needs a sync that started after it, and skips the debounce."""
+        run = _SlowSync(duration=0.1)
+        sched = SyncScheduler(run, debounce=10)
+        sched.request()
+        began = time.time()
+        self.assertTrue(sched.wait(timeout=5))
+        self.assertLess(time.time() - began, 5)
+        self.assertEqual(run.calls, 1)
+
+        # A barrier issued while a sync runs waits for the next one
+        run.started.clear()
+        sched.debounce = 0.01
+        sched.request()
+        self.assertTrue(run.started.wait(5))
+        self.assertTrue(sched.wait(timeout=5))
+        self.assertEqual(run.calls, 3)
+        self.assertEqual(sched.last_result, {"ok": 1, "call": 3})
+
+    def test_inline_and_errors(self):
+        """Test a zero debounce runs inline and failures are reported."""
+        sched = SyncScheduler(lambda: {"error": "no remote"}, debounce=0)
+        sched.request()
+        self.assertEqual((sched.runs, sched.last_error), (1, "no remote"))
+
+        def boom():
+            raise RuntimeError("git exploded")
+        sched = SyncScheduler(boom, debounce=0.01)
+        self.assertTrue(sched.wait(timeout=5))
+        self.assertEqual(sched.last_error, "git exploded")
+        self.assertFalse(sched.pending)
+
+    def test_wait_async_leaves_loop_running(self):
+        """Test awaiting a barrier lets other coroutines run meanwhile."""
+        sched = SyncScheduler(_SlowSync(duration=0.2), debounce=10)
+        ticks = []
+
+        async def tick():
+            while True:
+                ticks.append(time.time())
+                await asyncio.sleep(0.02)
+
+        async def main():
+            ticker = asyncio.ensure_future(tick())
+            ok = await sched.wait_async(timeout=5)
+            ticker.cancel()
+            return ok
+
+        self.assertTrue(asyncio.run(main()))
+        self.assertGreater(len(ticks), 3)
+
+    def test_wait_async_cancelled(self):
+        """Test cancelling a barrier wait returns at once and leaves no waiter behind."""
+        run = _SlowSync(duration=0.5)
+        sched = SyncScheduler(run, debounce=10)
+
+        async def main():
+            waiter = asyncio.ensure_future(sched.wait_async(timeout=5))
+            await asyncio.sleep(0.05)
+            waiter.cancel()
+            began = time.time()
+            with self.assertRaises(asyncio.CancelledError):
+                await waiter
+            return time.time() - began
+
+        self.assertLess(asyncio.run(main()), 0.2)
+        self.assertEqual((sched._waiters, sched._futures), (0, []))
+        self.assertTrue(sched.flush(timeout=5))
+
+
+@unittest.skipIf(shutil.which("git") is None, "git not installed")
+class TestFreshness(unittest.TestCase):
+    """Test skipping syncs while nothing moved."""
+
+    def setUp(self):
+        self.ws = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.ws, ".beads"))
+        self._git("init", "-q", "-b", "main")
+        self._commit('{"id":"bd-1"}\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.ws, ignore_errors=True)
+
+    def _git(self, *args):
+        return subprocess.run(["git", "-c", "user.name=t", "-c", "user.email=t@t", *args],
+                              cwd=self.ws, capture_output=True, check=True).stdout.decode().strip()
+
+    def _commit(self, content):
+        with open(os.path.join(self.ws, ".beads", "issues.jsonl"), "w") as f:
+            f.write(content)
+        self._git("add", "-A")
+        self._git("commit", "-q", "-m", "issues")
+        return self._git("rev-parse", "HEAD")
+
+    def _set_upstream(self, sha):
+        ref = os.path.join(self.ws, ".git", "refs", "remotes", "origin", "main")
+        os.makedirs(os.path.dirname(ref), exist_ok=True)
+        with open(ref, "w") as f:
+            f.write(sha + "\n")
+
+    def test_token_tracks_upstream_and_issues(self):
+        """Test the token moves with the upstream ref and issues.jsonl, not other commits."""
+        head = self._git("rev-parse", "HEAD")
+        self._set_upstream(head)
+        token = sync_token(self.ws)
+        self.assertEqual(token, (head, self._git("rev-parse", "HEAD:.beads/issues.jsonl")))
+
+        with open(os.path.join(self.ws, "README"), "w") as f:
+            f.write("unrelated")
+        self._git("add", "README")
+        self._git("commit", "-q", "-m", "docs")
+        self.assertEqual(sync_token(self.ws), token)
+
+        self._commit('{"id":"bd-2"}\n')
+        self.assertNotEqual(sync_token(self.ws)[1], token[1])
+        self._set_upstream("0" * 40)
+        self.assertEqual(sync_token(self.ws)[0], "0" * 40)
+        self.assertEqual(sync_token(tempfile.gettempdir() + "/no-such-repo"), ("", ""))
+
+    def test_packed_refs(self):
+        """Test refs are found once git has packed them."""
+        head = self._git("rev-parse", "HEAD")
+        self._set_upstream(head)
+        self._git("pack-refs", "--all")
+        self.assertEqual(read_ref(os.path.join(self.ws, ".git"), "refs/remotes/origin/main"), head)
+
+    def test_is_fresh(self):
+        """Test freshness needs a recent successful sync and an unchanged token."""
+        self._set_upstream(self._git("rev-parse", "HEAD"))
+        sched = SyncScheduler(lambda: {"ok": 1}, debounce=0, snapshot=lambda: sync_token(self.ws))
+        self.assertFalse(sched.is_fresh(60))
+        sched.request()
+        self.assertTrue(sched.is_fresh(60))
+        self.assertFalse(sched.is_fresh(0))
+
+        self._set_upstream("1" * 40)  # another agent's sync fetched new commits
+        self.assertFalse(sched.is_fresh(60))
+        sched.request()
+        self.assertTrue(sched.is_fresh(60))
+
+
+if __name__ == "__main__":
+    unittest.main()
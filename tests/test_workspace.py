@@ -0,0 +1,146 @@
+"""Tests for per-workspace contexts and their LRU pool."""
+import contextvars
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from beads_village import server
+from beads_village.workspace import WorkspaceContext, WorkspacePool
+
+
+class _Recorder:
+    """Stand-in for the sync scheduler and daemon supervisor of a context."""
+
+    def __init__(self):
+        self.flushed = 0
+        self.stopped = 0
+        self.released = []
+
+    def flush(self, timeout=None):
+        self.flushed += 1
+        return True
+
+    def stop(self, agent_id=None):
+        if agent_id:
+            self.released.append(agent_id)
+        else:
+            self.stopped += 1
+        return False
+
+
+class TestWorkspacePool(unittest.TestCase):
+    """Test contexts stay warm and the least recently used is closed."""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.opened = []
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def _factory(self, ws):
+        ctx = WorkspaceContext(ws, sync=_Recorder())
+        ctx.supervisor = _Recorder()
+        self.opened.append(ws)
+        return ctx
+
+    def _ws(self, name):
+        return os.path.join(self.root, name)
+
+    def test_same_context_returned(self):
+        """Test switching back to a workspace reuses its context."""
+        pool = WorkspacePool(self._factory, capacity=2)
+        be = pool.get(self._ws("be"))
+        pool.get(self._ws("fe"))
+        self.assertIs(pool.get(self._ws("be") + os.sep), be)
+        self.assertEqual(len(self.opened), 2)
+
+    def test_lru_eviction_closes(self):
+        """Test the least recently used context is evicted and closed."""
+        pool = WorkspacePool(self._factory, capacity=2)
+        be = pool.get(self._ws("be"))
+        fe = pool.get(self._ws("fe"))
+        pool.get(self._ws("be"))
+        pool.get(self._ws("mobile"))
+        self.assertNotIn(self._ws("fe"), pool)
+        self.assertIn(self._ws("be"), pool)
+        self.assertEqual((fe.sync.flushed, be.sync.flushed), (1, 0))
+        self.assertIsNone(fe.supervisor)
+
+    def test_held_context_not_evicted(self):
+        """Test a context a session holds survives eviction until released."""
+        pool = WorkspacePool(self._factory, capacity=1)
+        be = pool.get(self._ws("be"))
+        pool.hold(be, "a1")
+        fe = pool.get(self._ws("fe"))
+        self.assertIn(self._ws("be"), pool)
+        self.assertEqual(be.sync.flushed, 0)
+        pool.release(be, "a1")
+        pool.get(self._ws("mobile"))
+        self.assertNotIn(self._ws("be"), pool)
+        self.assertEqual((be.sync.flushed, fe.sync.flushed), (1, 1))
+
+    def test_close_all(self):
+        """Test shutdown flushes every context."""
+        pool = WorkspacePool(self._factory, capacity=4)
+        contexts = [pool.get(self._ws(n)) for n in ("be", "fe")]
+        pool.close_all()
+        self.assertEqual(len(pool), 0)
+        self.assertEqual([c.sync.flushed for c in contexts], [1, 1])
+
+
+class TestWorkspaceContext(unittest.TestCase):
+    """Test handles held by a context."""
+
+    def setUp(self):
+        self.ws = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.ws, ignore_errors=True)
+
+    def test_dirs_and_mailbox(self):
+        """Test workspace directories are created and the mailbox handle kept."""
+        ctx = WorkspaceContext(self.ws)
+        self.assertTrue(os.path.isdir(ctx.reservation_dir))
+        self.assertEqual(ctx.mail_dir, os.path.join(self.ws, ".mail"))
+        self.assertIs(ctx.mailbox, ctx.mailbox)
+        self.assertEqual(ctx.claim_lock_path, os.path.join(self.ws, ".beads", ".claim.lock"))
+
+
+class TestJoinedWorkspace(unittest.TestCase):
+    """Test what a session holds as it moves between workspaces."""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_switch_keeps_daemon_reference(self):
+        """Test switching releases the pool hold only; ending the session the daemons."""
+        def run():
+            state = server.State(agent="a1")
+            server.bind_session(state)
+            be, fe = (WorkspaceContext(os.path.join(self.root, n)) for n in ("be", "fe"))
+            for ctx in (be, fe):
+                ctx.supervisor = _Recorder()
+                state.supervised.append(ctx)
+            server.join_workspace(be)
+            server.join_workspace(fe)
+            switched = (set(be.holders), list(be.supervisor.released))
+            server.end_session()
+            return switched, be, fe
+
+        (holders, released), be, fe = contextvars.Context().run(run)
+        self.assertEqual((holders, released), (set(), []))
+        self.assertEqual((be.supervisor.released, fe.supervisor.released), (["a1"], ["a1"]))
+        self.assertEqual(fe.holders, set())
+
+
+if __name__ == "__main__":
+    unittest.main()